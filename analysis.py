@@ -0,0 +1,137 @@
+import io
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from cache import PipelineCache, pipeline_key
+from indici import calcola_indici_da_matrici, indici_from_dataframe
+from matching import apply_matching_with_stats
+from parser import parse_file, organize_matrices, matrix_to_dict
+
+# Fasi dell'analisi, nell'ordine in cui vengono eseguite
+STAGES = ("parsing", "matching", "indices")
+
+@dataclass
+class AnalysisResult:
+    """
+    Risultati di un'analisi di bilancio.
+
+    raw e matched sono in formato lungo (Voce, Anno, Valore, più Voce_Standard
+    dopo il matching); stato_patrimoniale e conto_economico sono le tabelle
+    anno x voce standard di organize_matrices; indici ha colonne Anno, Indice e
+    Valore. matching_stats sono le statistiche per livello di cascade_match
+    (tier, voci, hits, seconds) dell'analisi che ha prodotto i risultati,
+    anche quando questi vengono dalla cache.
+    """
+    raw: pd.DataFrame
+    matched: pd.DataFrame
+    stato_patrimoniale: pd.DataFrame
+    conto_economico: pd.DataFrame
+    indici: pd.DataFrame
+    matching_stats: List[Dict[str, Any]] = field(default_factory=list)
+    cached: bool = False
+
+    # Nomi dei DataFrame salvati nella cache dell'analisi, più matching_stats
+    FRAMES = ("raw", "matched", "stato_patrimoniale", "conto_economico", "indici")
+    MATCHING_STATS_COLUMNS = ["tier", "voci", "hits", "seconds"]
+
+    def frames(self) -> Dict[str, pd.DataFrame]:
+        """Restituisce i DataFrame dei risultati per nome, con le statistiche del matching"""
+        frames = {nome: getattr(self, nome) for nome in self.FRAMES}
+        frames["matching_stats"] = pd.DataFrame(self.matching_stats, columns=self.MATCHING_STATS_COLUMNS)
+        return frames
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], cached: bool = False) -> "AnalysisResult":
+        """Ricostruisce i risultati dai DataFrame di frames()"""
+        stats = frames.get("matching_stats")
+        return cls(
+            **{nome: frames[nome] for nome in cls.FRAMES},
+            matching_stats=stats.to_dict(orient="records") if stats is not None else [],
+            cached=cached
+        )
+
+    def stato_patrimoniale_anni(self) -> Dict[int, Dict[str, float]]:
+        """Stato Patrimoniale come dizionario {anno: {voce: valore}}"""
+        return matrix_to_dict(self.stato_patrimoniale)
+
+    def conto_economico_anni(self) -> Dict[int, Dict[str, float]]:
+        """Conto Economico come dizionario {anno: {voce: valore}}"""
+        return matrix_to_dict(self.conto_economico)
+
+    def indici_anni(self) -> Dict[int, Dict[str, float]]:
+        """Indici come dizionario {anno: {indice: valore}}"""
+        return indici_from_dataframe(self.indici)
+
+def parse_stage(file: Any, filename: Optional[str] = None, sheet_name=0) -> pd.DataFrame:
+    """
+    Fase di parsing: legge il file di bilancio in formato lungo.
+
+    Args:
+        file: Contenuto del file (bytes), percorso o oggetto file
+        filename: Nome del file, per riconoscerne il formato
+        sheet_name: Foglio da leggere per i file Excel
+    """
+    if isinstance(file, (bytes, bytearray)):
+        file = io.BytesIO(file)
+    return parse_file(file, filename=filename, sheet_name=sheet_name)
+
+def match_stage(df_raw: pd.DataFrame, matching_type: str) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """Fase di matching: aggiunge Voce_Standard e restituisce le statistiche per livello"""
+    return apply_matching_with_stats(df_raw, matching_type)
+
+def indices_stage(df_matched: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Fase degli indici: organizza le voci standard per anno e calcola gli indici.
+
+    Returns:
+        Tuple (stato_patrimoniale, conto_economico, indici)
+    """
+    stato_patrimoniale, conto_economico = organize_matrices(df_matched, colonna_voce="Voce_Standard")
+    return stato_patrimoniale, conto_economico, calcola_indici_da_matrici(stato_patrimoniale, conto_economico)
+
+def analyze(file: Any, filename: Optional[str] = None, sheet_name=0, matching_type: str = "fuzzy",
+            cache: Optional[PipelineCache] = None,
+            on_stage: Optional[Callable[[str], None]] = None) -> AnalysisResult:
+    """
+    Esegue l'analisi completa di un file di bilancio: parsing, matching delle
+    voci e calcolo degli indici sulle voci standardizzate.
+
+    Ogni fase viene eseguita una sola volta e riceve i risultati della
+    precedente. È il punto d'ingresso comune delle app Streamlit e dell'API.
+
+    Args:
+        file: Contenuto del file (bytes), percorso o oggetto file
+        filename: Nome del file, per riconoscerne il formato
+        sheet_name: Foglio da leggere per i file Excel
+        matching_type: Tipo di matching da applicare
+        cache: Cache dei risultati per contenuto del file (richiede file in bytes)
+        on_stage: Funzione chiamata con il nome di ogni fase prima di eseguirla
+
+    Returns:
+        AnalysisResult con i risultati di tutte le fasi
+    """
+    cache_key = None
+    if cache is not None and isinstance(file, (bytes, bytearray)):
+        cache_key = pipeline_key(file, sheet_name, matching_type)
+        frames = cache.get(cache_key)
+        if frames is not None:
+            return AnalysisResult.from_frames(frames, cached=True)
+
+    if on_stage:
+        on_stage("parsing")
+    df_raw = parse_stage(file, filename=filename, sheet_name=sheet_name)
+
+    if on_stage:
+        on_stage("matching")
+    df_matched, matching_stats = match_stage(df_raw, matching_type)
+
+    if on_stage:
+        on_stage("indices")
+    stato_patrimoniale, conto_economico, indici = indices_stage(df_matched)
+
+    result = AnalysisResult(df_raw, df_matched, stato_patrimoniale, conto_economico, indici, matching_stats)
+    if cache_key is not None:
+        cache.set(cache_key, result.frames())
+    return result
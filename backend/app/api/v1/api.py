@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import bilancio, balance, analyze
+from app.api.v1.endpoints import bilancio, balance, analyze, database
 
 api_router = APIRouter()
 
@@ -8,4 +8,5 @@ api_router = APIRouter()
 
 api_router.include_router(bilancio.router, prefix="/bilanci", tags=["bilanci"])
 api_router.include_router(balance.router, prefix="/balances", tags=["balances"])
-api_router.include_router(analyze.router, prefix="/analyze", tags=["analyze"]) 
\ No newline at end of file
+api_router.include_router(analyze.router, prefix="/analyze", tags=["analyze"])
+api_router.include_router(database.router, prefix="/db", tags=["database"]) 
\ No newline at end of file
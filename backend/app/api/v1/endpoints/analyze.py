@@ -1,65 +1,267 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
-from typing import Dict, List, Any
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Any, Set, Tuple
 import pandas as pd
-import io
+import asyncio
 import sys
 import os
 
 # Add the parent directory to the path to import the modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../..")))
 
-from parser import parse_excel, organize_data
-from matching import apply_matching
-from indici import calcola_indici_per_anni, indici_to_dataframe
+from analysis import AnalysisResult, analyze, parse_stage, match_stage, indices_stage
+from cache import get_pipeline_cache, pipeline_key
+
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal, get_db
+from app.models.schemas import AnalysisJob
+from app.services.analysis_pool import analysis_pool
+from app.services.analysis_render import (
+    RESPONSE_FORMATS, NDJSON_MEDIA_TYPE, ARROW_MEDIA_TYPE,
+    render_response, render_to_file, iter_file
+)
+from app.services.analysis_job_service import AnalysisJobService
 
 router = APIRouter()
 
+def run_pipeline(contents: bytes, filename: str, matching_type: str) -> Dict[str, pd.DataFrame]:
+    """
+    Esegue l'analisi di un file caricato con il servizio analyze.
+    
+    Funzione sincrona e CPU-bound, eseguita in un processo di analysis_pool.
+    
+    Args:
+        contents: Contenuto del file
+        filename: Nome del file, per riconoscerne il formato
+        matching_type: Tipo di matching da applicare
+        
+    Returns:
+        Dizionario con i DataFrame dei risultati (AnalysisResult.frames)
+    """
+    return analyze(contents, filename=filename, matching_type=matching_type).frames()
+
+def analyze_contents(contents: bytes, filename: str, matching_type: str) -> Tuple[Dict[str, pd.DataFrame], bytes]:
+    """Esegue run_pipeline e render_response nello stesso processo del pool"""
+    frames = run_pipeline(contents, filename, matching_type)
+    return frames, render_response(frames)
+
+def analyze_to_file(contents: bytes, filename: str, matching_type: str,
+                    response_format: str) -> Tuple[Dict[str, pd.DataFrame], str]:
+    """Esegue run_pipeline e render_to_file nello stesso processo del pool"""
+    frames = run_pipeline(contents, filename, matching_type)
+    return frames, render_to_file(frames, response_format)
+
+def finish_pipeline(df_raw: pd.DataFrame, df_matched: pd.DataFrame,
+                    matching_stats: List[Dict[str, Any]]) -> Tuple[Dict[str, pd.DataFrame], bytes]:
+    """Calcola gli indici e serializza i risultati, come ultima fase di un job"""
+    stato_patrimoniale, conto_economico, indici = indices_stage(df_matched)
+    frames = AnalysisResult(
+        df_raw, df_matched, stato_patrimoniale, conto_economico, indici, matching_stats=matching_stats
+    ).frames()
+    return frames, render_response(frames)
+
 @router.post("/", status_code=status.HTTP_200_OK)
 async def analyze_balance(
     file: UploadFile = File(...),
-    matching_type: str = Form("fuzzy")
+    matching_type: str = Form("fuzzy"),
+    response_format: str = Query("json", alias="format")
 ):
     """
-    Analizza un file Excel di bilancio e restituisce i dati grezzi, standardizzati e gli indici finanziari.
+    Analizza un file di bilancio e restituisce i dati grezzi, standardizzati, gli indici
+    finanziari e le statistiche del matching per livello (tier, voci, hits, seconds).
+    
+    L'elaborazione avviene in un processo separato: se troppe analisi sono già
+    in corso la richiesta viene rifiutata con 429.
     
     Args:
-        file: File Excel di bilancio
-        matching_type: Tipo di matching da applicare (fuzzy, embedding, gpt)
+        file: File di bilancio (.xlsx, .xlsb, .csv o .parquet)
+        matching_type: Tipo di matching da applicare (fuzzy, embedding, gpt, cascade)
+        response_format: "json" (un unico documento), "ndjson" (un record per riga,
+            in streaming) o "arrow" (stream IPC Apache Arrow)
         
     Returns:
-        Dizionario con i dati grezzi, standardizzati e gli indici finanziari
+        Dizionario con i dati grezzi, standardizzati, gli indici finanziari e
+        le statistiche del matching
     """
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Formato di risposta non supportato: {response_format} "
+                   f"(formati supportati: {', '.join(RESPONSE_FORMATS)})"
+        )
+    
     try:
-        # Leggi il file Excel
+        # Leggi il file caricato
         contents = await file.read()
-        excel_file = io.BytesIO(contents)
-        
-        # Parsing del file Excel
-        df_raw = parse_excel(excel_file)
-        
-        # Organizzazione dei dati per anno
-        stato_patrimoniale_anni, conto_economico_anni = organize_data(df_raw)
-        
-        # Applicazione del matching
-        df_standardized = apply_matching(df_raw, matching_type)
         
-        # Calcolo degli indici finanziari
-        indici_anni = calcola_indici_per_anni(stato_patrimoniale_anni, conto_economico_anni)
+        # Un file identico già analizzato con lo stesso matching viene servito dalla cache
+        pipeline_cache = get_pipeline_cache()
+        cache_key = pipeline_key(contents, 0, matching_type)
+        frames = await asyncio.to_thread(pipeline_cache.get, cache_key)
         
-        # Conversione degli indici in formato JSON-friendly
-        indici_json = {str(year): indices for year, indices in indici_anni.items()}
+        if response_format == "json":
+            if frames is None:
+                frames, body = await analysis_pool.run(analyze_contents, contents, file.filename, matching_type)
+                await asyncio.to_thread(pipeline_cache.set, cache_key, frames)
+            else:
+                body = await analysis_pool.run(render_response, frames)
+            return Response(content=body, media_type="application/json")
         
-        # Conversione dei DataFrame in liste di dizionari
-        raw_data = df_raw.to_dict(orient="records")
-        standardized_data = df_standardized.to_dict(orient="records")
+        # Il pool scrive lo stream in un file temporaneo, trasmesso qui a blocchi
+        # (Starlette consuma il generatore sincrono in un thread)
+        if frames is None:
+            frames, path = await analysis_pool.run(
+                analyze_to_file, contents, file.filename, matching_type, response_format
+            )
+            await asyncio.to_thread(pipeline_cache.set, cache_key, frames)
+        else:
+            path = await analysis_pool.run(render_to_file, frames, response_format)
         
-        return {
-            "raw_data": raw_data,
-            "standardized_data": standardized_data,
-            "financial_indices": indici_json
-        }
+        media_type = NDJSON_MEDIA_TYPE if response_format == "ndjson" else ARROW_MEDIA_TYPE
+        return StreamingResponse(iter_file(path), media_type=media_type)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Errore durante l'analisi del bilancio: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.get("/cache", status_code=status.HTTP_200_OK)
+async def analyze_cache_stats() -> Dict[str, int]:
+    """
+    Restituisce le statistiche della cache dei risultati dell'analisi.
+    
+    Returns:
+        Dizionario con hit, miss, voci e byte occupati in memoria
+    """
+    return get_pipeline_cache().stats()
+
+@router.get("/pool", status_code=status.HTTP_200_OK)
+async def analyze_pool_stats() -> Dict[str, int]:
+    """
+    Restituisce lo stato del pool di processi dell'analisi.
+    
+    Returns:
+        Dizionario con numero di processi, analisi sincrone in corso o in coda e
+        limite della coda, fasi dei job in background in corso o in coda
+    """
+    return analysis_pool.stats()
+
+# Riferimenti ai job in esecuzione, perché asyncio non li raccolga prima del termine
+_running_jobs: Set[asyncio.Task] = set()
+
+async def _heartbeat(job_id: str) -> None:
+    """Rinnova periodicamente updated_at del job, finché non viene annullato"""
+    while True:
+        await asyncio.sleep(settings.ANALYSIS_JOB_HEARTBEAT_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                await AnalysisJobService(db).touch_job(job_id)
+        except HTTPException:
+            # Un aggiornamento mancato non interrompe il job: riprova al prossimo intervallo
+            pass
+
+async def _run_job(job_id: str, contents: bytes, filename: str, matching_type: str) -> None:
+    """Esegue un job di analisi, registrando nel database fase e risultato"""
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    async with AsyncSessionLocal() as db:
+        jobs = AnalysisJobService(db)
+        try:
+            pipeline_cache = get_pipeline_cache()
+            cache_key = pipeline_key(contents, 0, matching_type)
+            frames = await asyncio.to_thread(pipeline_cache.get, cache_key)
+            
+            if frames is not None:
+                await jobs.update_job(job_id, status="running", stage="indices")
+                body = await analysis_pool.run(render_response, frames, limit=False)
+            else:
+                await jobs.update_job(job_id, status="running", stage="parsing")
+                df_raw = await analysis_pool.run(parse_stage, contents, filename, limit=False)
+                
+                await jobs.update_job(job_id, stage="matching")
+                df_matched, matching_stats = await analysis_pool.run(match_stage, df_raw, matching_type, limit=False)
+                
+                await jobs.update_job(job_id, stage="indices")
+                frames, body = await analysis_pool.run(
+                    finish_pipeline, df_raw, df_matched, matching_stats, limit=False
+                )
+                await asyncio.to_thread(pipeline_cache.set, cache_key, frames)
+            
+            await jobs.update_job(job_id, status="completed", result=body.decode("utf-8"))
+        except Exception as e:
+            await jobs.update_job(job_id, status="failed", error=str(getattr(e, "detail", e)))
+        except BaseException:
+            # Job annullato (arresto del server): registra l'interruzione con una
+            # sessione nuova, quella del job può essere a metà di un'operazione
+            async with AsyncSessionLocal() as failed_db:
+                await AnalysisJobService(failed_db).update_job(job_id, status="failed", error="Analisi interrotta")
+            raise
+        finally:
+            heartbeat.cancel()
+
+async def cancel_jobs() -> None:
+    """Annulla i job in esecuzione in questo processo, registrandoli come falliti"""
+    for task in list(_running_jobs):
+        task.cancel()
+    await asyncio.gather(*_running_jobs, return_exceptions=True)
+
+@router.post("/jobs", response_model=AnalysisJob, status_code=status.HTTP_202_ACCEPTED)
+async def create_analysis_job(
+    file: UploadFile = File(...),
+    matching_type: str = Form("fuzzy"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Avvia l'analisi di un file di bilancio in background e restituisce subito il job.
+    
+    Lo stato del job si consulta con GET /analyze/jobs/{job_id}; oltre
+    ANALYSIS_MAX_JOBS job attivi la richiesta viene rifiutata con 429.
+    
+    Args:
+        file: File di bilancio (.xlsx, .xlsb, .csv o .parquet)
+        matching_type: Tipo di matching da applicare (fuzzy, embedding, gpt, cascade)
+        
+    Returns:
+        Il job creato, in stato queued
+    """
+    jobs = AnalysisJobService(db)
+    if await jobs.count_active_jobs() >= settings.ANALYSIS_MAX_JOBS:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Troppe analisi in corso, riprovare tra poco",
+            headers={"Retry-After": "30"}
+        )
+    
+    contents = await file.read()
+    job = await jobs.create_job(file.filename, matching_type)
+    
+    task = asyncio.create_task(_run_job(job.id, contents, file.filename, matching_type))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+    return job
+
+@router.get("/jobs/{job_id}", status_code=status.HTTP_200_OK)
+async def get_analysis_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Recupera stato, fase e, se completato, risultato di un job di analisi.
+    
+    Returns:
+        Il job con il campo result (lo stesso contenuto di POST /analyze/), null
+        finché l'analisi non è completata
+    """
+    found = await AnalysisJobService(db).get_job(job_id)
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job di analisi {job_id} non trovato o scaduto"
+        )
+    job, result = found
+    
+    # Il risultato è già JSON: viene inserito senza essere decodificato e ricodificato
+    body = job.model_dump_json()[:-1] + ', "result": ' + (result or "null") + "}"
+    return Response(content=body, media_type="application/json")
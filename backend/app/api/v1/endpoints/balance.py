@@ -1,13 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
+import orjson
 
 from app.db.base import get_db
-from app.models.schemas import Balance, BalanceCreate, BalanceUpdate
-from app.services.balance_service import BalanceService
+from app.models.schemas import Balance, BalanceCreate, BalanceUpdate, BalanceBulkResult, BalanceIndex, BalanceRanking
+from app.services.balance_service import BalanceService, BALANCE_FIELDS, parse_filters
 
 router = APIRouter()
 
+# Content-Type accettati da POST /balances/bulk per i record uno per riga
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+async def _ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Righe non vuote di un corpo NDJSON, man mano che arriva"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+async def _json_records(records: List[Any]) -> AsyncIterator[Any]:
+    """Record di un array JSON già letto, come iteratore asincrono"""
+    for record in records:
+        yield record
+
 @router.post("/", response_model=Balance, status_code=status.HTTP_201_CREATED)
 async def create_balance(
     balance: BalanceCreate,
@@ -19,6 +40,79 @@ async def create_balance(
     balance_service = BalanceService(db)
     return await balance_service.create_balance(balance)
 
+@router.post("/bulk", response_model=BalanceBulkResult, status_code=status.HTTP_201_CREATED)
+async def create_balances_bulk(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Importa più bilanci in un'unica transazione.
+    
+    Il corpo è un array JSON di bilanci oppure, con Content-Type
+    application/x-ndjson, un bilancio per riga letto man mano che arriva. I
+    record non validi vengono saltati e riportati in errors con la loro
+    posizione; gli altri vengono creati.
+    """
+    balance_service = BalanceService(db)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        return await balance_service.create_balances(_ndjson_lines(request.stream()))
+    
+    try:
+        records = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Corpo JSON non valido: {str(e)}"
+        )
+    if not isinstance(records, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Il corpo deve essere un array JSON di bilanci"
+        )
+    return await balance_service.create_balances(_json_records(records))
+
+@router.post("/items/rebuild")
+async def rebuild_balance_items(
+    db: Session = Depends(get_db)
+) -> Dict[str, int]:
+    """
+    Ricalcola le voci filtrabili (balance_items) e gli indici salvati
+    (balance_indices) di tutti i bilanci.
+    """
+    balance_service = BalanceService(db)
+    return await balance_service.rebuild_derived()
+
+@router.get("/indices/ranking", response_model=List[BalanceRanking])
+async def rank_balances(
+    indice: str = Query(..., description="Nome dell'indice, ad esempio ROE"),
+    anno: int = Query(..., description="Anno dell'indice"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="desc: valori più alti prima"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Classifica i bilanci per valore di un indice salvato in un anno.
+    """
+    balance_service = BalanceService(db)
+    return await balance_service.rank_balances(indice, anno, descending=order == "desc", limit=limit)
+
+@router.get("/{balance_id}/indices", response_model=List[BalanceIndex])
+async def get_balance_indices(
+    balance_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Recupera gli indici salvati di un bilancio, senza ricalcolarli.
+    """
+    balance_service = BalanceService(db)
+    if await balance_service.get_balance_by_id(balance_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Bilancio con ID {balance_id} non trovato"
+        )
+    return await balance_service.get_balance_indices(balance_id)
+
 @router.get("/{balance_id}", response_model=Balance)
 async def get_balance(
     balance_id: int,
@@ -38,15 +132,51 @@ async def get_balance(
 
 @router.get("/", response_model=List[Balance])
 async def get_all_balances(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Cursore X-Next-Cursor della pagina precedente"),
+    fields: Optional[str] = Query(None, description="Campi da restituire, separati da virgola (id e date sono sempre inclusi)"),
+    filters: List[str] = Query([], alias="filter", description="Filtri sulle voci di financial_data, ad esempio patrimonio_netto<0 (ripetibile)"),
+    anno: Optional[int] = Query(None, description="Anno delle voci a cui si applicano i filtri"),
     db: Session = Depends(get_db)
 ):
     """
-    Recupera tutti i bilanci con paginazione.
+    Recupera tutti i bilanci, ordinati per data e ID, con paginazione.
+    
+    Se la pagina è piena, l'header X-Next-Cursor contiene il cursore da passare
+    in cursor per la pagina successiva: a differenza di skip, il costo non
+    cresce con la profondità della pagina. Con fields (ad esempio
+    fields=name,date) le colonne non richieste, come financial_data, non
+    vengono lette né trasferite.
+    
+    Ogni filter (voce, operatore <, <=, >, >= o =, valore) tiene solo i
+    bilanci con quella voce nel financial_data che soddisfa la condizione. Le
+    voci degli indici si indicano con il nome standard (patrimonio_netto,
+    totale_attivo, ...), qualunque sia il loro percorso nel JSON; le altre
+    voci annidate con il percorso separato da punti.
     """
+    selected = None
+    if fields is not None:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in BALANCE_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Campi non validi: {', '.join(unknown)} (campi disponibili: {', '.join(BALANCE_FIELDS)})"
+            )
+    
     balance_service = BalanceService(db)
-    return await balance_service.get_all_balances(skip=skip, limit=limit)
+    balances, next_cursor = await balance_service.get_all_balances(
+        skip=skip, limit=limit, cursor=cursor, fields=selected,
+        filters=parse_filters(filters), anno=anno
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if selected is not None:
+        # Bilanci parziali: serializzati direttamente, senza il modello completo Balance
+        return Response(content=orjson.dumps(balances), media_type="application/json", headers=headers)
+    response.headers.update(headers)
+    return balances
 
 @router.put("/{balance_id}", response_model=Balance)
 async def update_balance(
@@ -1,36 +1,78 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from app.models.schemas import Bilancio, BilancioCreate, BilancioUpdate
-from app.services.bilancio_service import BilancioService
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.core.config import settings
+from app.db.base import get_db
+from app.models.schemas import Bilancio, BilancioCreate, BilancioUpdate, BilancioAggregato
+from app.services.bilancio_service import BilancioService, memory_bilancio_service, GROUP_FIELDS, PERIODS
 
 router = APIRouter()
-bilancio_service = BilancioService()
+
+def get_bilancio_service(db: AsyncSession = Depends(get_db)):
+    """Servizio delle voci di bilancio, secondo BILANCI_STORE"""
+    if settings.BILANCI_STORE == "memory":
+        return memory_bilancio_service
+    return BilancioService(db)
 
 @router.post("/", response_model=Bilancio)
-async def create_bilancio(bilancio: BilancioCreate):
+async def create_bilancio(bilancio: BilancioCreate, bilancio_service=Depends(get_bilancio_service)):
     return await bilancio_service.create_bilancio(bilancio)
 
+@router.get("/aggregati", response_model=List[BilancioAggregato])
+async def aggregate_bilanci(
+    group_by: str = Query("categoria", description="Campi di raggruppamento separati da virgola: categoria, tipo"),
+    period: Optional[str] = Query(None, description="Periodo: month, quarter o year"),
+    date_from: Optional[datetime] = Query(None, description="Solo voci con data da questo istante (incluso)"),
+    date_to: Optional[datetime] = Query(None, description="Solo voci con data fino a questo istante (escluso)"),
+    bilancio_service=Depends(get_bilancio_service)
+):
+    """
+    Totali, conteggi e saldi (entrate meno uscite) delle voci di bilancio per
+    categoria, tipo e periodo; con un periodo anche il saldo progressivo.
+    """
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in GROUP_FIELDS]
+    if unknown or (period is not None and period not in PERIODS):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Raggruppamento non valido: group_by ammette {', '.join(GROUP_FIELDS)}, "
+                   f"period ammette {', '.join(PERIODS)}"
+        )
+    return await bilancio_service.aggregate_bilanci(
+        list(dict.fromkeys(fields)), period=period, date_from=date_from, date_to=date_to
+    )
+
+@router.post("/aggregati/rollup")
+async def rebuild_rollup(bilancio_service=Depends(get_bilancio_service)) -> Dict[str, int]:
+    """
+    Ricalcola da zero la tabella bilanci_rollup dalle voci di bilancio.
+    """
+    if not isinstance(bilancio_service, BilancioService):
+        raise HTTPException(status_code=409, detail="bilanci_rollup richiede BILANCI_STORE=sql")
+    return {"righe": await bilancio_service.rebuild_rollup()}
+
 @router.get("/{bilancio_id}", response_model=Bilancio)
-async def get_bilancio(bilancio_id: int):
+async def get_bilancio(bilancio_id: int, bilancio_service=Depends(get_bilancio_service)):
     bilancio = await bilancio_service.get_bilancio(bilancio_id)
     if bilancio is None:
         raise HTTPException(status_code=404, detail="Bilancio not found")
     return bilancio
 
 @router.get("/", response_model=List[Bilancio])
-async def get_bilanci(skip: int = 0, limit: int = 100):
+async def get_bilanci(skip: int = 0, limit: int = 100, bilancio_service=Depends(get_bilancio_service)):
     return await bilancio_service.get_bilanci(skip=skip, limit=limit)
 
 @router.put("/{bilancio_id}", response_model=Bilancio)
-async def update_bilancio(bilancio_id: int, bilancio_update: BilancioUpdate):
+async def update_bilancio(bilancio_id: int, bilancio_update: BilancioUpdate, bilancio_service=Depends(get_bilancio_service)):
     bilancio = await bilancio_service.update_bilancio(bilancio_id, bilancio_update)
     if bilancio is None:
         raise HTTPException(status_code=404, detail="Bilancio not found")
     return bilancio
 
 @router.delete("/{bilancio_id}")
-async def delete_bilancio(bilancio_id: int):
+async def delete_bilancio(bilancio_id: int, bilancio_service=Depends(get_bilancio_service)):
     success = await bilancio_service.delete_bilancio(bilancio_id)
     if not success:
         raise HTTPException(status_code=404, detail="Bilancio not found")
-    return {"message": "Bilancio deleted successfully"} 
\ No newline at end of file
+    return {"message": "Bilancio deleted successfully"}
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, status
+from typing import Any, Dict
+
+from app.db.base import pool_metrics
+
+router = APIRouter()
+
+@router.get("/pool", status_code=status.HTTP_200_OK)
+async def database_pool_stats() -> Dict[str, Any]:
+    """
+    Restituisce lo stato del pool di connessioni al database.
+    
+    Returns:
+        Dizionario con dimensione del pool, connessioni libere, in uso e in
+        overflow, numero di richieste di connessione, timeout e tempi di attesa
+    """
+    return pool_metrics()
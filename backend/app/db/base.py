@@ -1,19 +1,94 @@
+import time
+import uuid
+from typing import Dict, Any
+
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy import exc
 from app.core.config import settings
 
 # Creazione della base per i modelli
 Base = declarative_base()
 
+class MeteredAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool di connessioni che misura il tempo di attesa per ottenere una
+    connessione (incluso l'eventuale collegamento di una nuova connessione).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Stato del pool e tempi di attesa per una connessione"""
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
 # Configurazione del pool di connessioni
 DATABASE_URL = settings.DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://')
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    future=True
-)
+engine_options: Dict[str, Any] = {"echo": settings.DB_ECHO, "future": True}
+if settings.DB_POOL_SIZE <= 0:
+    # Nessun pool: una connessione nuova per ogni sessione
+    engine_options["poolclass"] = NullPool
+elif ":memory:" not in DATABASE_URL:
+    # Un database SQLite in memoria vive in una sola connessione: resta il pool predefinito
+    engine_options.update(
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+if DATABASE_URL.startswith("postgresql+asyncpg://"):
+    # Cache dei prepared statement di asyncpg, per connessione
+    connect_args: Dict[str, Any] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    if settings.DB_STATEMENT_CACHE_SIZE <= 0:
+        # Dietro pgbouncer in modalità transaction: niente cache nemmeno in asyncpg,
+        # e nomi unici perché un prepared statement può finire su un'altra connessione
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+        )
+    engine_options["connect_args"] = connect_args
+
+engine = create_async_engine(DATABASE_URL, **engine_options)
+
+def pool_metrics() -> Dict[str, Any]:
+    """Metriche del pool di connessioni del motore, se misurato"""
+    pool = engine.pool
+    if isinstance(pool, MeteredAsyncAdaptedQueuePool):
+        return pool.metrics()
+    return {"pool": pool.status()}
 
 # Creazione della sessione asincrona
 AsyncSessionLocal = sessionmaker(
@@ -30,4 +105,4 @@ async def get_db():
         try:
             yield session
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
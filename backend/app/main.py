@@ -4,15 +4,24 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.api.v1.api import api_router
-from app.db.base import Base, engine
+from app.api.v1.endpoints.analyze import cancel_jobs
+from app.db.base import AsyncSessionLocal, Base, engine
+from app.services.analysis_pool import analysis_pool
+from app.services.analysis_job_service import AnalysisJobService
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: create tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # Job rimasti attivi da un processo terminato: non ricevono più aggiornamenti.
+    # Due intervalli di heartbeat bastano a non toccare i job degli altri worker attivi
+    async with AsyncSessionLocal() as db:
+        await AnalysisJobService(db).fail_stale_jobs(2 * settings.ANALYSIS_JOB_HEARTBEAT_SECONDS)
     yield
-    # Shutdown: close engine
+    # Shutdown: record interrupted jobs, stop analysis workers and close engine
+    await cancel_jobs()
+    analysis_pool.shutdown()
     await engine.dispose()
 
 app = FastAPI(
@@ -29,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include API router
@@ -36,4 +46,9 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Bilancismart API"} 
\ No newline at end of file
+    return {"message": "Welcome to Bilancismart API"}
+
+@app.get("/ping")
+async def ping():
+    """Endpoint di test per verificare che l'API sia attiva"""
+    return {"status": "ok", "message": "pong"}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime, date
 
 class BilancioBase(BaseModel):
@@ -29,6 +29,16 @@ class BilancioUpdate(BaseModel):
     categoria: Optional[str] = None
     tipo: Optional[str] = None
 
+# Totali delle voci di bilancio raggruppate (GET /bilanci/aggregati)
+class BilancioAggregato(BaseModel):
+    categoria: Optional[str] = None
+    tipo: Optional[str] = None
+    periodo: Optional[str] = None  # "2024-03", "2024-Q1" o "2024"
+    totale: float  # somma degli importi
+    conteggio: int
+    saldo: float  # entrate meno uscite
+    saldo_progressivo: Optional[float] = None  # saldo cumulato fino al periodo, per gruppo
+
 # Nuovi modelli per Balance
 class BalanceBase(BaseModel):
     name: str
@@ -64,7 +74,49 @@ class BalanceUpdate(BaseModel):
 class Balance(BalanceBase):
     id: int
     created_at: datetime
-    updated_at: datetime
+    updated_at: Optional[datetime] = None  # valorizzato al primo aggiornamento
+
+    class Config:
+        from_attributes = True 
+
+# Importazione di più bilanci con POST /balances/bulk
+class BalanceBulkError(BaseModel):
+    index: int  # posizione del record nella richiesta, da 0
+    errors: List[Dict[str, Any]]
+
+class BalanceBulkResult(BaseModel):
+    created: int
+    ids: List[int]  # ID dei bilanci creati, nell'ordine dei record validi
+    errors: List[BalanceBulkError] = []
+
+# Indici salvati di un bilancio (GET /balances/{id}/indices)
+class BalanceIndex(BaseModel):
+    indice: str
+    anno: int
+    valore: float
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+# Posizione di un bilancio nella classifica di un indice (GET /balances/indices/ranking)
+class BalanceRanking(BaseModel):
+    balance_id: int
+    name: str
+    date: date
+    anno: int
+    valore: float
+
+# Job di analisi asincrona
+class AnalysisJob(BaseModel):
+    id: str
+    status: str  # "queued", "running", "completed" o "failed"
+    stage: Optional[str] = None  # "parsing", "matching" o "indices"
+    filename: Optional[str] = None
+    matching_type: str
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # None finché il job non termina
+
+    class Config:
+        from_attributes = True
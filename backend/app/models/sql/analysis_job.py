@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+class AnalysisJobModel(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String(16), nullable=False, default="queued")
+    stage = Column(String(16), nullable=True)
+    filename = Column(String, nullable=True)
+    matching_type = Column(String, nullable=False)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # NULL finché il job è in coda o in esecuzione
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_jobs_expires_at", "expires_at"),
+        Index("ix_analysis_jobs_status", "status"),
+    )
+
+    def __repr__(self):
+        return f"<AnalysisJob {self.id} ({self.status})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, JSON, DateTime
+from sqlalchemy import Column, Integer, String, Date, JSON, DateTime, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -12,5 +12,10 @@ class BalanceModel(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Ordinamento e paginazione keyset di GET /balances
+        Index("ix_balances_date_id", "date", "id"),
+    )
+
     def __repr__(self):
         return f"<Balance {self.name} ({self.date})>" 
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
+from app.db.base import Base
+
+class BalanceIndexModel(Base):
+    """
+    Indici di bilancio calcolati da financial_data, una riga per bilancio,
+    indice e anno, per consultarli e confrontarli senza ricalcolarli.
+    """
+    __tablename__ = "balance_indices"
+
+    balance_id = Column(Integer, ForeignKey("balances.id", ondelete="CASCADE"), primary_key=True)
+    indice = Column(String, primary_key=True)
+    anno = Column(Integer, primary_key=True)
+    valore = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Classifiche di un indice in un anno; balance_id rende l'indice coprente
+        Index("ix_balance_indices_indice_anno_valore", "indice", "anno", "valore", "balance_id"),
+    )
+
+    def __repr__(self):
+        return f"<BalanceIndex {self.balance_id} {self.indice} {self.anno}>"
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
+from app.db.base import Base
+
+class BalanceItemModel(Base):
+    """
+    Voci numeriche di financial_data, una riga per bilancio, voce e anno, per
+    filtrare i bilanci sui valori senza leggere il JSON.
+    """
+    __tablename__ = "balance_items"
+
+    balance_id = Column(Integer, ForeignKey("balances.id", ondelete="CASCADE"), primary_key=True)
+    percorso = Column(String, primary_key=True)  # percorso nel JSON, ad esempio "passivo.patrimonio_netto"
+    anno = Column(Integer, primary_key=True)
+    # Voce standard degli indici ("Patrimonio Netto"), o il percorso se non riconosciuta
+    voce_standard = Column(String, nullable=False)
+    valore = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Filtri per voce e intervallo di valori; balance_id rende l'indice coprente
+        Index("ix_balance_items_voce_valore", "voce_standard", "valore", "balance_id"),
+    )
+
+    def __repr__(self):
+        return f"<BalanceItem {self.balance_id} {self.voce_standard} {self.anno}>"
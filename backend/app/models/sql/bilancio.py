@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+class BilancioModel(Base):
+    __tablename__ = "bilanci"
+
+    id = Column(Integer, primary_key=True)
+    nome = Column(String, nullable=False)
+    descrizione = Column(String, nullable=True)
+    data = Column(DateTime(timezone=True), nullable=False)
+    importo = Column(Float, nullable=False)
+    categoria = Column(String, nullable=False)
+    tipo = Column(String, nullable=False)  # "entrata" o "uscita"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_bilanci_categoria", "categoria"),
+        Index("ix_bilanci_tipo", "tipo"),
+        Index("ix_bilanci_data", "data"),
+        # Aggregazioni per categoria e tipo: l'indice copre anche data e importo
+        Index("ix_bilanci_categoria_tipo_data", "categoria", "tipo", "data", "importo"),
+    )
+
+    def __repr__(self):
+        return f"<Bilancio {self.nome} ({self.data})>"
+
+class BilancioRollupModel(Base):
+    """
+    Totali delle voci di bilancio per categoria, tipo e mese, aggiornati a ogni
+    modifica di bilanci quando BILANCI_ROLLUP è attivo.
+    """
+    __tablename__ = "bilanci_rollup"
+
+    categoria = Column(String, primary_key=True)
+    tipo = Column(String, primary_key=True)
+    mese = Column(String(7), primary_key=True)  # "YYYY-MM"
+    totale = Column(Float, nullable=False, default=0.0)
+    conteggio = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<BilancioRollup {self.categoria}/{self.tipo} {self.mese}>"
@@ -0,0 +1,187 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.models.sql.analysis_job import AnalysisJobModel
+from app.models.schemas import AnalysisJob
+
+# Stati di un job che occupano ancora il pool di analisi
+ACTIVE_STATUSES = ("queued", "running")
+
+class AnalysisJobService:
+    """
+    Stato dei job di analisi asincrona, salvato nel database così che tutti i
+    worker uvicorn possano rispondere per qualsiasi job.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @staticmethod
+    def _expires_at() -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=settings.ANALYSIS_JOB_TTL_SECONDS)
+
+    @staticmethod
+    def _stale(older_than: float):
+        """Condizione dei job attivi senza aggiornamenti da più di older_than secondi"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+        return and_(
+            AnalysisJobModel.status.in_(ACTIVE_STATUSES),
+            func.coalesce(AnalysisJobModel.updated_at, AnalysisJobModel.created_at) < cutoff
+        )
+
+    @staticmethod
+    def _not_expired():
+        """Condizione dei job consultabili: attivi (expires_at NULL) o terminati da meno del TTL"""
+        return or_(
+            AnalysisJobModel.expires_at.is_(None),
+            AnalysisJobModel.expires_at >= datetime.now(timezone.utc)
+        )
+
+    async def fail_stale_jobs(self, older_than: Optional[float] = None) -> int:
+        """
+        Segna come falliti i job attivi senza aggiornamenti da più di older_than
+        secondi (predefinito ANALYSIS_JOB_LEASE_SECONDS): il processo che li
+        eseguiva è terminato senza registrarne l'esito.
+
+        Returns:
+            Numero di job segnati come falliti
+        """
+        if older_than is None:
+            older_than = settings.ANALYSIS_JOB_LEASE_SECONDS
+        try:
+            result = await self.db.execute(
+                update(AnalysisJobModel)
+                .where(self._stale(older_than))
+                .values(
+                    status="failed",
+                    error="Analisi interrotta",
+                    updated_at=datetime.now(timezone.utc),
+                    expires_at=self._expires_at()
+                )
+            )
+            await self.db.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'aggiornamento dei job di analisi interrotti: {str(e)}"
+            )
+
+    async def create_job(self, filename: Optional[str], matching_type: str) -> AnalysisJob:
+        """
+        Registra un nuovo job in coda. Prima segna come falliti i job interrotti
+        ed elimina i job terminati e scaduti, e quelli più vecchi di
+        ANALYSIS_JOB_MAX_AGE_SECONDS in qualsiasi stato.
+        """
+        await self.fail_stale_jobs()
+        try:
+            now = datetime.now(timezone.utc)
+            await self.db.execute(
+                delete(AnalysisJobModel).where(or_(
+                    and_(AnalysisJobModel.expires_at.is_not(None), AnalysisJobModel.expires_at < now),
+                    AnalysisJobModel.created_at < now - timedelta(seconds=settings.ANALYSIS_JOB_MAX_AGE_SECONDS)
+                ))
+            )
+            db_job = AnalysisJobModel(
+                id=uuid.uuid4().hex,
+                status="queued",
+                filename=filename,
+                matching_type=matching_type,
+                expires_at=None
+            )
+            self.db.add(db_job)
+            await self.db.commit()
+            await self.db.refresh(db_job)
+            return AnalysisJob.from_orm(db_job)
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante la creazione del job di analisi: {str(e)}"
+            )
+
+    async def count_active_jobs(self) -> int:
+        """
+        Conta i job in coda o in esecuzione, esclusi quelli interrotti.
+        """
+        try:
+            query = select(func.count()).select_from(AnalysisJobModel).where(
+                AnalysisJobModel.status.in_(ACTIVE_STATUSES),
+                ~self._stale(settings.ANALYSIS_JOB_LEASE_SECONDS)
+            )
+            return (await self.db.execute(query)).scalar_one()
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il conteggio dei job di analisi: {str(e)}"
+            )
+
+    async def get_job(self, job_id: str) -> Optional[Tuple[AnalysisJob, Optional[str]]]:
+        """
+        Recupera un job attivo o non ancora scaduto e, se completato, il suo
+        risultato JSON.
+        """
+        try:
+            query = select(AnalysisJobModel).where(
+                AnalysisJobModel.id == job_id,
+                self._not_expired()
+            )
+            db_job = (await self.db.execute(query)).scalar_one_or_none()
+            if db_job is None:
+                return None
+            return AnalysisJob.from_orm(db_job), db_job.result
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il recupero del job di analisi: {str(e)}"
+            )
+
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        """
+        Aggiorna stato, fase, risultato o errore di un job. La scadenza parte
+        quando il job termina (completed o failed): da quel momento resta
+        consultabile per ANALYSIS_JOB_TTL_SECONDS.
+        """
+        if fields.get("status") in ("completed", "failed"):
+            fields["expires_at"] = self._expires_at()
+        elif fields.get("status") in ACTIVE_STATUSES:
+            fields["expires_at"] = None
+        try:
+            await self.db.execute(
+                update(AnalysisJobModel)
+                .where(AnalysisJobModel.id == job_id)
+                .values(updated_at=datetime.now(timezone.utc), **fields)
+            )
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'aggiornamento del job di analisi: {str(e)}"
+            )
+
+    async def touch_job(self, job_id: str) -> None:
+        """
+        Rinnova updated_at di un job attivo, per segnalare che è ancora in esecuzione.
+        """
+        try:
+            await self.db.execute(
+                update(AnalysisJobModel)
+                .where(AnalysisJobModel.id == job_id, AnalysisJobModel.status.in_(ACTIVE_STATUSES))
+                .values(updated_at=datetime.now(timezone.utc))
+            )
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'aggiornamento del job di analisi: {str(e)}"
+            )
@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+class AnalysisPool:
+    """
+    Pool di processi per le elaborazioni CPU-bound (parsing, matching, indici),
+    così da non bloccare l'event loop del worker uvicorn.
+
+    Al massimo max_pending elaborazioni sincrone possono essere in corso o in
+    coda; oltre questo limite le richieste vengono rifiutate con 429. Le fasi
+    dei job in background sono contate a parte (background), così i job in
+    coda non consumano il limite delle richieste sincrone: il loro numero è
+    già limitato da ANALYSIS_MAX_JOBS.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.background = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> ProcessPoolExecutor:
+        """Crea il pool di processi, se non è già attivo, e lo restituisce"""
+        with self._lock:
+            if self._executor is None:
+                # spawn: il processo uvicorn ha già thread attivi, fork non è sicuro
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Termina il pool di processi, annullando le analisi ancora in coda"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Scarta un pool guasto. Più analisi possono fallire sullo stesso pool:
+        solo la prima lo termina, le altre lo trovano già rimosso o sostituito.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func: Callable[..., Any], *args: Any, limit: bool = True) -> Any:
+        """
+        Esegue func(*args) in un processo del pool.
+
+        Con limit=False l'elaborazione attende in coda senza limite ed è
+        contata in background invece che in pending, per i job in background
+        che hanno già superato il proprio controllo di ammissione.
+
+        Raises:
+            HTTPException: 429 se la coda è piena, 503 se il pool non è disponibile
+        """
+        if limit and self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Troppe analisi in corso, riprovare tra poco",
+                headers={"Retry-After": "5"}
+            )
+
+        executor = self.start()
+        if limit:
+            self.pending += 1
+        else:
+            self.background += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # Un processo è terminato in modo anomalo: il pool va ricreato
+            self._discard(executor)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servizio di analisi temporaneamente non disponibile",
+                headers={"Retry-After": "5"}
+            )
+        finally:
+            if limit:
+                self.pending -= 1
+            else:
+                self.background -= 1
+
+    def stats(self) -> dict:
+        """Restituisce dimensione del pool e analisi in corso o in coda, sincrone e dei job"""
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "background": self.background,
+        }
+
+analysis_pool = AnalysisPool(settings.ANALYSIS_POOL_SIZE, settings.ANALYSIS_MAX_PENDING)
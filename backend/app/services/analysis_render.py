@@ -0,0 +1,183 @@
+import io
+import os
+import tempfile
+from typing import Dict, Iterator, List, Any
+
+import orjson
+import pandas as pd
+
+from indici import indici_from_dataframe
+
+# Sezioni della risposta: nome nella risposta -> chiave del DataFrame
+SECTIONS = {
+    "raw_data": "raw",
+    "standardized_data": "matched",
+    "financial_indices": "indici",
+}
+
+# Formati di risposta di POST /analyze/
+RESPONSE_FORMATS = ("json", "ndjson", "arrow")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Righe serializzate per blocco nelle risposte in streaming
+STREAM_CHUNK_ROWS = 10000
+
+def _to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Converte un DataFrame in lista di dizionari (orjson scrive i NaN come null).
+
+    Equivale a to_dict(orient="records"), ma converte una colonna alla volta
+    con tolist invece di una riga alla volta.
+    """
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[column].tolist() for column in columns))]
+
+def render_response(frames: Dict[str, pd.DataFrame]) -> bytes:
+    """
+    Serializza in un unico documento JSON i risultati di un'analisi.
+
+    Eseguita in analysis_pool, così la conversione di risposte grandi non
+    blocca l'event loop.
+
+    Args:
+        frames: Dizionario con i DataFrame raw, matched, indici e matching_stats (AnalysisResult.frames)
+
+    Returns:
+        Corpo JSON con i dati grezzi, standardizzati, gli indici finanziari e
+        le statistiche del matching per livello
+    """
+    indici_anni = indici_from_dataframe(frames["indici"])
+
+    return orjson.dumps({
+        "raw_data": _to_records(frames["raw"]),
+        "standardized_data": _to_records(frames["matched"]),
+        "financial_indices": indici_anni,
+        "matching_stats": _to_records(frames["matching_stats"])
+    }, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+def iter_ndjson(frames: Dict[str, pd.DataFrame], chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Serializza i risultati di un'analisi come NDJSON, un blocco di righe alla volta.
+
+    Ogni riga è un record con il campo "section" (raw_data, standardized_data,
+    financial_indices o matching_stats) seguito dalle colonne del DataFrame
+    corrispondente; gli indici sono una riga per anno e indice (Anno, Indice,
+    Valore), le statistiche del matching una riga per livello.
+
+    Args:
+        frames: Dizionario con i DataFrame raw, matched, indici e matching_stats (AnalysisResult.frames)
+        chunk_rows: Righe serializzate per blocco
+
+    Yields:
+        Blocchi di righe NDJSON
+    """
+    for section, key in {**SECTIONS, "matching_stats": "matching_stats"}.items():
+        df = frames[key]
+        for start in range(0, len(df), chunk_rows):
+            records = _to_records(df.iloc[start:start + chunk_rows])
+            yield b"".join(
+                orjson.dumps({"section": section, **record}, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+                for record in records
+            )
+
+def to_arrow_table(frames: Dict[str, pd.DataFrame]):
+    """
+    Riunisce i risultati di un'analisi in un'unica tabella Arrow.
+
+    Le tre sezioni condividono lo schema section, Voce, Voce_Standard, Indice,
+    Anno, Valore; le colonne che non appartengono a una sezione sono null. Le
+    statistiche del matching sono nei metadati dello schema, come JSON nella
+    chiave matching_stats.
+    """
+    import pyarrow as pa
+
+    combined = pd.concat(
+        [frames[key].assign(section=section) for section, key in SECTIONS.items()],
+        ignore_index=True
+    ).reindex(columns=["section", "Voce", "Voce_Standard", "Indice", "Anno", "Valore"])
+
+    # Anni testuali e numerici nello stesso file: la colonna diventa testuale
+    if combined["Anno"].dtype == object:
+        combined["Anno"] = combined["Anno"].map(lambda anno: None if pd.isna(anno) else str(anno))
+
+    # Le voci si ripetono per ogni anno: colonne dizionario invece di stringhe ripetute
+    for column in ("section", "Voce", "Voce_Standard", "Indice"):
+        combined[column] = combined[column].astype("category")
+
+    table = pa.Table.from_pandas(combined, preserve_index=False)
+    return table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"matching_stats": orjson.dumps(_to_records(frames["matching_stats"]), option=orjson.OPT_SERIALIZE_NUMPY)
+    })
+
+def iter_arrow(frames: Dict[str, pd.DataFrame], chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Serializza i risultati di un'analisi come stream IPC Arrow, un record batch alla volta.
+
+    Args:
+        frames: Dizionario con i DataFrame raw, matched, indici e matching_stats (AnalysisResult.frames)
+        chunk_rows: Righe per record batch
+
+    Yields:
+        Blocchi dello stream IPC (schema, record batch, marcatore di fine)
+    """
+    import pyarrow as pa
+
+    table = to_arrow_table(frames)
+    sink = io.BytesIO()
+
+    def flush() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        yield flush()
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            writer.write_batch(batch)
+            yield flush()
+    yield flush()
+
+def render_to_file(frames: Dict[str, pd.DataFrame], response_format: str) -> str:
+    """
+    Scrive i risultati di un'analisi come NDJSON o stream IPC Arrow in un file
+    temporaneo, un blocco alla volta.
+
+    Eseguita in analysis_pool: il processo dell'API legge il file con
+    iter_file, senza tenere in memoria né convertire l'intero payload.
+
+    Args:
+        frames: Dizionario con i DataFrame raw, matched, indici e matching_stats (AnalysisResult.frames)
+        response_format: "ndjson" o "arrow"
+
+    Returns:
+        Percorso del file temporaneo, da rimuovere dopo la lettura
+    """
+    chunks = iter_ndjson(frames) if response_format == "ndjson" else iter_arrow(frames)
+    fd, path = tempfile.mkstemp(prefix="bilancismart-", suffix=f".{response_format}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def iter_file(path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Legge un file di render_to_file a blocchi e lo rimuove al termine, anche
+    se il client interrompe la risposta.
+    """
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
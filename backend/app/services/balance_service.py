@@ -1,17 +1,116 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterable, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete, tuple_
 from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
 from fastapi import HTTPException, status
-from datetime import datetime
+from datetime import date, datetime
+import base64
+import re
 
+from app.core.config import settings
 from app.models.sql.balance import BalanceModel
-from app.models.schemas import BalanceCreate, BalanceUpdate, Balance
+from app.models.sql.balance_item import BalanceItemModel
+from app.models.sql.balance_index import BalanceIndexModel
+from app.services.financial_data import flatten_financial_data, compute_balance_indices, voce_standard
+from app.models.schemas import (
+    BalanceCreate, BalanceUpdate, Balance, BalanceBulkError, BalanceBulkResult,
+    BalanceIndex, BalanceRanking
+)
+
+# Campi selezionabili con il parametro fields di GET /balances
+BALANCE_FIELDS = tuple(Balance.model_fields)
+
+def encode_cursor(balance_date: date, balance_id: int) -> str:
+    """Cursore opaco che punta al bilancio (balance_date, balance_id)"""
+    return base64.urlsafe_b64encode(f"{balance_date.isoformat()}|{balance_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Data e ID del bilancio a cui punta un cursore di encode_cursor"""
+    try:
+        balance_date, balance_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(balance_date), int(balance_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursore di paginazione non valido"
+        )
+
+# Filtro sulle voci di GET /balances: voce, operatore e valore (ad esempio "patrimonio_netto<0")
+FILTER_PATTERN = re.compile(r"^\s*([^<>=\s]+)\s*(<=|>=|<|>|=)\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\s*$")
+FILTER_OPERATORS = {
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "=": lambda column, value: column == value,
+}
+
+def parse_filters(filters: List[str]) -> List[Tuple[str, str, float]]:
+    """
+    Interpreta i filtri di GET /balances come (voce, operatore, valore).
+    
+    La voce è normalizzata come in balance_items: "patrimonio_netto" e
+    "passivo.patrimonio_netto" diventano entrambe "Patrimonio Netto".
+    """
+    parsed = []
+    for item in filters:
+        match = FILTER_PATTERN.match(item)
+        if match is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Filtro non valido: {item} (formato: voce<valore, con <, <=, >, >= o =)"
+            )
+        parsed.append((voce_standard(match.group(1)), match.group(2), float(match.group(3))))
+    return parsed
+
+def filter_clauses(filters: List[Tuple[str, str, float]], anno: Optional[int] = None) -> List[Any]:
+    """
+    Condizioni su BalanceModel.id per i filtri di parse_filters, risolte
+    sull'indice (voce_standard, valore) di balance_items.
+    """
+    clauses = []
+    for voce, operator, value in filters:
+        items = select(BalanceItemModel.balance_id).where(
+            BalanceItemModel.voce_standard == voce,
+            FILTER_OPERATORS[operator](BalanceItemModel.valore, value)
+        )
+        if anno is not None:
+            items = items.where(BalanceItemModel.anno == anno)
+        clauses.append(BalanceModel.id.in_(items))
+    return clauses
 
 class BalanceService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    async def _replace_derived(self, balances: List[Tuple[int, date, Dict[str, Any]]], replace: bool = True) -> Tuple[int, int]:
+        """
+        Riscrive le voci (balance_items) e gli indici (balance_indices) dei
+        bilanci (id, data, financial_data) nella transazione in corso.
+        
+        Returns:
+            Tuple (voci scritte, indici scritti)
+        """
+        if replace:
+            balance_ids = [balance[0] for balance in balances]
+            await self.db.execute(delete(BalanceItemModel).where(BalanceItemModel.balance_id.in_(balance_ids)))
+            await self.db.execute(delete(BalanceIndexModel).where(BalanceIndexModel.balance_id.in_(balance_ids)))
+        items = [
+            {
+                "balance_id": balance_id, "percorso": percorso, "voce_standard": voce_standard(percorso),
+                "anno": anno, "valore": valore
+            }
+            for balance_id, balance_date, financial_data in balances
+            for (percorso, anno), valore in flatten_financial_data(financial_data, balance_date.year).items()
+        ]
+        if items:
+            await self.db.execute(insert(BalanceItemModel), items)
+        indices = compute_balance_indices(balances)
+        if indices:
+            await self.db.execute(insert(BalanceIndexModel), indices)
+        return len(items), len(indices)
+
     async def create_balance(self, balance: BalanceCreate) -> Balance:
         """
         Crea un nuovo bilancio nel database.
@@ -23,6 +122,8 @@ class BalanceService:
                 financial_data=balance.financial_data
             )
             self.db.add(db_balance)
+            await self.db.flush()
+            await self._replace_derived([(db_balance.id, db_balance.date, db_balance.financial_data)], replace=False)
             await self.db.commit()
             await self.db.refresh(db_balance)
             return Balance.from_orm(db_balance)
@@ -33,6 +134,73 @@ class BalanceService:
                 detail=f"Errore durante la creazione del bilancio: {str(e)}"
             )
 
+    async def _insert_batch(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Inserisce un blocco di bilanci con INSERT ... RETURNING su più righe.
+        """
+        result = await self.db.execute(
+            insert(BalanceModel).returning(BalanceModel.id, sort_by_parameter_order=True),
+            rows
+        )
+        ids = list(result.scalars())
+        await self._replace_derived(
+            [(balance_id, row["date"], row["financial_data"]) for balance_id, row in zip(ids, rows)],
+            replace=False
+        )
+        return ids
+
+    async def create_balances(self, rows: AsyncIterable[Any]) -> BalanceBulkResult:
+        """
+        Crea più bilanci in un'unica transazione.
+        
+        I record validi vengono inseriti a blocchi di BALANCE_BULK_BATCH_SIZE;
+        quelli non validi vengono saltati e riportati con la loro posizione e
+        gli errori di validazione.
+        
+        Args:
+            rows: Record da importare, come dizionari o come testo JSON (una riga NDJSON)
+        """
+        ids: List[int] = []
+        errors: List[BalanceBulkError] = []
+        batch: List[Dict[str, Any]] = []
+        index = -1
+        try:
+            async for row in rows:
+                index += 1
+                if index >= settings.BALANCE_BULK_MAX_ROWS:
+                    await self.db.rollback()
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Troppi bilanci nella richiesta (massimo {settings.BALANCE_BULK_MAX_ROWS})"
+                    )
+                try:
+                    if isinstance(row, (bytes, str)):
+                        balance = BalanceCreate.model_validate_json(row)
+                    else:
+                        balance = BalanceCreate.model_validate(row)
+                except ValidationError as e:
+                    errors.append(BalanceBulkError(
+                        index=index,
+                        errors=e.errors(include_url=False, include_context=False, include_input=False)
+                    ))
+                    continue
+                
+                batch.append(balance.model_dump())
+                if len(batch) >= settings.BALANCE_BULK_BATCH_SIZE:
+                    ids.extend(await self._insert_batch(batch))
+                    batch = []
+            
+            if batch:
+                ids.extend(await self._insert_batch(batch))
+            await self.db.commit()
+            return BalanceBulkResult(created=len(ids), ids=ids, errors=errors)
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'importazione dei bilanci: {str(e)}"
+            )
+
     async def get_balance_by_id(self, balance_id: int) -> Optional[Balance]:
         """
         Recupera un bilancio dal database tramite ID.
@@ -50,20 +218,133 @@ class BalanceService:
                 detail=f"Errore durante il recupero del bilancio: {str(e)}"
             )
 
-    async def get_all_balances(self, skip: int = 0, limit: int = 100) -> List[Balance]:
+    async def get_all_balances(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        filters: Optional[List[Tuple[str, str, float]]] = None,
+        anno: Optional[int] = None
+    ) -> Tuple[List[Any], Optional[str]]:
         """
-        Recupera tutti i bilanci dal database con paginazione.
+        Recupera i bilanci dal database, ordinati per data e ID, una pagina alla volta.
+        
+        Con cursor la pagina riparte dopo l'ultimo bilancio della pagina
+        precedente (paginazione keyset sull'indice (date, id)) e skip viene
+        ignorato; con fields vengono lette solo le colonne indicate, più id e
+        date, e i bilanci sono restituiti come dizionari. filters (da
+        parse_filters) tiene solo i bilanci con voci che li soddisfano tutti,
+        per l'anno indicato se anno non è None.
+        
+        Returns:
+            Tuple (bilanci, cursore della pagina successiva o None se è l'ultima)
         """
+        order = (BalanceModel.date, BalanceModel.id)
+        if fields is None:
+            query = select(BalanceModel)
+        else:
+            columns = ["id", "date"] + [field for field in fields if field not in ("id", "date")]
+            query = select(*(getattr(BalanceModel, column) for column in columns))
+        query = query.where(*filter_clauses(filters or [], anno)).order_by(*order).limit(limit)
+        
+        if cursor is not None:
+            query = query.where(tuple_(*order) > tuple_(*decode_cursor(cursor)))
+        elif skip:
+            query = query.offset(skip)
+        
         try:
-            query = select(BalanceModel).offset(skip).limit(limit)
             result = await self.db.execute(query)
-            db_balances = result.scalars().all()
-            return [Balance.from_orm(balance) for balance in db_balances]
+            if fields is None:
+                balances = [Balance.from_orm(balance) for balance in result.scalars().all()]
+                last = (balances[-1].date, balances[-1].id) if balances else None
+            else:
+                balances = [dict(row) for row in result.mappings().all()]
+                last = (balances[-1]["date"], balances[-1]["id"]) if balances else None
         except SQLAlchemyError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Errore durante il recupero dei bilanci: {str(e)}"
             )
+        
+        next_cursor = encode_cursor(*last) if last is not None and len(balances) == limit else None
+        return balances, next_cursor
+
+    async def rebuild_derived(self) -> Dict[str, int]:
+        """
+        Ricalcola balance_items e balance_indices da financial_data per tutti
+        i bilanci, ad esempio per quelli salvati prima dell'introduzione delle
+        tabelle. Restituisce il numero di righe scritte per tabella.
+        """
+        try:
+            await self.db.execute(delete(BalanceItemModel))
+            await self.db.execute(delete(BalanceIndexModel))
+            written_items, written_indices, last_id = 0, 0, 0
+            while True:
+                result = await self.db.execute(
+                    select(BalanceModel.id, BalanceModel.date, BalanceModel.financial_data)
+                    .where(BalanceModel.id > last_id)
+                    .order_by(BalanceModel.id)
+                    .limit(settings.BALANCE_BULK_BATCH_SIZE)
+                )
+                balances = [tuple(row) for row in result.all()]
+                if not balances:
+                    break
+                items, indices = await self._replace_derived(balances, replace=False)
+                written_items += items
+                written_indices += indices
+                last_id = balances[-1][0]
+            await self.db.commit()
+            return {"voci": written_items, "indici": written_indices}
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il ricalcolo delle voci dei bilanci: {str(e)}"
+            )
+
+    async def get_balance_indices(self, balance_id: int) -> List[BalanceIndex]:
+        """
+        Recupera gli indici salvati di un bilancio, per anno e indice.
+        """
+        try:
+            query = (
+                select(BalanceIndexModel)
+                .where(BalanceIndexModel.balance_id == balance_id)
+                .order_by(BalanceIndexModel.anno, BalanceIndexModel.indice)
+            )
+            result = await self.db.execute(query)
+            return [BalanceIndex.from_orm(index) for index in result.scalars().all()]
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il recupero degli indici del bilancio: {str(e)}"
+            )
+
+    async def rank_balances(self, indice: str, anno: int, descending: bool = True, limit: int = 100) -> List[BalanceRanking]:
+        """
+        Classifica dei bilanci per valore di un indice in un anno, con
+        un'unica query sull'indice (indice, anno, valore) di balance_indices.
+        """
+        valore = BalanceIndexModel.valore.desc() if descending else BalanceIndexModel.valore.asc()
+        try:
+            query = (
+                select(
+                    BalanceIndexModel.balance_id, BalanceModel.name, BalanceModel.date,
+                    BalanceIndexModel.anno, BalanceIndexModel.valore
+                )
+                .join(BalanceModel, BalanceModel.id == BalanceIndexModel.balance_id)
+                .where(BalanceIndexModel.indice == indice, BalanceIndexModel.anno == anno)
+                .order_by(valore, BalanceIndexModel.balance_id)
+                .limit(limit)
+            )
+            result = await self.db.execute(query)
+            return [BalanceRanking(**row) for row in result.mappings().all()]
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante la classifica dei bilanci: {str(e)}"
+            )
 
     async def update_balance(self, balance_id: int, balance_update: BalanceUpdate) -> Optional[Balance]:
         """
@@ -77,10 +358,14 @@ class BalanceService:
                 return None
             
             update_data = balance_update.model_dump(exclude_unset=True)
+            previous = (db_balance.date, db_balance.financial_data)
             for key, value in update_data.items():
                 setattr(db_balance, key, value)
             
             db_balance.updated_at = datetime.now()
+            # Voci e indici dipendono solo da data e financial_data
+            if (db_balance.date, db_balance.financial_data) != previous:
+                await self._replace_derived([(db_balance.id, db_balance.date, db_balance.financial_data)])
             await self.db.commit()
             await self.db.refresh(db_balance)
             return Balance.from_orm(db_balance)
@@ -102,6 +387,8 @@ class BalanceService:
             if db_balance is None:
                 return False
             
+            await self.db.execute(delete(BalanceItemModel).where(BalanceItemModel.balance_id == balance_id))
+            await self.db.execute(delete(BalanceIndexModel).where(BalanceIndexModel.balance_id == balance_id))
             await self.db.delete(db_balance)
             await self.db.commit()
             return True
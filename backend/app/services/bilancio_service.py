@@ -1,47 +1,342 @@
-from typing import List, Optional
-from datetime import datetime
-from app.models.schemas import BilancioCreate, BilancioUpdate, Bilancio
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from sqlalchemy import select, delete, func, case, cast, literal_column, Integer, String
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.models.sql.bilancio import BilancioModel, BilancioRollupModel
+from app.models.schemas import BilancioCreate, BilancioUpdate, Bilancio, BilancioAggregato
+
+# Raggruppamenti e periodi di GET /bilanci/aggregati
+GROUP_FIELDS = ("categoria", "tipo")
+PERIODS = ("month", "quarter", "year")
+
+def to_utc(data: datetime) -> datetime:
+    """Converte una data in UTC; una data senza fuso orario è considerata già in UTC"""
+    if data.tzinfo is None:
+        return data.replace(tzinfo=timezone.utc)
+    return data.astimezone(timezone.utc)
+
+def period_label(data: datetime, period: str) -> str:
+    """Etichetta del periodo (in UTC) di una data: 2024-03, 2024-Q1 o 2024"""
+    data = to_utc(data)
+    if period == "month":
+        return data.strftime("%Y-%m")
+    if period == "quarter":
+        return f"{data.year}-Q{(data.month + 2) // 3}"
+    return str(data.year)
+
+def _month_period(mese, period: str):
+    """Espressione SQL del periodo a partire da un mese YYYY-MM"""
+    # Costanti scritte nel testo SQL: con parametri distinti Postgres non
+    # riconoscerebbe l'espressione del SELECT come quella del GROUP BY
+    if period == "month":
+        return mese
+    anno = func.substr(mese, literal_column("1"), literal_column("4"))
+    if period == "year":
+        return anno
+    numero_mese = cast(func.substr(mese, literal_column("6"), literal_column("2")), Integer)
+    trimestre = cast((numero_mese + literal_column("2", Integer)) // literal_column("3", Integer), String)
+    return anno.op("||")(literal_column("'-Q'")).op("||")(trimestre)
+
+def _period_expr(column, period: str, dialect: str):
+    """
+    Espressione SQL del periodo (in UTC) di una colonna data, per Postgres o
+    SQLite. SQLite non conserva il fuso orario: le date vengono salvate in UTC.
+    """
+    if dialect == "postgresql":
+        mese = func.to_char(column.op("AT TIME ZONE")(literal_column("'UTC'")), literal_column("'YYYY-MM'"))
+    else:
+        mese = func.strftime(literal_column("'%Y-%m'"), column)
+    return _month_period(mese, period)
 
 class BilancioService:
+    """
+    Voci di bilancio salvate nel database, condivise da tutti i worker uvicorn.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_bilancio(self, bilancio: BilancioCreate) -> Bilancio:
+        """
+        Crea una nuova voce di bilancio nel database.
+        """
+        try:
+            db_bilancio = BilancioModel(**{**bilancio.model_dump(), "data": to_utc(bilancio.data)})
+            self.db.add(db_bilancio)
+            if settings.BILANCI_ROLLUP:
+                await self._update_rollup(db_bilancio.categoria, db_bilancio.tipo, db_bilancio.data, db_bilancio.importo, 1)
+            await self.db.commit()
+            await self.db.refresh(db_bilancio)
+            return Bilancio.from_orm(db_bilancio)
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante la creazione della voce di bilancio: {str(e)}"
+            )
+
+    async def get_bilancio(self, bilancio_id: int) -> Optional[Bilancio]:
+        """
+        Recupera una voce di bilancio tramite ID.
+        """
+        try:
+            db_bilancio = await self.db.get(BilancioModel, bilancio_id)
+            if db_bilancio is None:
+                return None
+            return Bilancio.from_orm(db_bilancio)
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il recupero della voce di bilancio: {str(e)}"
+            )
+
+    async def get_bilanci(self, skip: int = 0, limit: int = 100) -> List[Bilancio]:
+        """
+        Recupera le voci di bilancio in ordine di ID, con paginazione.
+        """
+        try:
+            query = select(BilancioModel).order_by(BilancioModel.id).offset(skip).limit(limit)
+            result = await self.db.execute(query)
+            return [Bilancio.from_orm(bilancio) for bilancio in result.scalars().all()]
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il recupero delle voci di bilancio: {str(e)}"
+            )
+
+    async def update_bilancio(self, bilancio_id: int, bilancio_update: BilancioUpdate) -> Optional[Bilancio]:
+        """
+        Aggiorna una voce di bilancio esistente.
+        """
+        try:
+            db_bilancio = await self.db.get(BilancioModel, bilancio_id)
+            if db_bilancio is None:
+                return None
+
+            previous = (db_bilancio.categoria, db_bilancio.tipo, db_bilancio.data, db_bilancio.importo)
+            for key, value in bilancio_update.model_dump(exclude_unset=True).items():
+                setattr(db_bilancio, key, to_utc(value) if key == "data" and value is not None else value)
+
+            db_bilancio.updated_at = datetime.now()
+            if settings.BILANCI_ROLLUP:
+                await self._update_rollup(*previous[:3], -previous[3], -1)
+                await self._update_rollup(db_bilancio.categoria, db_bilancio.tipo, db_bilancio.data, db_bilancio.importo, 1)
+            await self.db.commit()
+            await self.db.refresh(db_bilancio)
+            return Bilancio.from_orm(db_bilancio)
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'aggiornamento della voce di bilancio: {str(e)}"
+            )
+
+    async def delete_bilancio(self, bilancio_id: int) -> bool:
+        """
+        Elimina una voce di bilancio con un'unica DELETE.
+        """
+        try:
+            result = await self.db.execute(
+                delete(BilancioModel)
+                .where(BilancioModel.id == bilancio_id)
+                .returning(BilancioModel.categoria, BilancioModel.tipo, BilancioModel.data, BilancioModel.importo)
+            )
+            deleted = result.one_or_none()
+            if deleted is not None and settings.BILANCI_ROLLUP:
+                await self._update_rollup(deleted.categoria, deleted.tipo, deleted.data, -deleted.importo, -1)
+            await self.db.commit()
+            return deleted is not None
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'eliminazione della voce di bilancio: {str(e)}"
+            )
+
+    def _dialect(self) -> str:
+        return self.db.get_bind().dialect.name
+
+    async def _update_rollup(self, categoria: str, tipo: str, data: datetime, importo: float, conteggio: int) -> None:
+        """
+        Aggiunge importo e conteggio (negativi per le voci rimosse) alla riga
+        di bilanci_rollup del mese, nella transazione in corso.
+        """
+        insert = postgresql.insert if self._dialect() == "postgresql" else sqlite.insert
+        statement = insert(BilancioRollupModel).values(
+            categoria=categoria, tipo=tipo, mese=period_label(data, "month"),
+            totale=importo, conteggio=conteggio
+        )
+        await self.db.execute(statement.on_conflict_do_update(
+            index_elements=["categoria", "tipo", "mese"],
+            set_={
+                "totale": BilancioRollupModel.totale + statement.excluded.totale,
+                "conteggio": BilancioRollupModel.conteggio + statement.excluded.conteggio,
+            }
+        ))
+
+    async def rebuild_rollup(self) -> int:
+        """
+        Ricalcola da zero bilanci_rollup, ad esempio dopo averlo attivato su
+        dati esistenti. Restituisce il numero di righe scritte.
+        """
+        mese = _period_expr(BilancioModel.data, "month", self._dialect())
+        try:
+            await self.db.execute(delete(BilancioRollupModel))
+            result = await self.db.execute(
+                BilancioRollupModel.__table__.insert().from_select(
+                    ["categoria", "tipo", "mese", "totale", "conteggio"],
+                    select(
+                        BilancioModel.categoria, BilancioModel.tipo, mese,
+                        func.sum(BilancioModel.importo), func.count()
+                    ).group_by(BilancioModel.categoria, BilancioModel.tipo, mese)
+                )
+            )
+            await self.db.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante il ricalcolo dei totali dei bilanci: {str(e)}"
+            )
+
+    async def aggregate_bilanci(
+        self,
+        group_by: List[str],
+        period: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> List[BilancioAggregato]:
+        """
+        Totali, conteggi e saldi delle voci di bilancio raggruppate per
+        categoria, tipo e periodo, calcolati dal database con GROUP BY.
+        
+        Con un periodo, saldo_progressivo è il saldo cumulato dei periodi
+        precedenti per ciascun gruppo (funzione finestra). Senza filtri di data
+        e con BILANCI_ROLLUP attivo, i totali vengono letti da bilanci_rollup.
+        """
+        use_rollup = settings.BILANCI_ROLLUP and date_from is None and date_to is None
+        if use_rollup:
+            source = BilancioRollupModel
+            totale = func.sum(source.totale)
+            conteggio = func.sum(source.conteggio)
+            saldo = func.sum(case((source.tipo == "entrata", source.totale), else_=-source.totale))
+            periodo = _month_period(source.mese, period) if period else None
+        else:
+            source = BilancioModel
+            totale = func.sum(source.importo)
+            conteggio = func.count()
+            saldo = func.sum(case((source.tipo == "entrata", source.importo), else_=-source.importo))
+            periodo = _period_expr(source.data, period, self._dialect()) if period else None
+
+        groups = [getattr(source, field) for field in group_by]
+        keys = groups + ([periodo.label("periodo")] if period else [])
+        columns = keys + [totale.label("totale"), conteggio.label("conteggio"), saldo.label("saldo")]
+        if period:
+            columns.append(
+                func.sum(saldo).over(partition_by=groups or None, order_by=periodo).label("saldo_progressivo")
+            )
+
+        # Senza gruppi e senza righe la GROUP BY restituirebbe comunque una riga con SUM NULL
+        query = select(*columns).group_by(*groups, *([periodo] if period else [])).having(conteggio > 0)
+        if date_from is not None:
+            query = query.where(BilancioModel.data >= to_utc(date_from))
+        if date_to is not None:
+            query = query.where(BilancioModel.data < to_utc(date_to))
+        query = query.order_by(*groups, *([periodo] if period else []))
+
+        try:
+            result = await self.db.execute(query)
+            return [BilancioAggregato(**row) for row in result.mappings().all()]
+        except SQLAlchemyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore durante l'aggregazione delle voci di bilancio: {str(e)}"
+            )
+
+class InMemoryBilancioService:
+    """
+    Voci di bilancio in memoria, indicizzate per ID (BILANCI_STORE="memory").
+
+    I dati non sopravvivono al riavvio e non sono condivisi tra i worker.
+    """
+
     def __init__(self):
-        # TODO: Inizializzare il database
-        self.bilanci = []
+        self.bilanci: Dict[int, Bilancio] = {}
         self.counter = 0
 
     async def create_bilancio(self, bilancio: BilancioCreate) -> Bilancio:
         self.counter += 1
+        now = datetime.now()
         new_bilancio = Bilancio(
             id=self.counter,
             **bilancio.model_dump(),
-            created_at=datetime.now(),
-            updated_at=datetime.now()
+            created_at=now,
+            updated_at=now
         )
-        self.bilanci.append(new_bilancio)
+        self.bilanci[new_bilancio.id] = new_bilancio
         return new_bilancio
 
     async def get_bilancio(self, bilancio_id: int) -> Optional[Bilancio]:
-        for bilancio in self.bilanci:
-            if bilancio.id == bilancio_id:
-                return bilancio
-        return None
+        return self.bilanci.get(bilancio_id)
 
     async def get_bilanci(self, skip: int = 0, limit: int = 100) -> List[Bilancio]:
-        return self.bilanci[skip:skip + limit]
+        # Gli ID crescono con l'inserimento: l'ordine del dizionario è l'ordine per ID
+        return list(islice(self.bilanci.values(), skip, skip + limit))
 
     async def update_bilancio(self, bilancio_id: int, bilancio_update: BilancioUpdate) -> Optional[Bilancio]:
-        for i, bilancio in enumerate(self.bilanci):
-            if bilancio.id == bilancio_id:
-                update_data = bilancio_update.model_dump(exclude_unset=True)
-                updated_bilancio = Bilancio(
-                    **{**bilancio.model_dump(), **update_data, "updated_at": datetime.now()}
-                )
-                self.bilanci[i] = updated_bilancio
-                return updated_bilancio
-        return None
+        bilancio = self.bilanci.get(bilancio_id)
+        if bilancio is None:
+            return None
+        update_data = bilancio_update.model_dump(exclude_unset=True)
+        updated_bilancio = Bilancio(
+            **{**bilancio.model_dump(), **update_data, "updated_at": datetime.now()}
+        )
+        self.bilanci[bilancio_id] = updated_bilancio
+        return updated_bilancio
 
     async def delete_bilancio(self, bilancio_id: int) -> bool:
-        for i, bilancio in enumerate(self.bilanci):
-            if bilancio.id == bilancio_id:
-                self.bilanci.pop(i)
-                return True
-        return False 
\ No newline at end of file
+        return self.bilanci.pop(bilancio_id, None) is not None
+
+    async def aggregate_bilanci(
+        self,
+        group_by: List[str],
+        period: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> List[BilancioAggregato]:
+        totals: Dict[Tuple, List[Any]] = defaultdict(lambda: [0.0, 0, 0.0])
+        date_from = to_utc(date_from) if date_from is not None else None
+        date_to = to_utc(date_to) if date_to is not None else None
+        for bilancio in self.bilanci.values():
+            data = to_utc(bilancio.data)
+            if (date_from is not None and data < date_from) or (date_to is not None and data >= date_to):
+                continue
+            key = tuple(getattr(bilancio, field) for field in group_by)
+            key += (period_label(bilancio.data, period),) if period else ()
+            group = totals[key]
+            group[0] += bilancio.importo
+            group[1] += 1
+            group[2] += bilancio.importo if bilancio.tipo == "entrata" else -bilancio.importo
+
+        aggregati = []
+        progressivi: Dict[Tuple, float] = defaultdict(float)
+        for key in sorted(totals):
+            totale, conteggio, saldo = totals[key]
+            fields = dict(zip(group_by, key))
+            if period:
+                fields["periodo"] = key[-1]
+                progressivi[key[:-1]] += saldo
+                fields["saldo_progressivo"] = progressivi[key[:-1]]
+            aggregati.append(BilancioAggregato(**fields, totale=totale, conteggio=conteggio, saldo=saldo))
+        return aggregati
+
+# Archivio in memoria condiviso dalle richieste di questo processo
+memory_bilancio_service = InMemoryBilancioService()
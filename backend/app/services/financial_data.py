@@ -0,0 +1,90 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date
+import unicodedata
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add the parent directory to the path to import the modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from indici import VOCI_SP_INDICI, VOCI_CE_INDICI, calcola_indici_batch
+
+def flatten_financial_data(financial_data: Dict[str, Any], anno: int) -> Dict[Tuple[str, int], float]:
+    """
+    Voci numeriche di financial_data come {(voce, anno): valore}.
+
+    Le chiavi annidate vengono unite con un punto ("passivo.debiti"); una
+    chiave che è un anno ("2023") assegna l'anno alle voci che contiene, le
+    altre usano l'anno del bilancio.
+    """
+    items: Dict[Tuple[str, int], float] = {}
+
+    def visit(data: Dict[str, Any], prefix: str, anno: int) -> None:
+        for key, value in data.items():
+            key = str(key)
+            if isinstance(value, dict):
+                if len(key) == 4 and key.isdigit():
+                    visit(value, prefix, int(key))
+                else:
+                    visit(value, f"{prefix}{key}.", anno)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                items[(f"{prefix}{key}", anno)] = float(value)
+
+    visit(financial_data, "", anno)
+    return items
+
+def _normalizza(nome: str) -> str:
+    """Nome di voce senza accenti, maiuscole e separatori ("disponibilita_liquide")"""
+    nome = unicodedata.normalize("NFKD", nome)
+    nome = "".join(c for c in nome if not unicodedata.combining(c))
+    return "_".join(nome.lower().replace("-", " ").replace("_", " ").split())
+
+# Voci standard usate dagli indici, per nome normalizzato
+VOCI_INDICI = {_normalizza(voce): voce for voce in VOCI_SP_INDICI + VOCI_CE_INDICI}
+
+def voce_indice(percorso: str) -> Optional[str]:
+    """
+    Voce standard di un percorso di financial_data, riconosciuta dall'ultima
+    parte ("passivo.patrimonio_netto" -> "Patrimonio Netto"), o None.
+    """
+    return VOCI_INDICI.get(_normalizza(percorso.rsplit(".", 1)[-1]))
+
+def voce_standard(percorso: str) -> str:
+    """Voce standard di un percorso, o il percorso stesso se non è una voce degli indici"""
+    return voce_indice(percorso) or percorso
+
+def compute_balance_indices(balances: List[Tuple[int, date, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Calcola gli indici di più bilanci (id, data, financial_data) in una sola passata.
+
+    Le voci di financial_data vengono riconosciute dall'ultima parte del
+    percorso ("passivo.patrimonio_netto" -> "Patrimonio Netto"); per ogni
+    bilancio e anno con almeno una voce riconosciuta si calcolano gli indici
+    con calcola_indici_batch. Le voci assenti in un bilancio e anno restano
+    NaN, quindi non vengono restituiti gli indici che le usano (ad esempio il
+    ROE senza utile netto) né quelli non definiti (denominatore zero).
+
+    Returns:
+        Righe di balance_indices (balance_id, indice, anno, valore)
+    """
+    voci: Dict[Tuple[int, int], Dict[str, float]] = {}
+    for balance_id, balance_date, financial_data in balances:
+        for (percorso, anno), valore in flatten_financial_data(financial_data, balance_date.year).items():
+            voce = voce_indice(percorso)
+            if voce is not None:
+                voci.setdefault((balance_id, anno), {})[voce] = valore
+    if not voci:
+        return []
+
+    # Tutte le voci come colonne: una voce che nessun bilancio contiene resta NaN e non vale 0
+    df = pd.DataFrame.from_dict(voci, orient="index").reindex(columns=VOCI_SP_INDICI + VOCI_CE_INDICI)
+    indici = calcola_indici_batch(df)
+    valori = indici.to_numpy()
+    chiavi = list(voci)
+    nomi = list(indici.columns)
+    return [
+        {"balance_id": chiavi[i][0], "indice": nomi[j], "anno": chiavi[i][1], "valore": float(valori[i, j])}
+        for i, j in zip(*np.nonzero(np.isfinite(valori)))
+    ]
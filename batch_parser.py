@@ -0,0 +1,154 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from parser import parse_file
+
+# Colonne del DataFrame unificato
+BATCH_COLUMNS = ["File", "Foglio", "Azienda", "Voce", "Anno", "Valore"]
+
+def list_sheets(path: str) -> List[Optional[str]]:
+    """
+    Elenca i fogli di un file di bilancio senza caricarne il contenuto.
+
+    Args:
+        path: Percorso del file (.xlsx, .xlsb, .csv o .parquet)
+
+    Returns:
+        Lista dei nomi dei fogli; [None] per i formati con una sola tabella
+    """
+    estensione = os.path.splitext(path)[1].lower()
+    if estensione == ".xlsb":
+        from pyxlsb import open_workbook
+
+        with open_workbook(path) as workbook:
+            return list(workbook.sheets)
+    if estensione in (".csv", ".parquet"):
+        return [None]
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+def parse_workbook(path: str, azienda: Optional[str] = None,
+                   streaming: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Legge tutti i fogli di una cartella di lavoro (o l'unica tabella di un file
+    CSV o Parquet) in un unico DataFrame.
+
+    Un foglio che non si riesce a leggere viene riportato tra gli errori senza
+    interrompere la lettura degli altri fogli.
+
+    Args:
+        path: Percorso del file di bilancio
+        azienda: Nome dell'azienda (default: nome del file senza estensione)
+        streaming: Se True usa la lettura in streaming per i file .xlsx
+
+    Returns:
+        Tuple (DataFrame con colonne BATCH_COLUMNS, report con file, fogli letti,
+        record, durata in secondi ed eventuali errori per foglio)
+    """
+    start = time.perf_counter()
+    azienda = azienda or os.path.splitext(os.path.basename(path))[0]
+    report = {"file": path, "azienda": azienda, "fogli": 0, "record": 0, "errori": {}}
+
+    frames = []
+    for foglio in list_sheets(path):
+        try:
+            df = parse_file(path, sheet_name=foglio if foglio is not None else 0, streaming=streaming)
+        except Exception as e:
+            report["errori"][foglio or "*"] = str(e)
+            continue
+        report["fogli"] += 1
+        if df.empty:
+            continue
+        frames.append(df.assign(File=os.path.basename(path), Foglio=foglio or "", Azienda=azienda))
+
+    result = pd.concat(frames, ignore_index=True)[BATCH_COLUMNS] if frames else pd.DataFrame(columns=BATCH_COLUMNS)
+    report["record"] = len(result)
+    report["seconds"] = time.perf_counter() - start
+    return result, report
+
+def parse_workbooks(paths: List[str], aziende: Optional[Dict[str, str]] = None,
+                    max_workers: Optional[int] = None,
+                    streaming: bool = False) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Legge in parallelo tutti i fogli di più cartelle di lavoro.
+
+    Ogni file viene elaborato in un processo separato di un ProcessPoolExecutor;
+    un file che non si riesce a leggere viene riportato nel report con il
+    relativo errore senza interrompere il resto dell'elaborazione.
+
+    Args:
+        paths: Percorsi dei file di bilancio
+        aziende: Nome dell'azienda per percorso (default: nome del file)
+        max_workers: Numero di processi (default: numero di CPU)
+        streaming: Se True usa la lettura in streaming per i file .xlsx
+
+    Returns:
+        Tuple (DataFrame unificato con colonne BATCH_COLUMNS, report per file
+        nell'ordine di paths)
+    """
+    aziende = aziende or {}
+    frames: Dict[str, pd.DataFrame] = {}
+    reports: Dict[str, Dict[str, Any]] = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(parse_workbook, path, aziende.get(path), streaming): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                frames[path], reports[path] = future.result()
+            except Exception as e:
+                reports[path] = {"file": path, "azienda": aziende.get(path), "fogli": 0,
+                                 "record": 0, "errori": {"*": str(e)}, "seconds": None}
+
+    # Mantieni l'ordine dei file in ingresso
+    ordered = [frames[path] for path in paths if path in frames and not frames[path].empty]
+    result = pd.concat(ordered, ignore_index=True) if ordered else pd.DataFrame(columns=BATCH_COLUMNS)
+    return result, [reports[path] for path in paths]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Importazione da riga di comando di più bilanci in un unico file"""
+    parser = argparse.ArgumentParser(
+        description="Legge in parallelo tutti i fogli di più file di bilancio (.xlsx, .xlsb, .csv, .parquet)."
+    )
+    parser.add_argument("files", nargs="+", help="File di bilancio da importare")
+    parser.add_argument("-o", "--output", required=True, help="File di destinazione (.csv o .parquet)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Numero di processi")
+    parser.add_argument("--streaming", action="store_true", help="Lettura in streaming a memoria ridotta")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df, reports = parse_workbooks(args.files, max_workers=args.workers, streaming=args.streaming)
+
+    if args.output.endswith(".parquet"):
+        df.astype({"Anno": str}).to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+
+    falliti = 0
+    for report in reports:
+        durata = f"{report['seconds']:.2f} s" if report["seconds"] is not None else "-"
+        print(f"{report['file']}: {report['fogli']} fogli, {report['record']} record, {durata}")
+        for foglio, errore in report["errori"].items():
+            print(f"  errore [{foglio}]: {errore}", file=sys.stderr)
+        falliti += bool(report["errori"])
+
+    print(f"Totale: {len(df)} record da {len(reports)} file in {time.perf_counter() - start:.2f} s, "
+          f"{falliti} file con errori")
+    return 1 if falliti else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Benchmark del tempo CPU per richiesta della pipeline di analisi.
+
+Confronta le pipeline precedenti dell'endpoint /analyze (organize_data sulle
+voci grezze più un matching i cui risultati non venivano usati) e delle app
+Streamlit (matching, poi dizionari annidati per anno) con il servizio comune
+analysis.analyze, che esegue ogni fase una sola volta sulle voci
+standardizzate.
+
+La cache del matching resta attiva (in memoria) per tutte le varianti, così il
+confronto misura il lavoro di parsing, organizzazione e calcolo degli indici.
+
+Uso:
+    python benchmarks/bench_analyze.py [n_voci] [n_anni] [ripetizioni]
+"""
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault("BILANCISMART_MAPPING_CACHE", "")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze
+from bench_matching import make_piano_dei_conti
+from indici import calcola_indici_per_anni, indici_to_dataframe
+from matching import apply_matching
+from parser import parse_file, organize_data
+
+
+def make_csv(n_voci: int, n_anni: int, seed: int = 42) -> bytes:
+    """Bilancio sintetico in formato largo (una riga per voce, una colonna per anno)."""
+    rng = np.random.default_rng(seed)
+    anni = list(range(2025 - n_anni, 2025))
+    righe = [",".join(["Voce"] + [str(anno) for anno in anni])]
+    for voce in make_piano_dei_conti(n_voci, seed=seed):
+        valori = rng.uniform(0, 1e6, size=n_anni).round(2)
+        righe.append(",".join([f'"{voce}"'] + [str(v) for v in valori]))
+    return "\n".join(righe).encode("utf-8")
+
+
+def legacy_api(contents: bytes, matching_type: str):
+    """Pipeline precedente di POST /analyze/"""
+    df_raw = parse_file(io.BytesIO(contents), filename="bilancio.csv")
+    stato_patrimoniale, conto_economico = organize_data(df_raw)
+    df_standardized = apply_matching(df_raw, matching_type)
+    indici = calcola_indici_per_anni(stato_patrimoniale, conto_economico)
+    return df_standardized, indici_to_dataframe(indici)
+
+
+def legacy_streamlit(contents: bytes, matching_type: str):
+    """Pipeline precedente di main.py / streamlit/main.py"""
+    df = parse_file(io.BytesIO(contents), filename="bilancio.csv")
+    df_matched = apply_matching(df, matching_type)
+    stato_patrimoniale, conto_economico = organize_data(df_matched)
+    indici = calcola_indici_per_anni(stato_patrimoniale, conto_economico)
+    return df_matched, indici_to_dataframe(indici)
+
+
+def cpu_time(func, repeats: int) -> float:
+    """Tempo CPU medio per chiamata, in ms"""
+    func()  # riscaldamento: import, cache del matching
+    start = time.process_time()
+    for _ in range(repeats):
+        func()
+    return (time.process_time() - start) / repeats * 1000
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_anni = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    contents = make_csv(n_voci, n_anni)
+    print(f"{n_voci} voci x {n_anni} anni, matching fuzzy, {repeats} ripetizioni")
+
+    for nome, func in (
+        ("API precedente", lambda: legacy_api(contents, "fuzzy")),
+        ("Streamlit precedente", lambda: legacy_streamlit(contents, "fuzzy")),
+        ("analysis.analyze", lambda: analyze(contents, filename="bilancio.csv", matching_type="fuzzy")),
+    ):
+        print(f"{nome:22} {cpu_time(func, repeats):9.1f} ms CPU per richiesta")
+
+
+if __name__ == "__main__":
+    main()
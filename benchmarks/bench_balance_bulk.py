@@ -0,0 +1,103 @@
+"""
+Benchmark dell'importazione di bilanci: POST /balances/ un record alla volta
+contro POST /balances/bulk (array JSON e NDJSON).
+
+Avvia l'API (backend/app) con uvicorn su un database SQLite temporaneo, oppure
+sul database indicato in BENCH_DATABASE_URL (ad esempio un Postgres locale), e
+misura i bilanci inseriti al secondo.
+
+Uso:
+    python benchmarks/bench_balance_bulk.py [n_bilanci]
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_balances(n: int, seed: int = 42) -> list:
+    """Bilanci sintetici: dieci anni di storico per ogni azienda."""
+    rng = np.random.default_rng(seed)
+    balances = []
+    for i in range(n):
+        valori = rng.uniform(0, 1e6, size=4).round(2)
+        balances.append({
+            "name": f"Azienda {i // 10}",
+            "date": f"{2015 + i % 10}-12-31",
+            "financial_data": {
+                "attivo": {"circolante": valori[0], "immobilizzazioni": valori[1]},
+                "passivo": {"debiti": valori[2], "patrimonio_netto": valori[3]},
+            },
+        })
+    return balances
+
+
+def post(conn: http.client.HTTPConnection, path: str, body: bytes, content_type: str) -> dict:
+    conn.request("POST", path, body=body, headers={"Content-Type": content_type})
+    response = conn.getresponse()
+    data = response.read()
+    if response.status != 201:
+        raise RuntimeError(f"{path}: HTTP {response.status} {data[:200]!r}")
+    return json.loads(data)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    balances = make_balances(n)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = os.environ.get(
+            "BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        )
+        env = dict(os.environ, DATABASE_URL=database_url)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=os.path.join(ROOT, "backend"), env=env, stdout=subprocess.DEVNULL
+        )
+        try:
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            print(f"{n} bilanci su {database_url.split(':')[0]}")
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+
+            start = time.perf_counter()
+            for balance in balances:
+                post(conn, "/api/v1/balances/", json.dumps(balance).encode("utf-8"), "application/json")
+            elapsed = time.perf_counter() - start
+            print(f"{'POST /balances/ x ' + str(n):26} {elapsed:7.2f} s  {n / elapsed:9.0f} bilanci/s")
+
+            for nome, body, content_type in (
+                ("POST /bulk (array JSON)", json.dumps(balances).encode("utf-8"), "application/json"),
+                ("POST /bulk (NDJSON)", "\n".join(json.dumps(b) for b in balances).encode("utf-8"),
+                 "application/x-ndjson"),
+            ):
+                start = time.perf_counter()
+                result = post(conn, "/api/v1/balances/bulk", body, content_type)
+                elapsed = time.perf_counter() - start
+                assert result["created"] == n and not result["errors"], result["errors"][:3]
+                print(f"{nome:26} {elapsed:7.2f} s  {n / elapsed:9.0f} bilanci/s")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Verifica e benchmark dei filtri sulle voci di GET /balances.
+
+Importa n bilanci sintetici con BalanceService.create_balances (che popola
+balance_items), controlla con EXPLAIN che il filtro "patrimonio netto
+negativo" usi l'indice ix_balance_items_voce_valore e confronta il tempo della
+query filtrata con la lettura di tutti i financial_data filtrati in Python.
+Esce con errore se il piano non usa l'indice.
+
+Il database è SQLite temporaneo, oppure quello indicato in BENCH_DATABASE_URL
+(ad esempio un Postgres locale).
+
+Uso:
+    python benchmarks/bench_balance_filters.py [n_bilanci]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ.get(
+    "BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(TMP, 'bench.db')}"
+)
+sys.path.append(os.path.join(ROOT, "backend"))
+
+from sqlalchemy import select, text
+
+from app.db.base import AsyncSessionLocal, Base, engine
+from app.models.sql.balance import BalanceModel
+from app.services.balance_service import BalanceService, filter_clauses, parse_filters
+
+FILTRO = "patrimonio_netto<0"
+INDICE = "ix_balance_items_voce_valore"
+
+
+async def records(n: int, seed: int = 42):
+    """Bilanci sintetici: circa l'1% con patrimonio netto negativo"""
+    rng = random.Random(seed)
+    for i in range(n):
+        yield {
+            "name": f"Azienda {i // 10}",
+            "date": f"{2015 + i % 10}-12-31",
+            "financial_data": {
+                "attivo": {"circolante": rng.uniform(0, 1e6), "immobilizzazioni": rng.uniform(0, 1e6)},
+                "passivo": {"debiti": rng.uniform(0, 1e6), "patrimonio_netto": rng.uniform(-1e4, 1e6)},
+            },
+        }
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dialect = engine.dialect.name
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        result = await BalanceService(db).create_balances(records(n))
+        print(f"{result.created} bilanci importati su {dialect} in {time.perf_counter() - start:.1f} s")
+        await db.execute(text("ANALYZE"))
+        await db.commit()
+
+        query = select(BalanceModel.id).where(*filter_clauses(parse_filters([FILTRO])))
+        sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+        explain = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+        plan = "\n".join(" ".join(str(value) for value in row) for row in (await db.execute(text(explain + sql))).all())
+        print(f"piano di {FILTRO}:\n{plan}")
+
+        start = time.perf_counter()
+        ids = set((await db.execute(query)).scalars().all())
+        indexed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = (await db.execute(select(BalanceModel.id, BalanceModel.financial_data))).all()
+        scanned = {
+            balance_id for balance_id, data in rows
+            if data.get("passivo", {}).get("patrimonio_netto", 0) < 0
+        }
+        scan = time.perf_counter() - start
+
+        assert ids == scanned, "il filtro su balance_items non coincide con la scansione del JSON"
+        print(f"{len(ids)} bilanci trovati: indice {indexed * 1000:.1f} ms, scansione del JSON {scan * 1000:.1f} ms")
+
+    await engine.dispose()
+    if INDICE not in plan:
+        sys.exit(f"il piano non usa {INDICE}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
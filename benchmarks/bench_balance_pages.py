@@ -0,0 +1,121 @@
+"""
+Benchmark della paginazione di GET /balances su una tabella grande.
+
+Avvia l'API (backend/app) con uvicorn su un database SQLite temporaneo, lo
+riempie con n bilanci e misura il tempo di risposta di una pagina a diverse
+profondità con skip (OFFSET) e con cursor (keyset su (date, id)), e la
+dimensione della pagina con e senza la proiezione fields.
+
+Uso:
+    python benchmarks/bench_balance_pages.py [n_bilanci] [limit]
+"""
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import date, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fill(path: str, n: int, seed: int = 42, batch: int = 50000) -> None:
+    """Inserisce n bilanci sintetici direttamente nel database SQLite."""
+    rng = np.random.default_rng(seed)
+    start = date(2000, 1, 1)
+    conn = sqlite3.connect(path)
+    for offset in range(0, n, batch):
+        size = min(batch, n - offset)
+        giorni = rng.integers(0, 9000, size=size)
+        valori = rng.uniform(0, 1e6, size=(size, 4)).round(2)
+        conn.executemany(
+            "INSERT INTO balances (name, date, financial_data, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            [
+                (f"Azienda {offset + i}", (start + timedelta(days=int(g))).isoformat(), json.dumps({
+                    "attivo": {"circolante": v[0], "immobilizzazioni": v[1]},
+                    "passivo": {"debiti": v[2], "patrimonio_netto": v[3]},
+                }))
+                for i, (g, v) in enumerate(zip(giorni, valori))
+            ]
+        )
+    conn.commit()
+    conn.close()
+
+
+def get(url: str, repeats: int = 5):
+    """Tempo mediano in ms e dimensione in byte della risposta."""
+    tempi = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=600) as response:
+            body = response.read()
+        tempi.append((time.perf_counter() - start) * 1000)
+    return statistics.median(tempi), len(body)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base = f"http://127.0.0.1:{port}/api/v1/balances/"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+        sys.path.append(os.path.join(ROOT, "backend"))
+        from app.services.balance_service import encode_cursor
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=os.path.join(ROOT, "backend"), env=dict(os.environ), stdout=subprocess.DEVNULL
+        )
+        try:
+            # Le tabelle vengono create all'avvio dell'API
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            start = time.perf_counter()
+            fill(path, n)
+            print(f"{n} bilanci inseriti in {time.perf_counter() - start:.0f} s, pagine da {limit}")
+
+            conn = sqlite3.connect(path)
+            for profondita in (0, n // 10, n // 2, n - limit):
+                ms_offset, _ = get(f"{base}?skip={profondita}&limit={limit}")
+                if profondita:
+                    cursor = encode_cursor(*[
+                        date.fromisoformat(value) if i == 0 else value
+                        for i, value in enumerate(conn.execute(
+                            "SELECT date, id FROM balances ORDER BY date, id LIMIT 1 OFFSET ?",
+                            (profondita - 1,)
+                        ).fetchone())
+                    ])
+                    ms_keyset, _ = get(f"{base}?cursor={cursor}&limit={limit}")
+                else:
+                    ms_keyset, _ = get(f"{base}?limit={limit}")
+                print(f"pagina a {profondita:>9}: skip {ms_offset:8.1f} ms   cursor {ms_keyset:8.1f} ms")
+            conn.close()
+
+            for nome, query in (("completa", ""), ("fields=name", "&fields=name")):
+                ms, size = get(f"{base}?limit={limit}{query}")
+                print(f"pagina {nome:12} {ms:8.1f} ms  {size / 1024:8.1f} KB")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
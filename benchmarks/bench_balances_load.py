@@ -0,0 +1,129 @@
+"""
+Prova di carico di /balances con diverse configurazioni del pool di connessioni.
+
+Per ogni configurazione avvia l'API (backend/app) con uvicorn, importa n
+bilanci con POST /balances/bulk e poi, con più client concorrenti, alterna
+per una durata fissa letture di pagine (GET /balances/) e di singoli bilanci
+(GET /balances/{id}). Riporta richieste al secondo, latenze e le metriche di
+GET /db/pool alla fine del carico.
+
+Il database è SQLite temporaneo, oppure quello indicato in BENCH_DATABASE_URL
+(ad esempio un Postgres locale).
+
+Uso:
+    python benchmarks/bench_balances_load.py [concorrenza] [secondi] [n_bilanci]
+"""
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Configurazioni confrontate: quella precedente (log di ogni query, nessun pool
+# su SQLite, pool predefinito 5 + 10 su Postgres) e quella predefinita ora
+CONFIGURAZIONI = {
+    "precedente": {"DB_ECHO": "true", "DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10", "DB_POOL_PRE_PING": "false"},
+    "attuale": {},
+}
+
+
+def client(port: int, n: int, stop: threading.Event, latenze: list, errori: list) -> None:
+    """Client HTTP con connessione persistente: 4 pagine ogni lettura singola"""
+    rng = random.Random()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while not stop.is_set():
+        if rng.random() < 0.8:
+            path = f"/api/v1/balances/?skip={rng.randrange(max(n - 20, 1))}&limit=20"
+        else:
+            path = f"/api/v1/balances/{rng.randrange(1, n + 1)}"
+        start = time.perf_counter()
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        latenze.append((time.perf_counter() - start) * 1000)
+        if response.status != 200:
+            errori.append(response.status)
+
+
+def run(nome: str, overrides: dict, concorrenza: int, secondi: float, n: int, database_url: str) -> None:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    if nome == "precedente" and database_url.startswith("sqlite"):
+        overrides = dict(overrides, DB_POOL_SIZE="0")
+    env = dict(os.environ, DATABASE_URL=database_url, **overrides)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.join(ROOT, "backend"), env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base + "/ping", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        balances = [
+            {"name": f"Azienda {i}", "date": f"{2015 + i % 10}-12-31",
+             "financial_data": {"attivo": {"circolante": i}, "passivo": {"debiti": i}}}
+            for i in range(n)
+        ]
+        request = urllib.request.Request(
+            base + "/api/v1/balances/bulk", data=json.dumps(balances).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        urllib.request.urlopen(request, timeout=600).read()
+
+        stop = threading.Event()
+        latenze, errori = [], []
+        threads = [
+            threading.Thread(target=client, args=(port, n, stop, latenze, errori))
+            for _ in range(concorrenza)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(secondi)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        with urllib.request.urlopen(base + "/api/v1/db/pool", timeout=10) as response:
+            pool = json.loads(response.read())
+        latenze.sort()
+        p95 = latenze[min(len(latenze) - 1, int(len(latenze) * 0.95))]
+        print(f"{nome:11} {len(latenze) / secondi:8.0f} req/s  p50 {statistics.median(latenze):7.1f} ms  "
+              f"p95 {p95:7.1f} ms  errori {len(errori)}")
+        print(f"{'':11} pool: {json.dumps(pool)}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    concorrenza = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    secondi = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    print(f"{concorrenza} client concorrenti per {secondi:.0f} s, {n} bilanci")
+
+    for nome, overrides in CONFIGURAZIONI.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            database_url = os.environ.get(
+                "BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+            )
+            run(nome, overrides, concorrenza, secondi, n, database_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Verifica e benchmark delle aggregazioni di GET /bilanci/aggregati.
+
+Confronta, per ogni combinazione di raggruppamento, periodo e filtri di data,
+i risultati dell'archivio SQL (GROUP BY sulla tabella bilanci e, senza filtri
+di data, bilanci_rollup) con quelli dell'archivio in memoria, prima su un
+database vuoto e poi con n voci, e riporta la latenza mediana di ciascuno.
+Esce con errore se i risultati non coincidono.
+
+Uso:
+    python benchmarks/bench_bilanci_aggregati.py [n_voci]
+"""
+import asyncio
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(TMP, 'bench.db')}"
+sys.path.append(os.path.join(ROOT, "backend"))
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal, Base, engine
+from app.models.sql.bilancio import BilancioModel
+from app.services.bilancio_service import BilancioService, InMemoryBilancioService, to_utc
+from bench_bilanci_crud import make_bilanci
+
+GROUP_BY = ([], ["categoria"], ["categoria", "tipo"])
+PERIODS = (None, "month", "quarter", "year")
+# Nessun filtro, un anno, un intervallo senza voci
+DATE_RANGES = (
+    (None, None),
+    (datetime(2021, 1, 1, tzinfo=timezone.utc), datetime(2022, 1, 1, tzinfo=timezone.utc)),
+    (datetime(2099, 1, 1, tzinfo=timezone.utc), None),
+)
+
+
+def normalize(aggregati) -> list:
+    return [
+        (a.categoria, a.tipo, a.periodo, a.conteggio, a.totale, a.saldo, a.saldo_progressivo)
+        for a in aggregati
+    ]
+
+
+def same(attesi: list, ottenuti: list) -> bool:
+    if len(attesi) != len(ottenuti):
+        return False
+    for riga_attesa, riga in zip(attesi, ottenuti):
+        for atteso, valore in zip(riga_attesa, riga):
+            if isinstance(atteso, float) and isinstance(valore, float):
+                if not math.isclose(atteso, valore, rel_tol=1e-9, abs_tol=1e-6):
+                    return False
+            elif atteso != valore:
+                return False
+    return True
+
+
+async def check(memory: InMemoryBilancioService, repeats: int) -> list:
+    """Confronta SQL e memoria su tutti i casi; restituisce le discordanze"""
+    errori = []
+    tempi = {"sql": [], "rollup": [], "memoria": []}
+    for group_by in GROUP_BY:
+        for period in PERIODS:
+            for date_from, date_to in DATE_RANGES:
+                caso = f"group_by={group_by} period={period} date_from={date_from} date_to={date_to}"
+                start = time.perf_counter()
+                attesi = normalize(await memory.aggregate_bilanci(group_by, period, date_from, date_to))
+                tempi["memoria"].append((time.perf_counter() - start) * 1000)
+
+                stores = [("sql", False)] + ([("rollup", True)] if date_from is None and date_to is None else [])
+                for nome, rollup in stores:
+                    settings.BILANCI_ROLLUP = rollup
+                    try:
+                        for _ in range(repeats):
+                            async with AsyncSessionLocal() as db:
+                                start = time.perf_counter()
+                                ottenuti = normalize(
+                                    await BilancioService(db).aggregate_bilanci(group_by, period, date_from, date_to)
+                                )
+                                tempi[nome].append((time.perf_counter() - start) * 1000)
+                    except Exception as e:
+                        errori.append(f"{nome}: {caso}: {type(e).__name__}: {str(e).splitlines()[0]}")
+                        continue
+                    if not same(attesi, ottenuti):
+                        errori.append(f"{nome}: {caso}: {len(ottenuti)} righe invece di {len(attesi)}")
+    for nome, valori in tempi.items():
+        if valori:
+            print(f"  {nome:8} mediana {statistics.median(valori):8.2f} ms")
+    return errori
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    try:
+        print("database vuoto")
+        errori = await check(InMemoryBilancioService(), 1)
+
+        bilanci = make_bilanci(n)
+        memory = InMemoryBilancioService()
+        for bilancio in bilanci:
+            await memory.create_bilancio(bilancio)
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(BilancioModel), [
+                {**bilancio.model_dump(), "data": to_utc(bilancio.data)} for bilancio in bilanci
+            ])
+            await db.commit()
+            await BilancioService(db).rebuild_rollup()
+
+        print(f"{n} voci")
+        errori += await check(memory, 3)
+    finally:
+        await engine.dispose()
+
+    if errori:
+        sys.exit("risultati diversi dall'archivio in memoria:\n" + "\n".join(errori))
+    print("risultati coincidenti")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+Benchmark della latenza CRUD di /bilanci con molte voci.
+
+Confronta, a parità di numero di voci, l'archivio precedente (lista Python
+con scansioni lineari), l'archivio in memoria indicizzato per ID
+(InMemoryBilancioService) e l'archivio SQL (BilancioService) su un database
+SQLite temporaneo, con una sessione per operazione come nelle richieste.
+
+Uso:
+    python benchmarks/bench_bilanci_crud.py [n_voci] [operazioni]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(TMP, 'bench.db')}"
+sys.path.append(os.path.join(ROOT, "backend"))
+
+from sqlalchemy import insert
+
+from app.db.base import AsyncSessionLocal, Base, engine
+from app.models.schemas import Bilancio, BilancioCreate, BilancioUpdate
+from app.models.sql.bilancio import BilancioModel
+from app.services.bilancio_service import BilancioService, InMemoryBilancioService
+
+
+class ListBilancioService:
+    """Archivio precedente: lista con ricerca lineare e list.pop"""
+
+    def __init__(self):
+        self.bilanci = []
+        self.counter = 0
+
+    async def create_bilancio(self, bilancio):
+        self.counter += 1
+        new_bilancio = Bilancio(id=self.counter, **bilancio.model_dump(),
+                                created_at=datetime.now(), updated_at=datetime.now())
+        self.bilanci.append(new_bilancio)
+        return new_bilancio
+
+    async def get_bilancio(self, bilancio_id):
+        for bilancio in self.bilanci:
+            if bilancio.id == bilancio_id:
+                return bilancio
+        return None
+
+    async def update_bilancio(self, bilancio_id, bilancio_update):
+        for i, bilancio in enumerate(self.bilanci):
+            if bilancio.id == bilancio_id:
+                update_data = bilancio_update.model_dump(exclude_unset=True)
+                self.bilanci[i] = Bilancio(**{**bilancio.model_dump(), **update_data, "updated_at": datetime.now()})
+                return self.bilanci[i]
+        return None
+
+    async def delete_bilancio(self, bilancio_id):
+        for i, bilancio in enumerate(self.bilanci):
+            if bilancio.id == bilancio_id:
+                self.bilanci.pop(i)
+                return True
+        return False
+
+
+def make_bilanci(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    return [
+        BilancioCreate(
+            nome=f"Movimento {i}",
+            data=start + timedelta(hours=rng.randrange(5 * 365 * 24)),
+            importo=round(rng.uniform(10, 10000), 2),
+            categoria=rng.choice(["vendite", "stipendi", "affitti", "utenze", "forniture"]),
+            tipo=rng.choice(["entrata", "uscita"]),
+        )
+        for i in range(n)
+    ]
+
+
+async def timed(func, ids) -> float:
+    """Latenza mediana di func(id) in ms"""
+    tempi = []
+    for bilancio_id in ids:
+        start = time.perf_counter()
+        await func(bilancio_id)
+        tempi.append((time.perf_counter() - start) * 1000)
+    return statistics.median(tempi)
+
+
+async def bench(nome: str, make_service, n: int, n_ops: int) -> None:
+    rng = random.Random(0)
+    ids = rng.sample(range(1, n + 1), n_ops)
+    update = BilancioUpdate(importo=1.0)
+    nuovo = make_bilanci(1)[0]
+
+    async def op(method, *args):
+        service, session = make_service()
+        try:
+            return await getattr(service, method)(*args)
+        finally:
+            if session is not None:
+                await session.close()
+
+    risultati = {
+        "create": await timed(lambda _: op("create_bilancio", nuovo), ids),
+        "get": await timed(lambda i: op("get_bilancio", i), ids),
+        "update": await timed(lambda i: op("update_bilancio", i, update), ids),
+        "delete": await timed(lambda i: op("delete_bilancio", i), ids),
+    }
+    print(f"{nome:22}" + "".join(f"{op_name} {ms:8.3f} ms  " for op_name, ms in risultati.items()))
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_ops = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    bilanci = make_bilanci(n)
+    print(f"{n} voci, {n_ops} operazioni per tipo (latenza mediana)")
+
+    for nome, store in (("lista (precedente)", ListBilancioService()), ("dizionario per ID", InMemoryBilancioService())):
+        for bilancio in bilanci:
+            await store.create_bilancio(bilancio)
+        await bench(nome, lambda store=store: (store, None), n, n_ops)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(BilancioModel), [bilancio.model_dump() for bilancio in bilanci])
+
+    def sql_service():
+        session = AsyncSessionLocal()
+        return BilancioService(session), session
+
+    await bench("SQL (SQLite)", sql_service, n, n_ops)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""
+Benchmark del matching con embedding locali.
+
+Misura il costo di costruzione dell'indice delle voci standard (avvio) e la
+latenza per voce della ricerca in blocco, su un piano dei conti sintetico.
+
+Uso:
+    python benchmarks/bench_embedding.py [n_voci]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_matching import make_piano_dei_conti
+from config import VOCI_STATO_PATRIMONIALE, VOCI_CONTO_ECONOMICO
+from embeddings import NGramEmbeddingIndex
+from matching import embedding_match
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    voci_bilancio = make_piano_dei_conti(n_voci)
+    voci_standard = VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO
+
+    start = time.perf_counter()
+    index = NGramEmbeddingIndex(voci_standard)
+    t_avvio = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoded = index.encode(voci_bilancio)
+    t_encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoded @ index.matrice.T
+    t_search = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapping = embedding_match(voci_bilancio, voci_standard)
+    t_match = time.perf_counter() - start
+
+    print(f"Indice: {len(voci_standard)} voci standard, {index.matrice.shape[1]} dimensioni")
+    print(f"avvio (costruzione indice): {t_avvio * 1000:10.2f} ms")
+    print(f"encode {n_voci} voci:        {t_encode * 1000:10.2f} ms")
+    print(f"prodotto matriciale:        {t_search * 1000:10.2f} ms")
+    print(f"embedding_match totale:     {t_match * 1000:10.2f} ms")
+    print(f"latenza per voce:           {t_match / n_voci * 1e6:10.2f} us")
+    print(f"voci mappate:               {len(mapping)} / {n_voci}")
+
+
+if __name__ == "__main__":
+    main()
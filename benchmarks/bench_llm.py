@@ -0,0 +1,57 @@
+"""
+Prova di carico del matching LLM contro lo stub locale.
+
+Avvia benchmarks/llm_stub_server.py in un thread e confronta il numero di
+richieste e il tempo totale al variare della dimensione dei blocchi e della
+concorrenza, con una quota di errori 503 per esercitare i tentativi ripetuti.
+
+Uso:
+    python benchmarks/bench_llm.py [n_voci] [latenza_s] [error_rate]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_matching import make_piano_dei_conti
+from config import VOCI_STATO_PATRIMONIALE, VOCI_CONTO_ECONOMICO, LLM_FUZZY_THRESHOLD
+from llm_matching import LLMMatcher
+from llm_stub_server import start_stub_server
+from matching import fuzzy_match
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    voci_bilancio = make_piano_dei_conti(n_voci)
+    voci_standard = VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO
+
+    server, url = start_stub_server(latency=latency, error_rate=error_rate)
+
+    # Le voci ad alta confidenza non arrivano al modello
+    risolte = fuzzy_match(voci_bilancio, voci_standard, threshold=LLM_FUZZY_THRESHOLD)
+    ambigue = [voce for voce in voci_bilancio if voce not in risolte]
+    print(f"{n_voci} voci: {len(risolte)} risolte dal fuzzy, {len(ambigue)} inviate al modello")
+    print(f"stub: latenza {latency * 1000:.0f} ms, errori {error_rate:.0%}")
+
+    for batch_size, concurrency in ((1, 1), (50, 1), (50, 4), (50, 16)):
+        matcher = LLMMatcher(url, batch_size=batch_size, max_concurrency=concurrency, backoff=0.05)
+        start = time.perf_counter()
+        mapping = matcher.match(ambigue, voci_standard)
+        elapsed = time.perf_counter() - start
+        print(f"batch {batch_size:>3}, concorrenza {concurrency:>2}: {elapsed:8.2f} s, "
+              f"{matcher.stats['requests']:>5} richieste, {matcher.stats['retries']:>3} ripetute, "
+              f"{matcher.stats['failures']:>2} fallite, {len(mapping)} voci mappate")
+
+        # Stesse voci: tutte le risposte arrivano dalla cache
+        start = time.perf_counter()
+        matcher.match(ambigue, voci_standard)
+        print(f"{'':24}ripetizione da cache: {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
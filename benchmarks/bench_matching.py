@@ -0,0 +1,67 @@
+"""
+Benchmark del matching fuzzy.
+
+Confronta fuzzy_match_batch (matrice dei punteggi con process.cdist) con
+il percorso basato su process.extractOne per ogni voce, su un piano dei
+conti sintetico, e verifica che i mapping siano identici.
+
+Uso:
+    python benchmarks/bench_matching.py [n_voci]
+"""
+import os
+import random
+import sys
+import time
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import VOCI_STATO_PATRIMONIALE, VOCI_CONTO_ECONOMICO
+from matching import fuzzy_match, fuzzy_match_batch
+
+
+def make_piano_dei_conti(n_voci: int, seed: int = 42) -> List[str]:
+    """Crea voci di bilancio rumorose a partire dalle voci standard."""
+    rng = random.Random(seed)
+    voci_standard = VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO
+    prefissi = ["", "Totale ", "Altri ", "Fondo ", "Saldo "]
+    suffissi = ["", " esercizio", " verso terzi", " (netto)", " a breve termine"]
+    voci = []
+    for i in range(n_voci):
+        voce = rng.choice(prefissi) + rng.choice(voci_standard) + rng.choice(suffissi)
+        if rng.random() < 0.3:
+            # Errore di battitura
+            pos = rng.randrange(len(voce))
+            voce = voce[:pos] + voce[pos + 1:]
+        voci.append(f"{voce} {i}")
+    return voci
+
+
+def timeit(func, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    voci_bilancio = make_piano_dei_conti(n_voci)
+    voci_standard = VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO
+
+    for threshold in (60, 70, 80):
+        assert fuzzy_match_batch(voci_bilancio, voci_standard, threshold) == \
+            fuzzy_match(voci_bilancio, voci_standard, threshold, workers=1)
+
+    t_old = timeit(fuzzy_match, voci_bilancio, voci_standard, 80, 1)
+    print(f"Piano dei conti: {n_voci} voci x {len(voci_standard)} voci standard, {os.cpu_count()} core")
+    print(f"extractOne:          {t_old * 1000:10.1f} ms")
+    for workers in (1, -1):
+        t_new = timeit(fuzzy_match_batch, voci_bilancio, voci_standard, 80, workers)
+        print(f"cdist (workers={workers:>2}): {t_new * 1000:10.1f} ms  speedup {t_old / t_new:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark della conversione in formato lungo di parse_excel.
+
+Confronta reshape_to_long con l'implementazione precedente basata su
+iterrows, su un bilancio consolidato sintetico, e verifica che i due
+risultati siano identici.
+
+Uso:
+    python benchmarks/bench_parser.py [n_voci] [n_anni]
+"""
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import reshape_to_long
+
+
+def reshape_iterrows(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """Implementazione di riferimento: ciclo per riga e per colonna degli anni."""
+    voci_col = df_raw.columns[0]
+    anni_cols = []
+    for col in df_raw.columns[1:]:
+        if isinstance(col, str) and re.search(r'\b20\d{2}\b', col):
+            anni_cols.append(col)
+        elif isinstance(col, (int, float)) and 2000 <= col <= 2100:
+            anni_cols.append(col)
+    if not anni_cols:
+        anni_cols = [col for col in df_raw.columns[1:] if pd.api.types.is_numeric_dtype(df_raw[col])]
+
+    result_data = []
+    for _, row in df_raw.iterrows():
+        voce = row[voci_col]
+        if pd.isna(voce) or not isinstance(voce, str):
+            continue
+        for anno_col in anni_cols:
+            valore = row[anno_col]
+            if pd.notna(valore):
+                if isinstance(anno_col, str):
+                    match = re.search(r'\b(20\d{2})\b', anno_col)
+                    anno = match.group(1) if match else anno_col
+                else:
+                    anno = int(anno_col)
+                result_data.append({"Voce": voce.strip(), "Anno": anno, "Valore": float(valore)})
+    return pd.DataFrame(result_data)
+
+
+def make_bilancio(n_voci: int, n_anni: int, seed: int = 42) -> pd.DataFrame:
+    """Crea un bilancio in formato largo con celle mancanti sparse."""
+    rng = np.random.default_rng(seed)
+    anni = list(range(2024 - n_anni + 1, 2025))
+    valori = rng.uniform(-1e6, 1e6, size=(n_voci, n_anni))
+    valori[rng.random(valori.shape) < 0.1] = np.nan
+    df = pd.DataFrame(valori, columns=anni)
+    df.insert(0, "Voce", [f" Voce di bilancio {i} " for i in range(n_voci)])
+    return df
+
+
+def timeit(func, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_anni = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    df_raw = make_bilancio(n_voci, n_anni)
+
+    pd.testing.assert_frame_equal(reshape_to_long(df_raw), reshape_iterrows(df_raw))
+
+    t_old = timeit(reshape_iterrows, df_raw)
+    t_new = timeit(reshape_to_long, df_raw)
+    print(f"Bilancio {n_voci} voci x {n_anni} anni")
+    print(f"iterrows:        {t_old * 1000:10.1f} ms")
+    print(f"reshape_to_long: {t_new * 1000:10.1f} ms")
+    print(f"speedup:         {t_old / t_new:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Prova di carico: latenza di /ping mentre /api/v1/analyze/ elabora file grandi.
+
+Avvia l'API (backend/app) con uvicorn su un database SQLite temporaneo, misura
+la latenza di /ping a riposo e poi mentre più analisi sono in corso. Con
+l'elaborazione nel pool di processi la latenza di /ping resta piatta; le
+analisi oltre ANALYSIS_MAX_PENDING ricevono 429.
+
+Uso:
+    python benchmarks/bench_ping_load.py [n_voci] [n_analisi] [pool_size]
+"""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from bench_matching import make_piano_dei_conti
+
+
+def make_csv(n_voci: int, seed: int) -> bytes:
+    """Bilancio sintetico in formato largo (una riga per voce, una colonna per anno)."""
+    rng = np.random.default_rng(seed)
+    anni = list(range(2015, 2025))
+    righe = [",".join(["Voce"] + [str(anno) for anno in anni])]
+    for voce in make_piano_dei_conti(n_voci, seed=seed):
+        valori = rng.uniform(0, 1e6, size=len(anni)).round(2)
+        righe.append(",".join([f'"{voce}"'] + [str(v) for v in valori]))
+    return "\n".join(righe).encode("utf-8")
+
+
+def post_file(url: str, contents: bytes, filename: str) -> int:
+    """POST multipart del file a /analyze; restituisce lo status HTTP."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"matching_type\"\r\n\r\nfuzzy\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: text/csv\r\n\r\n"
+    ).encode("utf-8") + contents + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    request = urllib.request.Request(
+        url, data=body, method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def ping_latencies(url: str, stop: threading.Event, interval: float = 0.05) -> list:
+    """Chiama /ping finché stop non è impostato; restituisce le latenze in ms."""
+    latenze = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+        latenze.append((time.perf_counter() - start) * 1000)
+        time.sleep(interval)
+    return latenze
+
+
+def summary(latenze: list) -> str:
+    latenze = sorted(latenze)
+    p95 = latenze[min(len(latenze) - 1, int(len(latenze) * 0.95))]
+    return (f"{len(latenze):5} ping  p50 {statistics.median(latenze):7.1f} ms  "
+            f"p95 {p95:7.1f} ms  max {latenze[-1]:7.1f} ms")
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_analisi = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    pool_size = sys.argv[3] if len(sys.argv) > 3 else "2"
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            BILANCISMART_PIPELINE_CACHE="",
+            ANALYSIS_POOL_SIZE=pool_size,
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=os.path.join(ROOT, "backend"), env=env, stdout=subprocess.DEVNULL
+        )
+        try:
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(base + "/ping", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            # Un file diverso per analisi, così la cache dei risultati non interviene
+            files = [make_csv(n_voci, seed) for seed in range(n_analisi)]
+            print(f"{n_analisi} analisi da {n_voci} voci x 10 anni "
+                  f"({len(files[0]) / 1e6:.1f} MB ciascuna), pool di {pool_size} processi")
+
+            # Riscaldamento: avvio dei processi del pool e import dei moduli di analisi
+            post_file(base + "/api/v1/analyze/", make_csv(10, seed=n_analisi), "riscaldamento.csv")
+
+            stop = threading.Event()
+            threading.Timer(2.0, stop.set).start()
+            print(f"{'a riposo':18}{summary(ping_latencies(base + '/ping', stop))}")
+
+            esiti = []
+            start = time.perf_counter()
+            threads = [
+                threading.Thread(target=lambda c=c, i=i: esiti.append(
+                    post_file(base + "/api/v1/analyze/", c, f"bilancio_{i}.csv")))
+                for i, c in enumerate(files)
+            ]
+            for thread in threads:
+                thread.start()
+
+            stop = threading.Event()
+            risultato = {}
+            pinger = threading.Thread(target=lambda: risultato.update(latenze=ping_latencies(base + "/ping", stop)))
+            pinger.start()
+            for thread in threads:
+                thread.join()
+            stop.set()
+            pinger.join()
+            elapsed = time.perf_counter() - start
+
+            print(f"{'durante le analisi':18}{summary(risultato['latenze'])}")
+            conteggi = {status: esiti.count(status) for status in sorted(set(esiti))}
+            print(f"analisi completate in {elapsed:.1f} s, esiti HTTP: {json.dumps(conteggi)}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
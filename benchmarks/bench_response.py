@@ -0,0 +1,93 @@
+"""
+Benchmark della serializzazione della risposta di /analyze.
+
+Confronta, su risultati sintetici di un'analisi, la risposta JSON precedente
+(to_dict + jsonable_encoder + json.dumps) con il JSON di orjson, lo streaming
+NDJSON e lo stream IPC Arrow: tempo, dimensione del payload e memoria di picco
+(tracemalloc).
+
+Uso:
+    python benchmarks/bench_response.py [n_voci] [n_anni]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.services.analysis_render import render_response, iter_ndjson, iter_arrow
+from indici import calcola_indici_per_anni, indici_to_dataframe, indici_from_dataframe
+from parser import organize_data
+from bench_matching import make_piano_dei_conti
+
+
+def make_frames(n_voci: int, n_anni: int, seed: int = 42) -> dict:
+    """Risultati sintetici di un'analisi in formato lungo."""
+    rng = np.random.default_rng(seed)
+    voci = make_piano_dei_conti(n_voci, seed=seed)
+    anni = list(range(2025 - n_anni, 2025))
+    raw = pd.DataFrame({
+        "Voce": np.repeat(voci, n_anni),
+        "Anno": np.tile(anni, n_voci),
+        "Valore": rng.uniform(-1e6, 1e6, size=n_voci * n_anni).round(2),
+    })
+    standardized = raw.assign(Voce_Standard=raw["Voce"].str.title())
+    sp, ce = organize_data(raw)
+    return {
+        "raw": raw,
+        "matched": standardized,
+        "indici": indici_to_dataframe(calcola_indici_per_anni(sp, ce)),
+        "matching_stats": pd.DataFrame([{"tier": "fuzzy", "voci": n_voci, "hits": n_voci, "seconds": 0.0}]),
+    }
+
+
+def legacy_json(frames: dict) -> bytes:
+    """Risposta come era prodotta prima: dizionari Python e encoder di FastAPI."""
+    indici_anni = indici_from_dataframe(frames["indici"])
+    content = jsonable_encoder({
+        "raw_data": frames["raw"].to_dict(orient="records"),
+        "standardized_data": frames["matched"].to_dict(orient="records"),
+        "financial_indices": {str(anno): indici for anno, indici in indici_anni.items()},
+    })
+    return json.dumps(content, ensure_ascii=False, allow_nan=True).encode("utf-8")
+
+
+def measure(func):
+    # Tempo e memoria in due esecuzioni separate: tracemalloc rallenta le allocazioni
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_anni = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    frames = make_frames(n_voci, n_anni)
+    print(f"{n_voci} voci x {n_anni} anni: {len(frames['raw'])} record per sezione")
+
+    for nome, func in (
+        ("json (jsonable_encoder)", lambda: len(legacy_json(frames))),
+        ("json (orjson)", lambda: len(render_response(frames))),
+        ("ndjson (streaming)", lambda: sum(len(chunk) for chunk in iter_ndjson(frames))),
+        ("arrow ipc (streaming)", lambda: sum(len(chunk) for chunk in iter_arrow(frames))),
+    ):
+        size, elapsed, peak = measure(func)
+        print(f"{nome:24} {elapsed * 1000:9.1f} ms  {size / 1e6:7.2f} MB  picco {peak / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
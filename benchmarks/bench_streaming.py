@@ -0,0 +1,69 @@
+"""
+Benchmark della memoria di picco nella lettura dei file Excel.
+
+Confronta parse_excel (pd.read_excel + dropna + reshape) con la lettura in
+streaming di iter_excel_records su un foglio sintetico, misurando con
+tracemalloc la memoria di picco e il tempo.
+
+Uso:
+    python benchmarks/bench_streaming.py [n_voci] [n_anni]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from openpyxl import Workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import parse_excel, iter_excel_records
+
+
+def make_workbook(path: str, n_voci: int, n_anni: int, seed: int = 42) -> None:
+    """Scrive un bilancio sintetico in formato largo senza tenerlo in memoria."""
+    rng = np.random.default_rng(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Bilancio")
+    sheet.append(["Voce"] + [f"Esercizio {anno}" for anno in range(2024 - n_anni + 1, 2025)])
+    for i in range(n_voci):
+        valori = rng.uniform(-1e6, 1e6, size=n_anni).round(2).tolist()
+        sheet.append([f"Voce di bilancio {i}"] + valori)
+    workbook.save(path)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    n_voci = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_anni = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bilancio.xlsx")
+        make_workbook(path, n_voci, n_anni)
+        print(f"Foglio {n_voci} voci x {n_anni} anni ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+        def consume_chunks():
+            return sum(len(chunk) for chunk in iter_excel_records(path, chunk_size=20000))
+
+        for nome, func in (
+            ("pd.read_excel + reshape", lambda: len(parse_excel(path))),
+            ("streaming (a blocchi)", consume_chunks),
+            ("streaming + concat", lambda: len(parse_excel(path, streaming=True))),
+        ):
+            n_record, elapsed, peak = measure(func)
+            print(f"{nome:25} {elapsed:8.2f} s  picco {peak / 1e6:8.1f} MB  {n_record} record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Server HTTP locale che simula un endpoint Chat Completions compatibile con OpenAI.
+
+Risponde alle richieste di llm_matching.LLMMatcher con un mapping calcolato dal
+fuzzy matching, con latenza e tasso di errore configurabili, così il percorso
+del matching LLM può essere provato e sottoposto a carico senza rete.
+
+Uso:
+    python benchmarks/llm_stub_server.py [--port 8900] [--latency 0.2] [--error-rate 0.1]
+    BILANCISMART_LLM_URL=http://localhost:8900 streamlit run main.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import fuzzy_match
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            self.send_error(503, "Servizio temporaneamente non disponibile")
+            return
+
+        payload = json.loads(body)
+        richiesta = json.loads(payload["messages"][-1]["content"])
+        mapping = fuzzy_match(richiesta["voci"], richiesta["voci_standard"], threshold=60, workers=1)
+        response = {
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps({"mapping": mapping})},
+                "finish_reason": "stop",
+            }],
+        }
+
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0, error_rate: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Avvia il server in un thread e restituisce (server, url)."""
+    handler = type("Handler", (StubHandler,), {"latency": latency, "error_rate": error_rate, "requests": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="latenza simulata per richiesta (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="frazione di richieste che rispondono 503")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency, args.error_rate)
+    print(f"Stub LLM in ascolto su {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from config import (
+    MAPPING_CACHE_PATH, MAPPING_CACHE_SIZE, PIPELINE_CACHE_PATH, PIPELINE_CACHE_MAX_BYTES,
+    PIPELINE_CACHE_DISK_MAX_BYTES, PIPELINE_CACHE_TTL_SECONDS,
+    VOCI_STATO_PATRIMONIALE, VOCI_CONTO_ECONOMICO
+)
+
+def normalize_voce(voce: str) -> str:
+    """
+    Normalizza una voce di bilancio per l'uso come chiave di cache.
+
+    Args:
+        voce: Nome della voce di bilancio
+
+    Returns:
+        La voce in minuscolo, senza spazi iniziali/finali e con gli spazi interni compattati
+    """
+    return re.sub(r"\s+", " ", voce).strip().casefold()
+
+def standard_list_version(voci_standard: List[str]) -> str:
+    """
+    Calcola una versione della lista di voci standard, che cambia se la lista cambia.
+
+    Args:
+        voci_standard: Lista delle voci standard
+
+    Returns:
+        Impronta esadecimale della lista
+    """
+    return hashlib.sha256("\n".join(voci_standard).encode("utf-8")).hexdigest()[:16]
+
+class MappingCache:
+    """
+    Cache persistente voce -> voce standard per i risultati del matching.
+
+    Le chiavi sono (voce normalizzata, metodo di matching, soglia, versione delle
+    voci standard). Il primo livello è una LRU in memoria di dimensione limitata,
+    il secondo un database SQLite su disco condiviso tra processi. Vengono
+    memorizzati anche gli esiti negativi (None), così le voci senza corrispondenza
+    non vengono riprocessate.
+    """
+
+    def __init__(self, path: Optional[str] = MAPPING_CACHE_PATH, max_size: int = MAPPING_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[tuple, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = self._connect(path) if path else None
+
+    @staticmethod
+    def _connect(path: str) -> Optional[sqlite3.Connection]:
+        """Apre il database della cache, o restituisce None se non è disponibile"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mapping_cache (
+                    voce TEXT NOT NULL,
+                    metodo TEXT NOT NULL,
+                    threshold REAL NOT NULL,
+                    versione TEXT NOT NULL,
+                    voce_standard TEXT,
+                    PRIMARY KEY (metodo, threshold, versione, voce)
+                )
+                """
+            )
+            conn.commit()
+            return conn
+        except (OSError, sqlite3.Error) as e:
+            warnings.warn(f"Cache del matching su disco non disponibile ({path}): {str(e)}")
+            return None
+
+    def _remember(self, key: tuple, value: Optional[str]) -> None:
+        """Inserisce un valore nella LRU in memoria (da chiamare con il lock acquisito)"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, voci: Iterable[str], metodo: str, threshold: float,
+                 versione: str) -> Dict[str, Optional[str]]:
+        """
+        Cerca nella cache le voci (già normalizzate) indicate.
+
+        Args:
+            voci: Voci normalizzate da cercare
+            metodo: Metodo di matching
+            threshold: Soglia del metodo di matching
+            versione: Versione della lista di voci standard
+
+        Returns:
+            Dizionario {voce: voce standard o None} con le sole voci trovate
+        """
+        voci = list(dict.fromkeys(voci))
+        trovate = {}
+
+        with self._lock:
+            # Livello in memoria
+            da_cercare = []
+            for voce in voci:
+                key = (voce, metodo, threshold, versione)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    trovate[voce] = self._memory[key]
+                else:
+                    da_cercare.append(voce)
+
+            # Livello su disco, a blocchi per rispettare il limite di parametri di SQLite
+            if self._conn is not None:
+                for i in range(0, len(da_cercare), 500):
+                    blocco = da_cercare[i:i + 500]
+                    placeholders = ",".join("?" * len(blocco))
+                    righe = self._conn.execute(
+                        f"SELECT voce, voce_standard FROM mapping_cache "
+                        f"WHERE metodo = ? AND threshold = ? AND versione = ? AND voce IN ({placeholders})",
+                        [metodo, threshold, versione, *blocco]
+                    ).fetchall()
+                    for voce, voce_standard in righe:
+                        trovate[voce] = voce_standard
+                        self._remember((voce, metodo, threshold, versione), voce_standard)
+
+            self.hits += len(trovate)
+            self.misses += len(voci) - len(trovate)
+
+        return trovate
+
+    def set_many(self, mapping: Dict[str, Optional[str]], metodo: str, threshold: float,
+                 versione: str) -> None:
+        """
+        Salva nella cache i risultati del matching.
+
+        Args:
+            mapping: Dizionario {voce normalizzata: voce standard o None}
+            metodo: Metodo di matching
+            threshold: Soglia del metodo di matching
+            versione: Versione della lista di voci standard
+        """
+        with self._lock:
+            for voce, voce_standard in mapping.items():
+                self._remember((voce, metodo, threshold, versione), voce_standard)
+
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO mapping_cache "
+                    "(voce, metodo, threshold, versione, voce_standard) VALUES (?, ?, ?, ?, ?)",
+                    [(voce, metodo, threshold, versione, voce_standard)
+                     for voce, voce_standard in mapping.items()]
+                )
+                self._conn.commit()
+
+    def clear(self) -> None:
+        """Svuota entrambi i livelli della cache"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM mapping_cache")
+                self._conn.commit()
+
+_default_mapping_cache: Optional[MappingCache] = None
+
+def get_mapping_cache() -> MappingCache:
+    """Restituisce la cache del matching condivisa dal processo, creandola al primo uso"""
+    global _default_mapping_cache
+    if _default_mapping_cache is None:
+        _default_mapping_cache = MappingCache()
+    return _default_mapping_cache
+
+# Da incrementare quando cambia il formato o il significato dei risultati memorizzati
+PIPELINE_CACHE_VERSION = "4"
+
+def pipeline_key(contents: bytes, sheet_name: Any, matching_type: str) -> str:
+    """
+    Calcola la chiave della cache dell'analisi per un file caricato.
+
+    La chiave include il backend effettivo del matching (matching_backend):
+    i risultati "GPT" ottenuti con il fuzzy matching sostitutivo non vengono
+    riusati dopo aver configurato l'LLM.
+
+    Args:
+        contents: Contenuto del file
+        sheet_name: Foglio analizzato
+        matching_type: Tipo di matching applicato
+
+    Returns:
+        Impronta SHA-256 esadecimale di contenuto, foglio, matching, backend,
+        voci standard e versione del formato
+    """
+    # Import locale: matching usa a sua volta questo modulo
+    from matching import matching_backend
+
+    digest = hashlib.sha256(contents)
+    versione = standard_list_version(VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO)
+    for parte in (sheet_name, matching_type, matching_backend(matching_type), versione, PIPELINE_CACHE_VERSION):
+        digest.update(b"\0" + str(parte).encode("utf-8"))
+    return digest.hexdigest()
+
+def _encode_frame(df: pd.DataFrame) -> Tuple[str, bytes]:
+    """Serializza un DataFrame in Parquet, o in pickle se le colonne non sono rappresentabili"""
+    buffer = io.BytesIO()
+    try:
+        df.to_parquet(buffer, compression="zstd")
+        return "parquet", buffer.getvalue()
+    except (ImportError, ValueError, TypeError, OverflowError):
+        # Es. colonne con tipi misti (anni sia numerici che testuali)
+        buffer = io.BytesIO()
+        df.to_pickle(buffer, compression="gzip")
+        return "pickle", buffer.getvalue()
+
+def _decode_frame(formato: str, dati: bytes) -> pd.DataFrame:
+    """Ricostruisce un DataFrame serializzato con _encode_frame"""
+    if formato == "parquet":
+        return pd.read_parquet(io.BytesIO(dati))
+    return pd.read_pickle(io.BytesIO(dati), compression="gzip")
+
+class PipelineCache:
+    """
+    Cache dei risultati dell'intera analisi (parsing, matching, organizzazione e
+    indici) per contenuto del file caricato.
+
+    Ogni voce associa una chiave di pipeline_key a un insieme di DataFrame con
+    nome, memorizzati in forma colonnare compressa (Parquet). Il primo livello è
+    una LRU in memoria limitata in byte, il secondo un database SQLite su disco
+    opzionale condiviso tra processi, limitato in byte (disk_max_bytes, prima
+    vengono eliminate le analisi meno recenti) e in durata (ttl secondi).
+    """
+
+    def __init__(self, path: Optional[str] = PIPELINE_CACHE_PATH, max_bytes: int = PIPELINE_CACHE_MAX_BYTES,
+                 disk_max_bytes: int = PIPELINE_CACHE_DISK_MAX_BYTES, ttl: float = PIPELINE_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Dict[str, Tuple[str, bytes]]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect(path) if path else None
+
+    @staticmethod
+    def _connect(path: str) -> Optional[sqlite3.Connection]:
+        """Apre il database della cache, o restituisce None se non è disponibile"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            colonne = [riga[1] for riga in conn.execute("PRAGMA table_info(pipeline_cache)")]
+            if colonne and "creato" not in colonne:
+                # Formato precedente, senza data di inserimento: le chiavi sono comunque cambiate
+                conn.execute("DROP TABLE pipeline_cache")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pipeline_cache (
+                    chiave TEXT NOT NULL,
+                    nome TEXT NOT NULL,
+                    formato TEXT NOT NULL,
+                    dati BLOB NOT NULL,
+                    creato REAL NOT NULL,
+                    PRIMARY KEY (chiave, nome)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_pipeline_cache_creato ON pipeline_cache (creato)")
+            conn.commit()
+            return conn
+        except (OSError, sqlite3.Error) as e:
+            warnings.warn(f"Cache dell'analisi su disco non disponibile ({path}): {str(e)}")
+            return None
+
+    @staticmethod
+    def _size(entry: Dict[str, Tuple[str, bytes]]) -> int:
+        return sum(len(dati) for _, dati in entry.values())
+
+    def _remember(self, key: str, entry: Dict[str, Tuple[str, bytes]]) -> None:
+        """Inserisce una voce nella LRU in memoria (da chiamare con il lock acquisito)"""
+        if key in self._memory:
+            self._memory_bytes -= self._size(self._memory.pop(key))
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, vecchia = self._memory.popitem(last=False)
+            self._memory_bytes -= self._size(vecchia)
+
+    def get(self, key: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Cerca nella cache i risultati di un'analisi.
+
+        Args:
+            key: Chiave calcolata con pipeline_key
+
+        Returns:
+            Dizionario {nome: DataFrame}, o None se l'analisi non è in cache
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            elif self._conn is not None:
+                righe = self._conn.execute(
+                    "SELECT nome, formato, dati FROM pipeline_cache WHERE chiave = ? AND creato >= ?",
+                    (key, time.time() - self.ttl)
+                ).fetchall()
+                if righe:
+                    entry = {nome: (formato, bytes(dati)) for nome, formato, dati in righe}
+                    self._remember(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return {nome: _decode_frame(formato, dati) for nome, (formato, dati) in entry.items()}
+
+    def set(self, key: str, frames: Dict[str, pd.DataFrame]) -> None:
+        """
+        Salva nella cache i risultati di un'analisi.
+
+        Args:
+            key: Chiave calcolata con pipeline_key
+            frames: Dizionario {nome: DataFrame} con i risultati
+        """
+        entry = {nome: _encode_frame(df) for nome, df in frames.items()}
+
+        with self._lock:
+            self._remember(key, entry)
+
+            if self._conn is not None:
+                creato = time.time()
+                self._conn.execute("DELETE FROM pipeline_cache WHERE chiave = ?", (key,))
+                self._conn.executemany(
+                    "INSERT INTO pipeline_cache (chiave, nome, formato, dati, creato) VALUES (?, ?, ?, ?, ?)",
+                    [(key, nome, formato, dati, creato) for nome, (formato, dati) in entry.items()]
+                )
+                self._evict_disk(creato)
+                self._conn.commit()
+
+    def _evict_disk(self, now: float) -> None:
+        """
+        Elimina dal livello su disco le analisi scadute e, oltre disk_max_bytes,
+        le meno recenti (da chiamare con il lock acquisito).
+        """
+        self._conn.execute("DELETE FROM pipeline_cache WHERE creato < ?", (now - self.ttl,))
+        totale = self._conn.execute("SELECT COALESCE(SUM(LENGTH(dati)), 0) FROM pipeline_cache").fetchone()[0]
+        if totale <= self.disk_max_bytes:
+            return
+        da_eliminare = []
+        for chiave, size in self._conn.execute(
+            "SELECT chiave, SUM(LENGTH(dati)) FROM pipeline_cache GROUP BY chiave ORDER BY MIN(creato)"
+        ):
+            if totale <= self.disk_max_bytes:
+                break
+            da_eliminare.append((chiave,))
+            totale -= size
+        self._conn.executemany("DELETE FROM pipeline_cache WHERE chiave = ?", da_eliminare)
+
+    def stats(self) -> Dict[str, int]:
+        """Restituisce hit, miss, voci e byte occupati dal livello in memoria"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+            }
+
+    def clear(self) -> None:
+        """Svuota entrambi i livelli della cache"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM pipeline_cache")
+                self._conn.commit()
+
+_default_pipeline_cache: Optional[PipelineCache] = None
+
+def get_pipeline_cache() -> PipelineCache:
+    """Restituisce la cache dell'analisi condivisa dal processo, creandola al primo uso"""
+    global _default_pipeline_cache
+    if _default_pipeline_cache is None:
+        _default_pipeline_cache = PipelineCache()
+    return _default_pipeline_cache
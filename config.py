@@ -1,3 +1,5 @@
+import os
+
 # Configurazione colori (convertiti da Tailwind per Streamlit)
 COLORS = {
     "primary": "#1F3B73",      # Blu Navy – affidabile, professionale
@@ -36,4 +38,32 @@ DESCRIZIONI_INDICI = {
 }
 
 # Tipi di matching disponibili
-MATCHING_TYPES = ["Fuzzy (Base)", "Embedding Semantico (Intermedio)", "GPT API (Premium)"]
\ No newline at end of file
+MATCHING_TYPES = ["Fuzzy (Base)", "Embedding Semantico (Intermedio)", "GPT API (Premium)", "Cascata (Premium a costo ridotto)"]
+
+# Cache dei risultati del matching (stringa vuota per disattivare il livello su disco)
+MAPPING_CACHE_PATH = os.environ.get(
+    "BILANCISMART_MAPPING_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "bilancismart", "matching.sqlite3")
+)
+MAPPING_CACHE_SIZE = int(os.environ.get("BILANCISMART_MAPPING_CACHE_SIZE", "50000"))
+
+# Cache dei risultati dell'intera analisi per contenuto del file. Il livello su
+# disco conserva i dati finanziari analizzati: è attivo solo indicando il percorso
+# del database (ad esempio ~/.cache/bilancismart/pipeline.sqlite3)
+PIPELINE_CACHE_PATH = os.environ.get("BILANCISMART_PIPELINE_CACHE", "")
+PIPELINE_CACHE_MAX_BYTES = int(os.environ.get("BILANCISMART_PIPELINE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Limiti del livello su disco: byte occupati e durata dei risultati
+PIPELINE_CACHE_DISK_MAX_BYTES = int(os.environ.get("BILANCISMART_PIPELINE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+PIPELINE_CACHE_TTL_SECONDS = int(os.environ.get("BILANCISMART_PIPELINE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+# Matching con LLM (endpoint compatibile con le Chat Completions di OpenAI).
+# Senza URL il matching "GPT" usa il fuzzy matching come sostituto.
+LLM_API_URL = os.environ.get("BILANCISMART_LLM_URL", "")
+LLM_API_KEY = os.environ.get("BILANCISMART_LLM_API_KEY", os.environ.get("OPENAI_API_KEY", ""))
+LLM_MODEL = os.environ.get("BILANCISMART_LLM_MODEL", "gpt-4o-mini")
+LLM_BATCH_SIZE = int(os.environ.get("BILANCISMART_LLM_BATCH_SIZE", "50"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("BILANCISMART_LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.environ.get("BILANCISMART_LLM_MAX_RETRIES", "3"))
+LLM_TIMEOUT = float(os.environ.get("BILANCISMART_LLM_TIMEOUT", "60"))
+# Soglia oltre la quale il fuzzy matching risolve la voce senza interpellare il modello
+LLM_FUZZY_THRESHOLD = int(os.environ.get("BILANCISMART_LLM_FUZZY_THRESHOLD", "90"))
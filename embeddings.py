@@ -0,0 +1,119 @@
+import math
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Lunghezze degli n-grammi di caratteri usati come dimensioni dell'embedding
+NGRAM_RANGE = (3, 5)
+
+def _normalize(text: str) -> str:
+    """Minuscolo, senza accenti e con gli spazi compattati"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+@lru_cache(maxsize=65536)
+def _word_ngrams(word: str, ngram_range: Tuple[int, int]) -> Tuple[str, ...]:
+    """N-grammi di una singola parola, con uno spazio ai bordi"""
+    word = f" {word} "
+    return tuple(
+        word[i:i + n]
+        for n in range(ngram_range[0], ngram_range[1] + 1)
+        for i in range(len(word) - n + 1)
+    )
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Counter:
+    """
+    Estrae gli n-grammi di caratteri di ciascuna parola, con uno spazio ai bordi.
+
+    Args:
+        text: Testo da analizzare
+        ngram_range: Lunghezza minima e massima degli n-grammi
+
+    Returns:
+        Conteggio degli n-grammi presenti nel testo
+    """
+    ngrams = Counter()
+    for word in _normalize(text).split():
+        ngrams.update(_word_ngrams(word, ngram_range))
+    return ngrams
+
+class NGramEmbeddingIndex:
+    """
+    Indice di embedding TF-IDF su n-grammi di caratteri per le voci standard.
+
+    Le voci standard vengono codificate una sola volta in una matrice con righe
+    di norma unitaria. Le dimensioni sono i soli n-grammi presenti nelle voci
+    standard: gli altri n-grammi di una voce da cercare non contribuiscono al
+    prodotto scalare, ma vengono comunque contati nella sua norma. La ricerca
+    del vicino più simile per un blocco di voci è quindi un unico prodotto tra
+    matrici, eseguito interamente su CPU e senza modelli esterni.
+    """
+
+    def __init__(self, voci_standard: List[str]):
+        self.voci_standard = list(voci_standard)
+        documenti = [char_ngrams(voce) for voce in self.voci_standard]
+
+        # Vocabolario e IDF (con smoothing) calcolati sulle voci standard
+        frequenze = Counter(ngram for doc in documenti for ngram in doc)
+        self.vocabolario: Dict[str, int] = {ngram: i for i, ngram in enumerate(sorted(frequenze))}
+        n_doc = len(documenti)
+        self.idf = np.array(
+            [math.log((1 + n_doc) / (1 + frequenze[ngram])) + 1 for ngram in sorted(frequenze)]
+        )
+        # IDF di un n-gramma che non compare in nessuna voce standard
+        self.idf_sconosciuto = math.log(1 + n_doc) + 1
+
+        self.matrice = self.encode(self.voci_standard)
+
+    def encode(self, voci: List[str]) -> np.ndarray:
+        """
+        Codifica un blocco di voci in vettori TF-IDF normalizzati.
+
+        Args:
+            voci: Lista delle voci da codificare
+
+        Returns:
+            Matrice len(voci) x dimensioni dell'indice, con righe di norma unitaria
+            (righe nulle per le voci senza n-grammi)
+        """
+        righe, colonne, pesi = [], [], []
+        norme = np.zeros(len(voci))
+        for i, voce in enumerate(voci):
+            quadrati = 0.0
+            for ngram, conteggio in char_ngrams(voce).items():
+                j = self.vocabolario.get(ngram)
+                peso = conteggio * (self.idf[j] if j is not None else self.idf_sconosciuto)
+                quadrati += peso * peso
+                if j is not None:
+                    righe.append(i)
+                    colonne.append(j)
+                    pesi.append(peso)
+            norme[i] = math.sqrt(quadrati)
+
+        matrice = np.zeros((len(voci), len(self.vocabolario)))
+        matrice[righe, colonne] = pesi
+        np.divide(matrice, norme[:, None], out=matrice, where=norme[:, None] > 0)
+        return matrice
+
+    def search(self, voci: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trova la voce standard più simile per ciascuna voce.
+
+        Args:
+            voci: Lista delle voci da cercare
+
+        Returns:
+            Tuple (indici delle voci standard, similarità del coseno in [0, 1])
+        """
+        similarita = self.encode(voci) @ self.matrice.T
+        best = similarita.argmax(axis=1)
+        return best, similarita[np.arange(len(voci)), best]
+
+@lru_cache(maxsize=8)
+def get_embedding_index(voci_standard: Tuple[str, ...]) -> NGramEmbeddingIndex:
+    """Restituisce l'indice delle voci standard, costruendolo una sola volta per lista"""
+    return NGramEmbeddingIndex(list(voci_standard))
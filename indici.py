@@ -1,93 +1,250 @@
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
 import pandas as pd
 import numpy as np
 
-def calcola_indici(stato_patrimoniale: Dict[str, float], conto_economico: Dict[str, float]) -> Dict[str, float]:
+# Voci standard dello Stato Patrimoniale usate dagli indici
+VOCI_SP_INDICI = [
+    "Totale Attivo", "Patrimonio Netto", "Attivo Circolante", "Immobilizzazioni",
+    "Passività Correnti", "Passività Consolidate", "Disponibilità Liquide", "Crediti"
+]
+
+# Voci standard del Conto Economico usate dagli indici
+VOCI_CE_INDICI = ["Ricavi", "EBITDA", "EBIT", "Utile Netto"]
+
+# Unità di misura degli indici
+UNITA_PERCENTUALE = "percentuale"
+UNITA_RAPPORTO = "rapporto"
+
+def _dividi(numeratore: np.ndarray, denominatore: np.ndarray) -> np.ndarray:
+    """Divisione elemento per elemento, con NaN dove il denominatore è zero"""
+    risultato = np.full(np.broadcast(numeratore, denominatore).shape, np.nan)
+    np.divide(numeratore, denominatore, out=risultato, where=denominatore != 0)
+    return risultato
+
+@dataclass(frozen=True)
+class Indice:
     """
-    Calcola gli indici di bilancio a partire dai dati di Stato Patrimoniale e Conto Economico.
+    Definizione dichiarativa di un indice di bilancio.
+    
+    Attributes:
+        nome: Nome dell'indice
+        voci: Voci standard usate dalla formula, nell'ordine degli argomenti
+        formula: Funzione che riceve gli array delle voci e restituisce l'array dell'indice
+        unita: UNITA_PERCENTUALE o UNITA_RAPPORTO
+        crescente: True se valori più alti sono generalmente migliori
+    """
+    nome: str
+    voci: Tuple[str, ...]
+    formula: Callable[..., np.ndarray]
+    unita: str
+    crescente: bool
+
+# Registro degli indici calcolati, nell'ordine in cui vengono restituiti
+INDICI = [
+    # ROE (Return on Equity)
+    Indice("ROE", ("Utile Netto", "Patrimonio Netto"),
+           lambda utile_netto, patrimonio_netto: _dividi(utile_netto, patrimonio_netto) * 100,
+           UNITA_PERCENTUALE, True),
+    # ROI (Return on Investment)
+    Indice("ROI", ("EBIT", "Totale Attivo"),
+           lambda ebit, totale_attivo: _dividi(ebit, totale_attivo) * 100,
+           UNITA_PERCENTUALE, True),
+    # ROS (Return on Sales)
+    Indice("ROS", ("EBIT", "Ricavi"),
+           lambda ebit, ricavi: _dividi(ebit, ricavi) * 100,
+           UNITA_PERCENTUALE, True),
+    # Indice di Liquidità
+    Indice("Indice di Liquidità", ("Disponibilità Liquide", "Crediti", "Passività Correnti"),
+           lambda disponibilita_liquide, crediti, passivita_correnti:
+               _dividi(disponibilita_liquide + crediti, passivita_correnti),
+           UNITA_RAPPORTO, True),
+    # Indice di Indebitamento
+    Indice("Indice di Indebitamento", ("Passività Correnti", "Passività Consolidate", "Patrimonio Netto"),
+           lambda passivita_correnti, passivita_consolidate, patrimonio_netto:
+               _dividi(passivita_correnti + passivita_consolidate, patrimonio_netto),
+           UNITA_RAPPORTO, False),
+    # EBITDA Margin
+    Indice("EBITDA Margin", ("EBITDA", "Ricavi"),
+           lambda ebitda, ricavi: _dividi(ebitda, ricavi) * 100,
+           UNITA_PERCENTUALE, True),
+    # Rotazione Capitale Investito
+    Indice("Rotazione Capitale Investito", ("Ricavi", "Totale Attivo"),
+           lambda ricavi, totale_attivo: _dividi(ricavi, totale_attivo),
+           UNITA_RAPPORTO, True),
+    # Indice di Copertura delle Immobilizzazioni
+    Indice("Indice di Copertura delle Immobilizzazioni", ("Patrimonio Netto", "Immobilizzazioni"),
+           lambda patrimonio_netto, immobilizzazioni: _dividi(patrimonio_netto, immobilizzazioni),
+           UNITA_RAPPORTO, True),
+    # Indice di Autonomia Finanziaria
+    Indice("Indice di Autonomia Finanziaria", ("Patrimonio Netto", "Totale Attivo"),
+           lambda patrimonio_netto, totale_attivo: _dividi(patrimonio_netto, totale_attivo) * 100,
+           UNITA_PERCENTUALE, True),
+]
+
+REGISTRO_INDICI = {indice.nome: indice for indice in INDICI}
+
+def _dipendenze_voci(indici: List[Indice]) -> Dict[str, List[str]]:
+    """Associa a ogni voce gli indici che la usano"""
+    dipendenze: Dict[str, List[str]] = {}
+    for indice in indici:
+        for voce in indice.voci:
+            dipendenze.setdefault(voce, []).append(indice.nome)
+    return dipendenze
+
+# Indici che dipendono da ciascuna voce, per il ricalcolo incrementale
+DIPENDENZE_VOCI = _dipendenze_voci(INDICI)
+
+def _calcola_indice(indice: Indice, voci: Dict[str, np.ndarray]) -> np.ndarray:
+    """Applica la formula di un indice agli array delle sue voci"""
+    return indice.formula(*(voci[voce] for voce in indice.voci))
+
+def calcola_indici_array(voci: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Calcola gli indici di bilancio su array allineati, con una sola passata per indice.
+    
+    Ogni posizione degli array corrisponde a un bilancio (es. una coppia azienda-anno).
     
     Args:
-        stato_patrimoniale: Dizionario con le voci dello Stato Patrimoniale
-        conto_economico: Dizionario con le voci del Conto Economico
+        voci: Dizionario {voce standard: array dei valori}, con tutte le voci di
+            VOCI_SP_INDICI e VOCI_CE_INDICI
         
     Returns:
-        Dizionario con gli indici calcolati
+        Dizionario {indice: array dei valori}, con NaN dove il denominatore è zero
+    """
+    return {indice.nome: _calcola_indice(indice, voci) for indice in INDICI}
+
+class CalcolatoreIndici:
+    """
+    Mantiene le voci di uno o più bilanci e i relativi indici, ricalcolando
+    a ogni modifica solo gli indici che dipendono dalle voci cambiate.
     """
-    indici = {}
-    
-    # Estrai i valori necessari con gestione dei casi in cui mancano
-    # Stato Patrimoniale
-    totale_attivo = stato_patrimoniale.get("Totale Attivo", 0)
-    patrimonio_netto = stato_patrimoniale.get("Patrimonio Netto", 0)
-    attivo_circolante = stato_patrimoniale.get("Attivo Circolante", 0)
-    immobilizzazioni = stato_patrimoniale.get("Immobilizzazioni", 0)
-    passivita_correnti = stato_patrimoniale.get("Passività Correnti", 0)
-    passivita_consolidate = stato_patrimoniale.get("Passività Consolidate", 0)
-    disponibilita_liquide = stato_patrimoniale.get("Disponibilità Liquide", 0)
-    crediti = stato_patrimoniale.get("Crediti", 0)
-    
-    # Conto Economico
-    ricavi = conto_economico.get("Ricavi", 0)
-    ebitda = conto_economico.get("EBITDA", 0)
-    ebit = conto_economico.get("EBIT", 0)
-    utile_netto = conto_economico.get("Utile Netto", 0)
-    
-    # Calcolo degli indici
-    # ROE (Return on Equity)
-    if patrimonio_netto != 0:
-        indici["ROE"] = (utile_netto / patrimonio_netto) * 100
-    else:
-        indici["ROE"] = np.nan
     
-    # ROI (Return on Investment)
-    if totale_attivo != 0:
-        indici["ROI"] = (ebit / totale_attivo) * 100
-    else:
-        indici["ROI"] = np.nan
+    def __init__(self, voci: Dict[str, np.ndarray]):
+        self.voci = {voce: np.asarray(valori, dtype=float) for voce, valori in voci.items()}
+        self.indici = calcola_indici_array(self.voci)
     
-    # ROS (Return on Sales)
-    if ricavi != 0:
-        indici["ROS"] = (ebit / ricavi) * 100
-    else:
-        indici["ROS"] = np.nan
+    @classmethod
+    def da_bilancio(cls, stato_patrimoniale: Dict[str, float],
+                    conto_economico: Dict[str, float]) -> "CalcolatoreIndici":
+        """Crea il calcolatore per un singolo bilancio a partire dai dizionari SP e CE"""
+        return cls(_voci_da_dizionari([stato_patrimoniale], [conto_economico]))
     
-    # Indice di Liquidità
-    if passivita_correnti != 0:
-        indici["Indice di Liquidità"] = (disponibilita_liquide + crediti) / passivita_correnti
-    else:
-        indici["Indice di Liquidità"] = np.nan
+    def aggiorna(self, modifiche: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """
+        Applica le modifiche alle voci e ricalcola solo gli indici interessati.
+        
+        Args:
+            modifiche: Dizionario {voce standard: nuovo valore o array di valori};
+                le voci che non entrano in nessun indice vengono ignorate
+            
+        Returns:
+            Dizionario con i soli indici ricalcolati
+        """
+        da_ricalcolare = set()
+        for voce, valori in modifiche.items():
+            if voce not in self.voci:
+                continue
+            nuovi = np.broadcast_to(np.asarray(valori, dtype=float), self.voci[voce].shape)
+            if np.array_equal(nuovi, self.voci[voce], equal_nan=True):
+                continue
+            self.voci[voce] = nuovi.copy()
+            da_ricalcolare.update(DIPENDENZE_VOCI.get(voce, []))
+        
+        # Ricalcola nell'ordine del registro
+        ricalcolati = {
+            indice.nome: _calcola_indice(indice, self.voci)
+            for indice in INDICI
+            if indice.nome in da_ricalcolare
+        }
+        self.indici.update(ricalcolati)
+        return ricalcolati
     
-    # Indice di Indebitamento
-    if patrimonio_netto != 0:
-        indici["Indice di Indebitamento"] = (passivita_correnti + passivita_consolidate) / patrimonio_netto
-    else:
-        indici["Indice di Indebitamento"] = np.nan
+    def valori(self, posizione: int = 0) -> Dict[str, float]:
+        """Restituisce gli indici correnti di un bilancio come dizionario"""
+        return {nome: float(valori[posizione]) for nome, valori in self.indici.items()}
+
+def calcola_indici_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcola gli indici di bilancio per molti bilanci in una sola passata.
     
-    # EBITDA Margin
-    if ricavi != 0:
-        indici["EBITDA Margin"] = (ebitda / ricavi) * 100
-    else:
-        indici["EBITDA Margin"] = np.nan
+    Una colonna mancante indica una voce assente e vale 0, come le voci
+    mancanti nei dizionari passati a calcola_indici; una cella NaN resta NaN
+    e si propaga agli indici che usano la voce, come in calcola_indici.
     
-    # Rotazione Capitale Investito
-    if totale_attivo != 0:
-        indici["Rotazione Capitale Investito"] = ricavi / totale_attivo
-    else:
-        indici["Rotazione Capitale Investito"] = np.nan
+    Args:
+        df: DataFrame con una riga per bilancio (es. indicizzato per azienda e anno)
+            e una colonna per voce standard
+        
+    Returns:
+        DataFrame con lo stesso indice di df e una colonna per indice
+    """
+    voci = {
+        voce: df[voce].to_numpy(dtype=float) if voce in df.columns else np.zeros(len(df))
+        for voce in VOCI_SP_INDICI + VOCI_CE_INDICI
+    }
     
-    # Indice di Copertura delle Immobilizzazioni
-    if immobilizzazioni != 0:
-        indici["Indice di Copertura delle Immobilizzazioni"] = patrimonio_netto / immobilizzazioni
-    else:
-        indici["Indice di Copertura delle Immobilizzazioni"] = np.nan
+    return pd.DataFrame(calcola_indici_array(voci), index=df.index)
+
+def calcola_indici_da_matrici(stato_patrimoniale: pd.DataFrame, conto_economico: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcola gli indici di tutti gli anni dalle tabelle anno x voce di organize_matrices.
     
-    # Indice di Autonomia Finanziaria
-    if totale_attivo != 0:
-        indici["Indice di Autonomia Finanziaria"] = (patrimonio_netto / totale_attivo) * 100
-    else:
-        indici["Indice di Autonomia Finanziaria"] = np.nan
+    Equivale a indici_to_dataframe(calcola_indici_per_anni(...)) sui dizionari
+    corrispondenti, senza passare dai dizionari annidati.
+    
+    Args:
+        stato_patrimoniale: Tabella anno x voce dello Stato Patrimoniale
+        conto_economico: Tabella anno x voce del Conto Economico
+        
+    Returns:
+        DataFrame con colonne Anno, Indice e Valore
+    """
+    # Come per i dizionari, ogni voce viene cercata solo nel proprio prospetto;
+    # NaN nelle tabelle indica una voce mancante in quell'anno, che matrix_to_dict
+    # omette dai dizionari: vale 0
+    voci = pd.concat([
+        stato_patrimoniale.reindex(columns=VOCI_SP_INDICI),
+        conto_economico.reindex(columns=VOCI_CE_INDICI)
+    ], axis=1, join="inner").fillna(0)
+    
+    indici = calcola_indici_batch(voci)
+    if indici.empty:
+        return pd.DataFrame()
+    
+    return (
+        indici.rename_axis(index="Anno", columns="Indice")
+        .stack(future_stack=True)
+        .reset_index(name="Valore")
+    )
+
+def _voci_da_dizionari(stato_patrimoniale: List[Dict[str, float]],
+                       conto_economico: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
+    """Allinea le voci di più coppie di dizionari in array, con 0 per le voci mancanti"""
+    voci = {
+        voce: np.array([sp.get(voce, 0) for sp in stato_patrimoniale], dtype=float)
+        for voce in VOCI_SP_INDICI
+    }
+    voci.update({
+        voce: np.array([ce.get(voce, 0) for ce in conto_economico], dtype=float)
+        for voce in VOCI_CE_INDICI
+    })
+    return voci
+
+def calcola_indici(stato_patrimoniale: Dict[str, float], conto_economico: Dict[str, float]) -> Dict[str, float]:
+    """
+    Calcola gli indici di bilancio a partire dai dati di Stato Patrimoniale e Conto Economico.
+    
+    Args:
+        stato_patrimoniale: Dizionario con le voci dello Stato Patrimoniale
+        conto_economico: Dizionario con le voci del Conto Economico
+        
+    Returns:
+        Dizionario con gli indici calcolati
+    """
+    indici = calcola_indici_array(_voci_da_dizionari([stato_patrimoniale], [conto_economico]))
     
-    return indici
+    return {indice: float(valori[0]) for indice, valori in indici.items()}
 
 def calcola_indici_per_anni(stato_patrimoniale_anni: Dict[int, Dict[str, float]], 
                            conto_economico_anni: Dict[int, Dict[str, float]]) -> Dict[int, Dict[str, float]]:
@@ -101,17 +258,19 @@ def calcola_indici_per_anni(stato_patrimoniale_anni: Dict[int, Dict[str, float]]
     Returns:
         Dizionario con gli indici calcolati per ogni anno
     """
-    indici_anni = {}
+    # Anni presenti in entrambi i prospetti
+    anni = [anno for anno in stato_patrimoniale_anni.keys() if anno in conto_economico_anni]
     
-    # Calcola gli indici per ogni anno
-    for anno in stato_patrimoniale_anni.keys():
-        if anno in conto_economico_anni:
-            indici_anni[anno] = calcola_indici(
-                stato_patrimoniale_anni[anno],
-                conto_economico_anni[anno]
-            )
+    # Calcola gli indici di tutti gli anni in una sola passata
+    indici = calcola_indici_array(_voci_da_dizionari(
+        [stato_patrimoniale_anni[anno] for anno in anni],
+        [conto_economico_anni[anno] for anno in anni]
+    ))
     
-    return indici_anni
+    return {
+        anno: {indice: float(valori[i]) for indice, valori in indici.items()}
+        for i, anno in enumerate(anni)
+    }
 
 def indici_to_dataframe(indici_anni: Dict[int, Dict[str, float]]) -> pd.DataFrame:
     """
@@ -136,4 +295,23 @@ def indici_to_dataframe(indici_anni: Dict[int, Dict[str, float]]) -> pd.DataFram
     # Crea il DataFrame
     df = pd.DataFrame(data)
     
-    return df
\ No newline at end of file
+    return df
+
+def indici_from_dataframe(df: pd.DataFrame) -> Dict[int, Dict[str, float]]:
+    """
+    Ricostruisce il dizionario degli indici da un DataFrame di indici_to_dataframe.
+    
+    Args:
+        df: DataFrame con colonne Anno, Indice e Valore
+        
+    Returns:
+        Dizionario con gli indici calcolati per ogni anno
+    """
+    if df.empty:
+        return {}
+    
+    indici_anni = {}
+    for anno, indice, valore in zip(df["Anno"].tolist(), df["Indice"].tolist(), df["Valore"].tolist()):
+        indici_anni.setdefault(anno, {})[indice] = valore
+    
+    return indici_anni
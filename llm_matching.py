@@ -0,0 +1,198 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import random
+import threading
+import urllib.error
+import urllib.request
+import warnings
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import (
+    LLM_API_URL, LLM_API_KEY, LLM_MODEL, LLM_BATCH_SIZE,
+    LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES, LLM_TIMEOUT
+)
+
+SYSTEM_PROMPT = (
+    "Sei un esperto di bilanci italiani. Ricevi un oggetto JSON con 'voci_standard' "
+    "e 'voci'. Per ogni voce indica la voce standard equivalente, o null se nessuna "
+    "corrisponde. Rispondi solo con un oggetto JSON {\"mapping\": {voce: voce_standard}}."
+)
+
+# Errori per cui una richiesta viene ripetuta
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+class MatchResult(dict):
+    """
+    Mapping {voce_bilancio: voce_standard} con l'insieme non_risolte delle voci
+    per cui il modello non ha risposto (errori o tentativi esauriti): per queste
+    l'assenza dal mapping non significa "nessuna corrispondenza".
+    """
+
+    def __init__(self, *args, non_risolte=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.non_risolte = set(non_risolte)
+
+class LLMMatcher:
+    """
+    Matching delle voci tramite un modello linguistico esposto da un endpoint
+    compatibile con le Chat Completions di OpenAI.
+
+    Le voci vengono inviate a blocchi di batch_size per richiesta, con al massimo
+    max_concurrency richieste contemporanee. Le richieste fallite vengono ripetute
+    con backoff esponenziale e le risposte sono memorizzate in una cache LRU per
+    contenuto della richiesta.
+    """
+
+    def __init__(self, api_url: str, api_key: str = "", model: str = LLM_MODEL,
+                 batch_size: int = LLM_BATCH_SIZE, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_retries: int = LLM_MAX_RETRIES, timeout: float = LLM_TIMEOUT,
+                 backoff: float = 0.5, cache_size: int = 1024):
+        self.endpoint = api_url.rstrip("/") + "/v1/chat/completions"
+        self.api_key = api_key
+        self.model = model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.cache_size = cache_size
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "cache_hits": 0}
+        self._cache: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _post(self, payload: dict) -> dict:
+        """Invia una richiesta all'endpoint (bloccante)"""
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _payload(self, voci: List[str], voci_standard: List[str]) -> dict:
+        """Costruisce la richiesta per un blocco di voci"""
+        return {
+            "model": self.model,
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(
+                    {"voci_standard": voci_standard, "voci": voci}, ensure_ascii=False
+                )},
+            ],
+        }
+
+    @staticmethod
+    def _parse(response: dict, voci: List[str], voci_standard: List[str]) -> Dict[str, Optional[str]]:
+        """Estrae il mapping dalla risposta, scartando voci e voci standard non richieste"""
+        content = response["choices"][0]["message"]["content"]
+        if not isinstance(content, str):
+            # Ad esempio content null quando il modello rifiuta o interrompe la risposta
+            raise ValueError("risposta senza contenuto testuale")
+        content = json.loads(content)
+        mapping = content.get("mapping", content) if isinstance(content, dict) else None
+        if not isinstance(mapping, dict):
+            raise ValueError("risposta senza mapping")
+        standard = set(voci_standard)
+        return {
+            voce: mapping[voce] if isinstance(mapping.get(voce), str) and mapping[voce] in standard else None
+            for voce in voci
+        }
+
+    async def _match_batch(self, voci: List[str], voci_standard: List[str],
+                           semaphore: asyncio.Semaphore) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Esegue il matching di un blocco, con cache e tentativi ripetuti.
+        Restituisce None se il blocco non è stato risolto.
+        """
+        payload = self._payload(voci, voci_standard)
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+
+        for tentativo in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    self.stats["requests"] += 1
+                    response = await asyncio.to_thread(self._post, payload)
+                result = self._parse(response, voci, voci_standard)
+                break
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                retryable = not isinstance(e, urllib.error.HTTPError) or e.code in RETRYABLE_STATUS
+                if not retryable or tentativo == self.max_retries:
+                    self.stats["failures"] += 1
+                    warnings.warn(f"Matching LLM non riuscito per {len(voci)} voci: {str(e)}")
+                    return None
+                self.stats["retries"] += 1
+                # Backoff esponenziale con jitter
+                await asyncio.sleep(self.backoff * 2 ** tentativo + random.uniform(0, self.backoff))
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    async def match_async(self, voci_bilancio: List[str], voci_standard: List[str]) -> MatchResult:
+        """
+        Esegue il matching di tutte le voci, a blocchi e in parallelo.
+
+        Args:
+            voci_bilancio: Lista delle voci presenti nel bilancio
+            voci_standard: Lista delle voci standard da mappare
+
+        Returns:
+            MatchResult con mapping {voce_bilancio: voce_standard} e le voci dei
+            blocchi non risolti in non_risolte
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batches = [
+            voci_bilancio[i:i + self.batch_size]
+            for i in range(0, len(voci_bilancio), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self._match_batch(batch, voci_standard, semaphore) for batch in batches)
+        )
+
+        mapping = MatchResult()
+        for batch, result in zip(batches, results):
+            if result is None:
+                mapping.non_risolte.update(batch)
+                continue
+            mapping.update({voce: match for voce, match in result.items() if match is not None})
+        return mapping
+
+    def match(self, voci_bilancio: List[str], voci_standard: List[str]) -> MatchResult:
+        """
+        Versione sincrona di match_async, utilizzabile anche da un thread con un
+        event loop già attivo.
+        """
+        if not voci_bilancio:
+            return MatchResult()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.match_async(voci_bilancio, voci_standard))
+
+        # Un event loop è già attivo in questo thread: esegui in un thread dedicato
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.match_async(voci_bilancio, voci_standard)).result()
+
+_default_llm_matcher: Optional[LLMMatcher] = None
+
+def get_llm_matcher() -> Optional[LLMMatcher]:
+    """Restituisce il matcher LLM configurato, o None se nessun endpoint è configurato"""
+    global _default_llm_matcher
+    if _default_llm_matcher is None and LLM_API_URL:
+        _default_llm_matcher = LLMMatcher(LLM_API_URL, LLM_API_KEY)
+    return _default_llm_matcher
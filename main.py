@@ -3,9 +3,9 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import os
-from parser import parse_excel, organize_data
-from matching import apply_matching
-from indici import calcola_indici_per_anni, indici_to_dataframe
+from parser import SUPPORTED_EXTENSIONS
+from analysis import analyze
+from cache import get_pipeline_cache
 from utils import (
     create_indici_chart, 
     create_comparison_chart, 
@@ -57,7 +57,10 @@ st.markdown("### Analisi Finanziaria Automatica per PMI, Freelance e Consulenti"
 with st.sidebar:
     st.header("Carica il tuo bilancio")
     
-    uploaded_file = st.file_uploader("Seleziona un file Excel (.xlsx)", type=["xlsx"])
+    uploaded_file = st.file_uploader(
+        "Seleziona un file di bilancio (.xlsx, .xlsb, .csv, .parquet)",
+        type=[ext.lstrip(".") for ext in SUPPORTED_EXTENSIONS]
+    )
     
     if uploaded_file is not None:
         st.success("File caricato con successo!")
@@ -100,32 +103,35 @@ if 'analyzed_data' not in st.session_state:
 if 'uploaded_file' in locals() and uploaded_file is not None and 'analyze_button' in locals() and analyze_button:
     try:
         with st.spinner("Analisi in corso..."):
-            # Parsing del file Excel
-            df = parse_excel(uploaded_file, sheet_name)
-            
-            # Applicazione del matching
-            df_matched = apply_matching(df, matching_type)
-            
-            # Organizzazione dei dati
-            stato_patrimoniale, conto_economico = organize_data(df_matched)
-            
-            # Calcolo degli indici
-            indici_anni = calcola_indici_per_anni(stato_patrimoniale, conto_economico)
-            
-            # Conversione in DataFrame
-            df_indici = indici_to_dataframe(indici_anni)
+            # Parsing, matching e indici; un file già analizzato viene servito dalla cache
+            pipeline_cache = get_pipeline_cache()
+            result = analyze(
+                uploaded_file.getvalue(),
+                filename=uploaded_file.name,
+                sheet_name=sheet_name,
+                matching_type=matching_type,
+                cache=pipeline_cache
+            )
             
             # Salva i risultati nella session state
             st.session_state.analyzed_data = {
-                "df_raw": df,
-                "df_matched": df_matched,
-                "stato_patrimoniale": stato_patrimoniale,
-                "conto_economico": conto_economico,
-                "indici_anni": indici_anni,
-                "df_indici": df_indici
+                "df_raw": result.raw,
+                "df_matched": result.matched,
+                "stato_patrimoniale": result.stato_patrimoniale_anni(),
+                "conto_economico": result.conto_economico_anni(),
+                "indici_anni": result.indici_anni(),
+                "df_indici": result.indici
             }
             
             st.success("Analisi completata con successo!")
+            stats = pipeline_cache.stats()
+            st.caption(
+                f"{'Risultati dalla cache' if result.cached else 'Analisi eseguita'} "
+                f"(cache: {stats['hits']} hit, {stats['misses']} miss)"
+            )
+            if result.matching_stats:
+                with st.expander("Statistiche del matching"):
+                    st.dataframe(pd.DataFrame(result.matching_stats), use_container_width=True)
     
     except Exception as e:
         st.error(f"Si è verificato un errore durante l'analisi: {str(e)}")
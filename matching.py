@@ -1,26 +1,87 @@
-from typing import Dict, List, Tuple
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 from rapidfuzz import fuzz, process
-from config import VOCI_STATO_PATRIMONIALE, VOCI_CONTO_ECONOMICO
+from config import VOCI_STATO_PATRIMONIALE, VOCI_CONTO_ECONOMICO, LLM_FUZZY_THRESHOLD
+from cache import MappingCache, get_mapping_cache, normalize_voce, standard_list_version
+from embeddings import get_embedding_index
+from llm_matching import MatchResult, get_llm_matcher
 
-def fuzzy_match(voci_bilancio: List[str], voci_standard: List[str], threshold: int = 80) -> Dict[str, str]:
+# Indice delle voci standard, costruito una sola volta all'avvio
+get_embedding_index(tuple(VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO))
+
+def _worker_count(workers: int) -> int:
+    """Numero effettivo di thread corrispondente al parametro workers di rapidfuzz"""
+    if workers == -1:
+        return os.cpu_count() or 1
+    return max(workers, 1)
+
+def fuzzy_match_batch(voci_bilancio: List[str], voci_standard: List[str], threshold: int = 80,
+                      workers: int = -1) -> Dict[str, str]:
+    """
+    Esegue il matching fuzzy su tutte le voci in un'unica chiamata.
+    
+    I punteggi di tutte le coppie voce x voce standard vengono calcolati in una
+    matrice con process.cdist, in parallelo su più thread; la migliore
+    corrispondenza e la soglia sono applicate per riga con NumPy.
+    
+    Args:
+        voci_bilancio: Lista delle voci presenti nel bilancio
+        voci_standard: Lista delle voci standard da mappare
+        threshold: Soglia minima di somiglianza (0-100)
+        workers: Numero di thread per il calcolo dei punteggi (-1 usa tutti i core)
+        
+    Returns:
+        Dizionario con mapping {voce_bilancio: voce_standard}
+    """
+    if len(voci_bilancio) == 0:
+        return {}
+    
+    # Matrice dei punteggi voci_bilancio x voci_standard (stesso scorer di extractOne);
+    # i punteggi sotto soglia valgono 0 e possono essere calcolati in modo parziale
+    scores = process.cdist(
+        voci_bilancio, voci_standard,
+        scorer=fuzz.WRatio, score_cutoff=threshold, dtype=np.float64, workers=workers
+    )
+    
+    # Trova la migliore corrispondenza per ogni voce
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(voci_bilancio)), best]
+    
+    # Applica solo se supera la soglia
+    return {
+        voci_bilancio[i]: voci_standard[best[i]]
+        for i in np.flatnonzero(best_scores >= threshold)
+    }
+
+def fuzzy_match(voci_bilancio: List[str], voci_standard: List[str], threshold: int = 80,
+                workers: int = -1) -> Dict[str, str]:
     """
     Esegue un matching fuzzy tra le voci del bilancio e le voci standard.
     
+    Con più di un core disponibile usa fuzzy_match_batch; con un solo core
+    extractOne per voce resta più veloce, perché alza la soglia man mano che
+    trova corrispondenze migliori e salta i calcoli inutili.
+    
     Args:
         voci_bilancio: Lista delle voci presenti nel bilancio
         voci_standard: Lista delle voci standard da mappare
         threshold: Soglia minima di somiglianza (0-100)
+        workers: Numero di thread per il calcolo dei punteggi (-1 usa tutti i core)
         
     Returns:
         Dizionario con mapping {voce_bilancio: voce_standard}
     """
+    if _worker_count(workers) > 1:
+        return fuzzy_match_batch(voci_bilancio, voci_standard, threshold, workers)
+    
     mapping = {}
     
     for voce in voci_bilancio:
         # Trova la migliore corrispondenza
-        match, score = process.extractOne(voce, voci_standard)
+        match, score, _ = process.extractOne(voce, voci_standard)
         
         # Applica solo se supera la soglia
         if score >= threshold:
@@ -28,48 +89,225 @@ def fuzzy_match(voci_bilancio: List[str], voci_standard: List[str], threshold: i
     
     return mapping
 
-def embedding_match(voci_bilancio: List[str], voci_standard: List[str]) -> Dict[str, str]:
+def embedding_match(voci_bilancio: List[str], voci_standard: List[str], threshold: int = 50) -> Dict[str, str]:
     """
-    Esegue un matching semantico usando embedding con MiniLM.
-    Questa è una versione semplificata che simula il comportamento.
+    Esegue un matching semantico usando embedding TF-IDF su n-grammi di caratteri.
+    
+    Le voci standard sono codificate una sola volta in un indice; le voci del
+    bilancio sono codificate in blocco e confrontate con un unico prodotto tra
+    matrici. Il calcolo avviene interamente in locale, su CPU.
     
     Args:
         voci_bilancio: Lista delle voci presenti nel bilancio
         voci_standard: Lista delle voci standard da mappare
+        threshold: Soglia minima di similarità del coseno (0-100)
         
     Returns:
         Dizionario con mapping {voce_bilancio: voce_standard}
     """
-    # Placeholder per la versione completa che userebbe sentence-transformers
-    # In una implementazione reale, qui si userebbero gli embedding di MiniLM
+    if len(voci_bilancio) == 0:
+        return {}
+    
+    index = get_embedding_index(tuple(voci_standard))
+    best, similarita = index.search(voci_bilancio)
     
-    # Per ora, usiamo un fuzzy match con soglia più bassa come simulazione
-    return fuzzy_match(voci_bilancio, voci_standard, threshold=70)
+    # Applica solo se supera la soglia
+    return {
+        voci_bilancio[i]: voci_standard[best[i]]
+        for i in np.flatnonzero(similarita * 100 >= threshold)
+    }
 
-def gpt_match(voci_bilancio: List[str], voci_standard: List[str]) -> Dict[str, str]:
+def gpt_match(voci_bilancio: List[str], voci_standard: List[str], threshold: int = 60) -> Dict[str, str]:
     """
-    Placeholder per il matching con GPT API.
+    Esegue il matching con un modello linguistico (LLM).
+    
+    Le voci che il fuzzy matching risolve con alta confidenza (LLM_FUZZY_THRESHOLD)
+    non vengono inviate al modello; le restanti sono inviate a blocchi. Se nessun
+    endpoint LLM è configurato, usa il fuzzy matching come sostituto.
     
     Args:
         voci_bilancio: Lista delle voci presenti nel bilancio
         voci_standard: Lista delle voci standard da mappare
+        threshold: Soglia minima di somiglianza (0-100) del fuzzy matching sostitutivo
         
     Returns:
         Dizionario con mapping {voce_bilancio: voce_standard}
     """
-    # Questa è solo una simulazione, in una versione reale si userebbe l'API di OpenAI
-    return fuzzy_match(voci_bilancio, voci_standard, threshold=60)
+    matcher = get_llm_matcher()
+    if matcher is None:
+        return fuzzy_match(voci_bilancio, voci_standard, threshold=threshold)
+    
+    # Prima le voci ad alta confidenza, senza chiamare il modello
+    mapping = fuzzy_match(voci_bilancio, voci_standard, threshold=LLM_FUZZY_THRESHOLD)
+    
+    # Solo le voci ambigue arrivano al modello
+    restanti = [voce for voce in voci_bilancio if voce not in mapping]
+    risultato = matcher.match(restanti, voci_standard)
+    mapping.update(risultato)
+    
+    return MatchResult(mapping, non_risolte=risultato.non_risolte)
+
+# Metodi di matching disponibili: {nome: (funzione, soglia)}
+MATCHERS = {
+    "fuzzy": (fuzzy_match, 80),
+    "embedding": (embedding_match, 50),
+    "gpt": (gpt_match, 60),
+}
 
-def apply_matching(df: pd.DataFrame, matching_type: str) -> pd.DataFrame:
+def cache_method(metodo: str) -> str:
     """
-    Applica il matching selezionato al DataFrame.
+    Nome del metodo nelle chiavi della cache: per "gpt" include il backend
+    effettivo, così i risultati del fuzzy matching sostitutivo non vengono
+    riusati quando l'LLM è configurato (e quelli di modelli diversi restano separati).
+    """
+    if metodo != "gpt":
+        return metodo
+    matcher = get_llm_matcher()
+    return f"gpt:{matcher.model}" if matcher is not None else "gpt-fuzzy"
+
+def cached_match(voci_bilancio: List[str], voci_standard: List[str], metodo: str,
+                 cache: Optional[MappingCache] = None) -> Dict[str, str]:
+    """
+    Esegue il matching passando al metodo scelto solo le voci assenti dalla cache.
+    
+    Args:
+        voci_bilancio: Lista delle voci presenti nel bilancio
+        voci_standard: Lista delle voci standard da mappare
+        metodo: Nome del metodo di matching (chiave di MATCHERS)
+        cache: Cache da usare (default: la cache condivisa del processo)
+        
+    Returns:
+        Dizionario con mapping {voce_bilancio: voce_standard}
+    """
+    matcher, threshold = MATCHERS[metodo]
+    cache = cache if cache is not None else get_mapping_cache()
+    versione = standard_list_version(voci_standard)
+    metodo = cache_method(metodo)
+    
+    # Le voci che differiscono solo per maiuscole e spazi condividono la chiave
+    chiavi = {voce: normalize_voce(voce) for voce in voci_bilancio}
+    trovate = cache.get_many(chiavi.values(), metodo, threshold, versione)
+    
+    # Una voce rappresentativa per ogni chiave mancante
+    mancanti = {}
+    for voce, chiave in chiavi.items():
+        if chiave not in trovate:
+            mancanti.setdefault(chiave, voce)
+    
+    if mancanti:
+        nuove = matcher(list(mancanti.values()), voci_standard, threshold)
+        # Le voci non risolte per un errore del metodo restano fuori dalla cache
+        non_risolte = getattr(nuove, "non_risolte", ())
+        risultati = {
+            chiave: nuove.get(voce)
+            for chiave, voce in mancanti.items()
+            if voce not in non_risolte
+        }
+        cache.set_many(risultati, metodo, threshold, versione)
+        trovate.update(risultati)
+    
+    return {
+        voce: trovate[chiave]
+        for voce, chiave in chiavi.items()
+        if trovate.get(chiave) is not None
+    }
+
+def exact_match(voci_bilancio: List[str], voci_standard: List[str]) -> Dict[str, str]:
+    """
+    Associa le voci uguali a una voce standard a meno di maiuscole e spazi.
+    
+    Args:
+        voci_bilancio: Lista delle voci presenti nel bilancio
+        voci_standard: Lista delle voci standard da mappare
+        
+    Returns:
+        Dizionario con mapping {voce_bilancio: voce_standard}
+    """
+    standard = {normalize_voce(voce): voce for voce in voci_standard}
+    mapping = {}
+    for voce in voci_bilancio:
+        chiave = normalize_voce(voce)
+        if chiave in standard:
+            mapping[voce] = standard[chiave]
+    return mapping
+
+# Livelli della cascata, dal più economico al più costoso
+CASCADE_TIERS = ["exact", "fuzzy", "embedding", "gpt"]
+
+def cascade_match(voci_bilancio: List[str], voci_standard: List[str],
+                  tiers: List[str] = CASCADE_TIERS,
+                  cache: Optional[MappingCache] = None) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+    """
+    Esegue il matching a cascata: ogni livello riceve solo le voci che i livelli
+    precedenti non hanno risolto sopra la propria soglia.
+    
+    Args:
+        voci_bilancio: Lista delle voci presenti nel bilancio
+        voci_standard: Lista delle voci standard da mappare
+        tiers: Livelli da applicare, in ordine ("exact" o una chiave di MATCHERS)
+        cache: Cache dei risultati del matching (default: la cache condivisa del processo)
+        
+    Returns:
+        Tuple (mapping {voce_bilancio: voce_standard}, statistiche per livello con
+        voci ricevute, voci risolte e durata in secondi)
+    """
+    mapping = {}
+    stats = []
+    restanti = list(voci_bilancio)
+    
+    for tier in tiers:
+        start = time.perf_counter()
+        if not restanti:
+            trovate = {}
+        elif tier == "exact":
+            trovate = exact_match(restanti, voci_standard)
+        else:
+            trovate = cached_match(restanti, voci_standard, tier, cache)
+        
+        stats.append({
+            "tier": tier,
+            "voci": len(restanti),
+            "hits": len(trovate),
+            "seconds": time.perf_counter() - start
+        })
+        mapping.update(trovate)
+        restanti = [voce for voce in restanti if voce not in trovate]
+    
+    return mapping, stats
+
+def matching_tiers(matching_type: str) -> List[str]:
+    """Livelli di cascade_match applicati per un tipo di matching (fuzzy, embedding, gpt o cascata)"""
+    tipo = matching_type.lower()
+    if "cascata" in tipo or "cascade" in tipo:
+        return CASCADE_TIERS
+    if "fuzzy" in tipo:
+        return ["fuzzy"]
+    if "embedding" in tipo:
+        return ["embedding"]
+    if "gpt" in tipo:
+        return ["gpt"]
+    return []
+
+def matching_backend(matching_type: str) -> str:
+    """
+    Backend effettivo di un tipo di matching, per le chiavi della cache
+    dell'analisi: per i tipi che usano il livello "gpt" è cache_method("gpt"),
+    altrimenti una stringa vuota.
+    """
+    return cache_method("gpt") if "gpt" in matching_tiers(matching_type) else ""
+
+def apply_matching_with_stats(df: pd.DataFrame, matching_type: str,
+                              cache: Optional[MappingCache] = None) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Applica il matching selezionato al DataFrame e restituisce le statistiche per livello.
     
     Args:
         df: DataFrame con i dati di bilancio
-        matching_type: Tipo di matching da applicare
+        matching_type: Tipo di matching da applicare (fuzzy, embedding, gpt o cascata)
+        cache: Cache dei risultati del matching (default: la cache condivisa del processo)
         
     Returns:
-        DataFrame con le voci standardizzate
+        Tuple (DataFrame con le voci standardizzate, statistiche per livello come in cascade_match)
     """
     # Estrai le voci uniche dal DataFrame
     voci_bilancio = df["Voce"].unique().tolist()
@@ -78,14 +316,9 @@ def apply_matching(df: pd.DataFrame, matching_type: str) -> pd.DataFrame:
     voci_standard = VOCI_STATO_PATRIMONIALE + VOCI_CONTO_ECONOMICO
     
     # Seleziona il metodo di matching
-    if "Fuzzy" in matching_type:
-        mapping = fuzzy_match(voci_bilancio, voci_standard)
-    elif "Embedding" in matching_type:
-        mapping = embedding_match(voci_bilancio, voci_standard)
-    elif "GPT" in matching_type:
-        mapping = gpt_match(voci_bilancio, voci_standard)
-    else:
-        mapping = {}
+    tiers = matching_tiers(matching_type)
+    
+    mapping, stats = cascade_match(voci_bilancio, voci_standard, tiers, cache)
     
     # Crea una copia del DataFrame
     df_matched = df.copy()
@@ -96,4 +329,19 @@ def apply_matching(df: pd.DataFrame, matching_type: str) -> pd.DataFrame:
     # Se una voce non ha corrispondenza, mantieni l'originale
     df_matched["Voce_Standard"].fillna(df_matched["Voce"], inplace=True)
     
-    return df_matched
\ No newline at end of file
+    return df_matched, stats
+
+def apply_matching(df: pd.DataFrame, matching_type: str, cache: Optional[MappingCache] = None) -> pd.DataFrame:
+    """
+    Applica il matching selezionato al DataFrame.
+    
+    Args:
+        df: DataFrame con i dati di bilancio
+        matching_type: Tipo di matching da applicare
+        cache: Cache dei risultati del matching (default: la cache condivisa del processo)
+        
+    Returns:
+        DataFrame con le voci standardizzate
+    """
+    df_matched, _ = apply_matching_with_stats(df, matching_type, cache)
+    return df_matched
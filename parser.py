@@ -1,101 +1,394 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
+import os
 import re
+from functools import lru_cache
+from itertools import chain, islice
+from openpyxl import load_workbook
 
-def parse_excel(file, sheet_name=0) -> pd.DataFrame:
+YEAR_PATTERN = re.compile(r'\b(20\d{2})\b')
+
+def is_year_column(col) -> bool:
+    """
+    Verifica se l'intestazione di una colonna rappresenta un anno.
+    
+    Args:
+        col: Intestazione della colonna
+        
+    Returns:
+        True se la colonna contiene un anno (2000-2100)
+    """
+    # Cerca un pattern di anno (4 cifre) nel nome della colonna
+    if isinstance(col, str):
+        return YEAR_PATTERN.search(col) is not None
+    # Se la colonna è un numero intero tra 2000 e 2100
+    return isinstance(col, (int, float)) and 2000 <= col <= 2100
+
+def year_from_column(col):
+    """
+    Estrae l'anno dall'intestazione di una colonna.
+    
+    Args:
+        col: Intestazione della colonna degli anni
+        
+    Returns:
+        L'anno come stringa se la colonna è testuale, altrimenti come intero
+    """
+    if isinstance(col, str):
+        match = YEAR_PATTERN.search(col)
+        return match.group(1) if match else col
+    return int(col)
+
+def reshape_to_long(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte un bilancio in formato largo (una colonna per anno) nel formato lungo.
+    
+    Le etichette degli anni vengono estratte una sola volta per colonna e la
+    conversione avviene interamente su array, senza cicli per riga.
+    
+    Args:
+        df_raw: DataFrame con le voci nella prima colonna e un anno per colonna
+        
+    Returns:
+        DataFrame con colonne: Voce, Anno, Valore
+    """
+    # Identifica la prima colonna come quella delle voci
+    voci_col = df_raw.columns[0]
+    
+    # Identifica le colonne degli anni (assumiamo che siano numeri o stringhe che contengono anni)
+    anni_pos = [i for i, col in enumerate(df_raw.columns[1:], start=1) if is_year_column(col)]
+    
+    # Se non abbiamo trovato colonne di anni, prendiamo tutte le colonne numeriche
+    if not anni_pos:
+        anni_pos = [
+            i for i in range(1, df_raw.shape[1])
+            if pd.api.types.is_numeric_dtype(df_raw.iloc[:, i])
+        ]
+    
+    # Tieni solo le righe con una voce testuale
+    voci = df_raw[voci_col]
+    voci_mask = np.fromiter((isinstance(v, str) for v in voci), dtype=bool, count=len(voci))
+    voci = np.array([v.strip() for v in voci[voci_mask]], dtype=object)
+    
+    # Anno di ciascuna colonna, calcolato una volta sola
+    anni = pd.Index([year_from_column(df_raw.columns[i]) for i in anni_pos])
+    
+    # Matrice voci x anni: le celle valorizzate, in ordine di riga, diventano record
+    valori = df_raw.iloc[voci_mask, anni_pos].to_numpy()
+    righe, colonne = np.nonzero(pd.notna(valori))
+    if len(righe) == 0:
+        return pd.DataFrame()
+    
+    return pd.DataFrame({
+        "Voce": voci[righe],
+        "Anno": anni.take(colonne),
+        "Valore": valori[righe, colonne].astype(float)
+    })
+
+def _is_number(value) -> bool:
+    """Verifica se il valore di una cella è numerico"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def iter_excel_records(file, sheet_name=0, chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+    """
+    Legge un foglio Excel in streaming e restituisce i dati in formato lungo a blocchi.
+    
+    Il foglio viene letto riga per riga con openpyxl in modalità read_only, senza
+    caricarlo interamente in memoria: l'occupazione di memoria dipende da chunk_size
+    e non dalla dimensione del foglio. La prima riga non vuota è l'intestazione, da
+    cui vengono riconosciute le colonne degli anni. La colonna delle voci e,
+    in mancanza di intestazioni con anni, le colonne numeriche sono determinate
+    sulle prime chunk_size righe.
+    
+    Args:
+        file: File Excel caricato
+        sheet_name: Nome o indice del foglio da leggere
+        chunk_size: Numero massimo di record per blocco
+        
+    Returns:
+        Iteratore di DataFrame con colonne: Voce, Anno, Valore
+    """
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        
+        # La prima riga non vuota è l'intestazione
+        header = next((row for row in rows if any(v is not None for v in row)), None)
+        if header is None:
+            return
+        
+        # Prime righe di dati, per individuare le colonne
+        buffer = list(islice(rows, chunk_size))
+        
+        # La colonna delle voci è la prima colonna non vuota
+        occupate = [
+            i for i in range(len(header))
+            if header[i] is not None or any(i < len(row) and row[i] is not None for row in buffer)
+        ]
+        if not occupate:
+            return
+        voci_pos = min(
+            (i for i in occupate if any(i < len(row) and row[i] is not None for row in buffer)),
+            default=occupate[0]
+        )
+        
+        # Identifica le colonne degli anni dall'intestazione
+        anni_pos = [i for i in occupate if i > voci_pos and is_year_column(header[i])]
+        
+        # Se non abbiamo trovato colonne di anni, prendiamo le colonne numeriche
+        if not anni_pos:
+            anni_pos = [
+                i for i in occupate
+                if i > voci_pos and all(
+                    _is_number(row[i]) for row in buffer if i < len(row) and row[i] is not None
+                )
+            ]
+        
+        # Anno di ciascuna colonna, calcolato una volta sola
+        colonne = [(i, year_from_column(header[i] if header[i] is not None else f"Unnamed: {i}"))
+                   for i in anni_pos]
+        
+        voci, anni, valori = [], [], []
+        for row in chain(buffer, rows):
+            voce = row[voci_pos] if voci_pos < len(row) else None
+            if not isinstance(voce, str):
+                continue
+            voce = voce.strip()
+            for i, anno in colonne:
+                valore = row[i] if i < len(row) else None
+                if valore is not None:
+                    voci.append(voce)
+                    anni.append(anno)
+                    valori.append(float(valore))
+            
+            if len(valori) >= chunk_size:
+                yield pd.DataFrame({"Voce": voci, "Anno": anni, "Valore": valori})
+                voci, anni, valori = [], [], []
+        
+        if valori:
+            yield pd.DataFrame({"Voce": voci, "Anno": anni, "Valore": valori})
+    finally:
+        workbook.close()
+
+def parse_excel(file, sheet_name=0, streaming: bool = False) -> pd.DataFrame:
     """
     Legge un file Excel e lo converte in un formato tabellare standard.
     
     Args:
         file: File Excel caricato
         sheet_name: Nome o indice del foglio da leggere
+        streaming: Se True legge il foglio riga per riga con iter_excel_records,
+            senza caricarlo interamente in un DataFrame
         
     Returns:
         DataFrame con colonne: Voce, Anno, Valore
     """
     try:
+        if streaming:
+            chunks = list(iter_excel_records(file, sheet_name=sheet_name))
+            return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        
         # Leggi il file Excel
         df_raw = pd.read_excel(file, sheet_name=sheet_name)
         
         # Rimuovi righe e colonne completamente vuote
         df_raw = df_raw.dropna(how='all').dropna(axis=1, how='all')
         
-        # Identifica la prima colonna come quella delle voci
-        voci_col = df_raw.columns[0]
+        # Converti in formato lungo (Voce, Anno, Valore)
+        return reshape_to_long(df_raw)
+    
+    except Exception as e:
+        raise Exception(f"Errore nel parsing del file Excel: {str(e)}")
+
+# Estensioni dei file gestiti da parse_file
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + (".xlsb", ".csv", ".parquet")
+
+def _file_extension(file, filename=None) -> str:
+    """Estensione in minuscolo del file, dal nome esplicito, dal percorso o dall'attributo name"""
+    nome = filename or (file if isinstance(file, (str, os.PathLike)) else getattr(file, "name", "")) or ""
+    return os.path.splitext(str(nome))[1].lower()
+
+def _year_labels_to_int(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte in interi le intestazioni testuali composte solo da un anno.
+    
+    Nei formati testuali (CSV, Parquet) le intestazioni sono sempre stringhe,
+    mentre in Excel un anno è normalmente una cella numerica: così lo stesso
+    bilancio produce gli stessi valori di Anno in tutti i formati.
+    """
+    return df.rename(columns=lambda col: int(col) if isinstance(col, str) and col.strip().isdigit()
+                     and is_year_column(int(col)) else col)
+
+# Numero in formato italiano con separatore delle migliaia '.' e decimale ',' (es. -1.234,56)
+NUMERO_ITALIANO = r"^\s*[-+]?(\d{1,3}(\.\d{3})+|\d+)(,\d+)?\s*$"
+
+def _convert_italian_numbers(table):
+    """
+    Converte in numeri le colonne testuali i cui valori sono tutti numeri in
+    formato italiano: il lettore di pyarrow gestisce il decimale ',' ma non il
+    separatore delle migliaia '.', per cui colonne come "1.234,56" restano testo.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    for i, field in enumerate(table.schema):
+        if not pa.types.is_string(field.type):
+            continue
+        column = table.column(i)
+        valori = pc.drop_null(column)
+        if len(valori) == 0 or not pc.all(pc.match_substring_regex(valori, NUMERO_ITALIANO)).as_py():
+            continue
+        numeri = pc.replace_substring(pc.replace_substring(pc.utf8_trim_whitespace(column), ".", ""), ",", ".")
+        table = table.set_column(i, field.name, pc.cast(numeri, pa.float64()))
+    return table
+
+def _read_csv(file) -> pd.DataFrame:
+    """
+    Legge un CSV con il lettore di pyarrow, riconoscendo il separatore ',' o ';'.
+    
+    Con il separatore ';' (CSV esportati con impostazioni italiane) i numeri
+    usano la virgola come decimale e il punto come separatore delle migliaia.
+    """
+    from pyarrow import csv as pa_csv
+    import pyarrow as pa
+    
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            data = f.read()
+    else:
+        data = file.read()
+    
+    prima_riga = data.split(b"\n", 1)[0]
+    delimiter = ";" if prima_riga.count(b";") > prima_riga.count(b",") else ","
+    
+    if delimiter == ";":
+        table = pa_csv.read_csv(
+            pa.BufferReader(data),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pa_csv.ConvertOptions(decimal_point=",", strings_can_be_null=True),
+        )
+        table = _convert_italian_numbers(table)
+    else:
+        table = pa_csv.read_csv(pa.BufferReader(data), parse_options=pa_csv.ParseOptions(delimiter=delimiter))
+    return table.to_pandas()
+
+def parse_file(file, filename=None, sheet_name=0, streaming: bool = False) -> pd.DataFrame:
+    """
+    Legge un bilancio in formato Excel (.xlsx, .xlsb), CSV o Parquet e lo converte
+    nel formato tabellare standard.
+    
+    Il formato è determinato dall'estensione del file. I formati diversi da .xlsx
+    evitano la decodifica XML di Excel, che domina il tempo di lettura.
+    
+    Args:
+        file: File caricato o percorso
+        filename: Nome del file, se file non ha un attributo name (es. BytesIO)
+        sheet_name: Nome o indice del foglio da leggere (solo per Excel)
+        streaming: Se True legge i file .xlsx in streaming (vedi parse_excel)
         
-        # Identifica le colonne degli anni (assumiamo che siano numeri o stringhe che contengono anni)
-        anni_cols = []
-        for col in df_raw.columns[1:]:
-            # Cerca un pattern di anno (4 cifre) nel nome della colonna
-            if isinstance(col, str) and re.search(r'\b20\d{2}\b', col):
-                anni_cols.append(col)
-            # Se la colonna è un numero intero tra 2000 e 2100
-            elif isinstance(col, (int, float)) and 2000 <= col <= 2100:
-                anni_cols.append(col)
+    Returns:
+        DataFrame con colonne: Voce, Anno, Valore
+    """
+    estensione = _file_extension(file, filename)
+    
+    if estensione in EXCEL_EXTENSIONS or estensione == "":
+        return parse_excel(file, sheet_name=sheet_name, streaming=streaming)
+    if estensione not in SUPPORTED_EXTENSIONS:
+        raise Exception(
+            f"Formato file non supportato: {estensione} (formati supportati: {', '.join(SUPPORTED_EXTENSIONS)})"
+        )
+    
+    try:
+        if estensione == ".xlsb":
+            df_raw = pd.read_excel(file, sheet_name=sheet_name, engine="pyxlsb")
+        elif estensione == ".csv":
+            df_raw = _year_labels_to_int(_read_csv(file))
+        else:
+            df_raw = _year_labels_to_int(pd.read_parquet(file))
         
-        # Se non abbiamo trovato colonne di anni, prendiamo tutte le colonne numeriche
-        if not anni_cols:
-            anni_cols = [col for col in df_raw.columns[1:] if pd.api.types.is_numeric_dtype(df_raw[col])]
+        # Rimuovi righe e colonne completamente vuote
+        df_raw = df_raw.dropna(how='all').dropna(axis=1, how='all')
         
         # Converti in formato lungo (Voce, Anno, Valore)
-        result_data = []
-        for _, row in df_raw.iterrows():
-            voce = row[voci_col]
-            if pd.isna(voce) or not isinstance(voce, str):
-                continue
-                
-            for anno_col in anni_cols:
-                valore = row[anno_col]
-                if pd.notna(valore):
-                    # Estrai l'anno dalla colonna se è una stringa
-                    if isinstance(anno_col, str):
-                        match = re.search(r'\b(20\d{2})\b', anno_col)
-                        anno = match.group(1) if match else anno_col
-                    else:
-                        anno = int(anno_col)
-                    
-                    result_data.append({
-                        "Voce": voce.strip(),
-                        "Anno": anno,
-                        "Valore": float(valore)
-                    })
-        
-        # Crea il DataFrame risultante
-        result_df = pd.DataFrame(result_data)
-        
-        return result_df
+        return reshape_to_long(df_raw)
     
     except Exception as e:
-        raise Exception(f"Errore nel parsing del file Excel: {str(e)}")
+        raise Exception(f"Errore nel parsing del file {estensione}: {str(e)}")
+
+# Parole chiave per identificare lo Stato Patrimoniale
+SP_KEYWORDS = [
+    "attivo", "passivo", "patrimonio", "immobilizzazioni", "circolante", 
+    "disponibilità", "crediti", "debiti", "rimanenze", "tfr", "fondi"
+]
+
+# Parole chiave per identificare il Conto Economico
+CE_KEYWORDS = [
+    "ricavi", "vendite", "costi", "ebitda", "ebit", "ammortamenti", 
+    "svalutazioni", "oneri", "proventi", "imposte", "utile", "perdita"
+]
+
+# Parole chiave usate per decidere i casi di parità
+SP_HINTS = ["totale attivo", "totale passivo", "patrimonio netto"]
+CE_HINTS = ["risultato", "utile netto", "ricavi totali"]
+
+def _build_keyword_classifier():
+    """
+    Compila tutte le parole chiave in un'unica regex ad alternanza.
+    
+    La regex è un lookahead, quindi trova una corrispondenza in ogni posizione
+    del testo, preferendo la parola chiave più lunga. Ogni parola chiave è
+    associata ai gruppi di tutte le parole chiave che contiene (es. "ebitda"
+    contiene anche "ebit"), così le sovrapposizioni sono contate come nella
+    ricerca per sottostringa.
+    
+    Returns:
+        Tuple (regex compilata, dizionario {parola chiave: gruppi contenuti})
+    """
+    gruppi = {"SP": SP_KEYWORDS, "CE": CE_KEYWORDS, "SP_HINT": SP_HINTS, "CE_HINT": CE_HINTS}
+    
+    keywords = sorted({kw for kws in gruppi.values() for kw in kws}, key=len, reverse=True)
+    contenute = {
+        kw: frozenset(
+            (gruppo, altra)
+            for gruppo, kws in gruppi.items()
+            for altra in kws
+            if altra in kw
+        )
+        for kw in keywords
+    }
+    
+    pattern = re.compile("(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))")
+    return pattern, contenute
 
+_KEYWORD_PATTERN, _KEYWORD_GROUPS = _build_keyword_classifier()
+
+@lru_cache(maxsize=8192)
 def identify_statement_type(voce: str) -> str:
     """
     Identifica se una voce appartiene allo Stato Patrimoniale o al Conto Economico.
     
+    Il risultato è memorizzato per voce, quindi le voci ripetute su più anni
+    vengono classificate una sola volta.
+    
     Args:
         voce: Nome della voce di bilancio
         
     Returns:
         "SP" per Stato Patrimoniale, "CE" per Conto Economico
     """
-    # Parole chiave per identificare lo Stato Patrimoniale
-    sp_keywords = [
-        "attivo", "passivo", "patrimonio", "immobilizzazioni", "circolante", 
-        "disponibilità", "crediti", "debiti", "rimanenze", "tfr", "fondi"
-    ]
-    
-    # Parole chiave per identificare il Conto Economico
-    ce_keywords = [
-        "ricavi", "vendite", "costi", "ebitda", "ebit", "ammortamenti", 
-        "svalutazioni", "oneri", "proventi", "imposte", "utile", "perdita"
-    ]
-    
     voce_lower = voce.lower()
     
+    # Raccogli le parole chiave presenti nella voce con una sola scansione
+    trovate = set()
+    for match in _KEYWORD_PATTERN.finditer(voce_lower):
+        trovate |= _KEYWORD_GROUPS[match.group(1)]
+    
     # Conta quante parole chiave di ciascun tipo sono presenti nella voce
-    sp_count = sum(1 for kw in sp_keywords if kw in voce_lower)
-    ce_count = sum(1 for kw in ce_keywords if kw in voce_lower)
+    sp_count = sum(1 for gruppo, _ in trovate if gruppo == "SP")
+    ce_count = sum(1 for gruppo, _ in trovate if gruppo == "CE")
     
     # Determina il tipo in base al conteggio
     if sp_count > ce_count:
@@ -104,14 +397,73 @@ def identify_statement_type(voce: str) -> str:
         return "CE"
     else:
         # Se non è chiaro, prova a indovinare in base ad altre caratteristiche
-        if any(kw in voce_lower for kw in ["totale attivo", "totale passivo", "patrimonio netto"]):
+        if any(gruppo == "SP_HINT" for gruppo, _ in trovate):
             return "SP"
-        elif any(kw in voce_lower for kw in ["risultato", "utile netto", "ricavi totali"]):
+        elif any(gruppo == "CE_HINT" for gruppo, _ in trovate):
             return "CE"
         else:
             # Default a Stato Patrimoniale se non è chiaro
             return "SP"
 
+def classify_statement_types(voci: pd.Series) -> pd.Series:
+    """
+    Classifica un'intera colonna di voci come Stato Patrimoniale o Conto Economico.
+    
+    Ogni voce distinta viene classificata una sola volta, indipendentemente da
+    quante volte compare nella colonna.
+    
+    Args:
+        voci: Serie con i nomi delle voci di bilancio
+        
+    Returns:
+        Serie con "SP" o "CE" per ogni voce, con lo stesso indice di voci
+    """
+    codici, uniche = pd.factorize(voci)
+    tipi = np.array([identify_statement_type(voce) for voce in uniche], dtype=object)
+    return pd.Series(tipi[codici], index=voci.index, name="Tipo")
+
+def organize_matrices(df: pd.DataFrame, colonna_voce: str = "Voce") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Organizza i dati in due tabelle dense anno x voce per Stato Patrimoniale e Conto Economico.
+    
+    Args:
+        df: DataFrame con i dati di bilancio (colonne Voce, Anno, Valore)
+        colonna_voce: Colonna con i nomi delle voci (es. "Voce_Standard" dopo il matching)
+        
+    Returns:
+        Tuple di DataFrame (stato_patrimoniale, conto_economico) indicizzati per anno,
+        con una colonna per voce e NaN dove la voce manca in un anno
+    """
+    # A parità di anno e voce originale vale l'ultimo valore; le voci originali
+    # associate alla stessa voce standard (es. più righe "Crediti ...") si sommano
+    tabella = (
+        df.drop_duplicates(subset=["Anno", "Voce"], keep="last")
+        .groupby(["Anno", colonna_voce])["Valore"].sum(min_count=1)
+        .unstack(colonna_voce)
+        .rename_axis(columns="Voce")
+    )
+    
+    # Ogni voce distinta viene classificata una sola volta
+    tipi = classify_statement_types(tabella.columns.to_series())
+    is_sp = (tipi == "SP").to_numpy()
+    
+    return tabella.loc[:, is_sp], tabella.loc[:, ~is_sp]
+
+def matrix_to_dict(tabella: pd.DataFrame) -> Dict[int, Dict[str, float]]:
+    """
+    Converte una tabella anno x voce nel formato a dizionari annidati.
+    
+    Args:
+        tabella: DataFrame indicizzato per anno con una colonna per voce
+        
+    Returns:
+        Dizionario {anno: {voce: valore}} senza le voci mancanti
+    """
+    return {
+        anno: valori[valori.notna()].to_dict()
+        for anno, valori in tabella.iterrows()
+    }
+
 def organize_data(df: pd.DataFrame) -> Tuple[Dict[int, Dict[str, float]], Dict[int, Dict[str, float]]]:
     """
     Organizza i dati in dizionari separati per Stato Patrimoniale e Conto Economico.
@@ -122,27 +474,6 @@ def organize_data(df: pd.DataFrame) -> Tuple[Dict[int, Dict[str, float]], Dict[i
     Returns:
         Tuple di dizionari (stato_patrimoniale, conto_economico)
     """
-    stato_patrimoniale = {}
-    conto_economico = {}
-    
-    # Raggruppa per Anno
-    for anno, group in df.groupby("Anno"):
-        sp_dict = {}
-        ce_dict = {}
-        
-        for _, row in group.iterrows():
-            voce = row["Voce"]
-            valore = row["Valore"]
-            
-            # Identifica il tipo di voce
-            tipo = identify_statement_type(voce)
-            
-            if tipo == "SP":
-                sp_dict[voce] = valore
-            else:
-                ce_dict[voce] = valore
-        
-        stato_patrimoniale[anno] = sp_dict
-        conto_economico[anno] = ce_dict
+    stato_patrimoniale, conto_economico = organize_matrices(df)
     
-    return stato_patrimoniale, conto_economico
\ No newline at end of file
+    return matrix_to_dict(stato_patrimoniale), matrix_to_dict(conto_economico)
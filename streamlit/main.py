@@ -10,9 +10,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importa i moduli necessari
-from parser import parse_excel, organize_data
-from matching import apply_matching
-from indici import calcola_indici_per_anni, indici_to_dataframe
+from parser import SUPPORTED_EXTENSIONS
+from analysis import analyze
+from cache import get_pipeline_cache
 from config import COLORS, MATCHING_TYPES, DESCRIZIONI_INDICI
 
 # Configurazione della pagina
@@ -30,7 +30,10 @@ st.markdown("### Analisi Finanziaria Automatica per PMI, Freelance e Consulenti"
 # Sidebar
 with st.sidebar:
     st.header("Carica il tuo bilancio")
-    uploaded_file = st.file_uploader("Seleziona un file Excel (.xlsx)", type=["xlsx"])
+    uploaded_file = st.file_uploader(
+        "Seleziona un file di bilancio (.xlsx, .xlsb, .csv, .parquet)",
+        type=[ext.lstrip(".") for ext in SUPPORTED_EXTENSIONS]
+    )
     
     if uploaded_file is not None:
         st.success("File caricato con successo!")
@@ -95,28 +98,32 @@ if st.session_state.analyzed_data is None and not (uploaded_file is not None and
 if uploaded_file is not None and analyze_button:
     with st.spinner("Analisi del bilancio in corso..."):
         try:
-            # Parsing del file Excel
-            raw_data = parse_excel(uploaded_file, sheet_name)
-            st.session_state.raw_data = raw_data
-            
-            # Applicazione del matching
-            matched_data = apply_matching(raw_data, matching_type)
-            st.session_state.matched_data = matched_data
-            
-            # Organizzazione dei dati
-            stato_patrimoniale, conto_economico = organize_data(matched_data)
-            st.session_state.stato_patrimoniale = stato_patrimoniale
-            st.session_state.conto_economico = conto_economico
-            
-            # Calcolo degli indici
-            indici = calcola_indici_per_anni(stato_patrimoniale, conto_economico)
-            st.session_state.indici = indici
+            # Parsing, matching e indici; un file già analizzato viene servito dalla cache
+            pipeline_cache = get_pipeline_cache()
+            result = analyze(
+                uploaded_file.getvalue(),
+                filename=uploaded_file.name,
+                sheet_name=sheet_name,
+                matching_type=matching_type,
+                cache=pipeline_cache
+            )
             
-            # Conversione degli indici in DataFrame
-            df_indici = indici_to_dataframe(indici)
-            st.session_state.analyzed_data = df_indici
+            st.session_state.raw_data = result.raw
+            st.session_state.matched_data = result.matched
+            st.session_state.stato_patrimoniale = result.stato_patrimoniale_anni()
+            st.session_state.conto_economico = result.conto_economico_anni()
+            st.session_state.indici = result.indici_anni()
+            st.session_state.analyzed_data = result.indici
             
             st.success("Analisi completata con successo!")
+            stats = pipeline_cache.stats()
+            st.caption(
+                f"{'Risultati dalla cache' if result.cached else 'Analisi eseguita'} "
+                f"(cache: {stats['hits']} hit, {stats['misses']} miss)"
+            )
+            if result.matching_stats:
+                with st.expander("Statistiche del matching"):
+                    st.dataframe(pd.DataFrame(result.matching_stats), use_container_width=True)
         except Exception as e:
             st.error(f"Errore durante l'analisi: {str(e)}")
 
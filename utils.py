@@ -5,6 +5,7 @@ import plotly.graph_objects as go
 from typing import Dict, List
 import streamlit as st
 from config import COLORS, DESCRIZIONI_INDICI
+from indici import REGISTRO_INDICI, UNITA_PERCENTUALE, UNITA_RAPPORTO
 
 def format_currency(value):
     """Formatta un valore come valuta"""
@@ -26,21 +27,24 @@ def format_ratio(value):
 
 def get_formatter(indice):
     """Restituisce la funzione di formattazione appropriata per l'indice"""
-    if indice in ["ROE", "ROI", "ROS", "EBITDA Margin", "Indice di Autonomia Finanziaria"]:
+    unita = REGISTRO_INDICI[indice].unita if indice in REGISTRO_INDICI else None
+    if unita == UNITA_PERCENTUALE:
         return format_percentage
-    elif indice in ["Indice di Liquidità", "Indice di Indebitamento", 
-                   "Rotazione Capitale Investito", "Indice di Copertura delle Immobilizzazioni"]:
+    elif unita == UNITA_RAPPORTO:
         return format_ratio
     else:
         return format_currency
 
+def is_higher_better(indice):
+    """Indica se per l'indice valori più alti sono generalmente migliori"""
+    return indice in REGISTRO_INDICI and REGISTRO_INDICI[indice].crescente
+
 def create_indici_chart(df_indici, indice):
     """Crea un grafico per un indice specifico"""
     df_filtered = df_indici[df_indici["Indice"] == indice]
     
     # Determina il colore in base al tipo di indice
-    if indice in ["ROE", "ROI", "ROS", "EBITDA Margin", "Indice di Autonomia Finanziaria", 
-                 "Indice di Liquidità", "Indice di Copertura delle Immobilizzazioni"]:
+    if is_higher_better(indice):
         # Indici dove valori più alti sono generalmente migliori
         color = COLORS["secondary"]
     else:
@@ -244,7 +248,7 @@ def create_dashboard_summary(df_indici, anno_corrente, anno_precedente=None):
             if indice in variazioni and not pd.isna(variazioni[indice]):
                 var = variazioni[indice]
                 # Per alcuni indici, valori più bassi sono migliori
-                if indice in ["Indice di Indebitamento"]:
+                if indice in REGISTRO_INDICI and not is_higher_better(indice):
                     var = -var
                 
                 if var > 0: